@@ -0,0 +1,157 @@
+"""
+Cache persistant des annonces générées par l'IA
+Clé = hash des entrées normalisées + modèle, stockage SQLite partagé entre workers
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('leadqualif.annonce_cache')
+
+# Champs du formulaire qui déterminent le texte généré
+ANNONCE_FIELDS = ('type', 'adresse', 'prix', 'surface', 'pieces')
+# Champs numériques : "300 000" et "300000" désignent le même bien
+NUMERIC_FIELDS = ('prix', 'surface')
+
+
+def normalize(value):
+    """Normalise une entrée : casse, espaces multiples, symbole €."""
+    if value is None:
+        return ''
+    return ' '.join(str(value).replace('€', ' ').split()).casefold()
+
+
+def make_key(data, model):
+    """Hash SHA-256 des champs normalisés et du nom de modèle."""
+    payload = {field: normalize(data.get(field)) for field in ANNONCE_FIELDS}
+    for field in NUMERIC_FIELDS:
+        payload[field] = payload[field].replace(' ', '')
+    payload['model'] = model
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class AnnonceCache:
+    """Cache LRU avec TTL et nombre d'entrées borné, dans un fichier SQLite.
+
+    Le fichier est ouvert en mode WAL pour que tous les workers gunicorn de
+    la machine lisent et écrivent le même cache ; les compteurs hits/misses
+    y sont aussi stockés pour refléter l'ensemble des workers.
+
+    Une lecture n'écrit rien : les compteurs et les dates d'accès (à
+    touch_interval secondes près) sont accumulés dans le processus puis
+    écrits en une transaction toutes les flush_interval secondes.
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, max_entries=10000, flush_interval=5, touch_interval=60):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+        self.touch_interval = touch_interval
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._ready = False
+        # Écritures en attente : compteurs et dernier accès par clé
+        self._pending_lock = threading.Lock()
+        self._counts = {'hits': 0, 'misses': 0}
+        self._touched = {}
+        self._flushed_at = time.time()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            # En WAL, NORMAL ne synchronise le disque qu'aux checkpoints (pas à chaque écriture)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._init_lock:
+                if not self._ready:
+                    self._create_schema(conn)
+                    self._ready = True
+        return conn
+
+    def _create_schema(self, conn):
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS annonces ('
+            ' key TEXT PRIMARY KEY, text TEXT NOT NULL,'
+            ' created_at REAL NOT NULL, last_access REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_annonces_last_access ON annonces(last_access)')
+        conn.execute('CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        conn.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0)")
+
+    def get(self, key):
+        """Retourne le texte en cache (et le marque récemment utilisé), ou None.
+
+        Simple lecture, sans verrou d'écriture entre workers. Une erreur SQLite
+        est traitée comme un miss : le cache ne doit jamais empêcher une génération.
+        """
+        now = time.time()
+        try:
+            row = self._conn().execute(
+                'SELECT text, last_access FROM annonces WHERE key = ? AND created_at > ?',
+                (key, now - self.ttl)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("Erreur cache annonces : %s", e)
+            return None
+        with self._pending_lock:
+            self._counts['hits' if row else 'misses'] += 1
+            if row and now - row[1] >= self.touch_interval:
+                self._touched[key] = now
+            flush = now - self._flushed_at >= self.flush_interval
+        if flush:
+            self.flush()
+        return row[0] if row else None
+
+    def flush(self):
+        """Écrit les compteurs et dates d'accès accumulés (une transaction)."""
+        with self._pending_lock:
+            counts, touched = self._counts, self._touched
+            self._counts, self._touched = {'hits': 0, 'misses': 0}, {}
+            self._flushed_at = time.time()
+        if not any(counts.values()) and not touched:
+            return
+        try:
+            conn = self._conn()
+            with conn:
+                conn.executemany('UPDATE annonces SET last_access = MAX(last_access, ?) WHERE key = ?',
+                                 [(at, key) for key, at in touched.items()])
+                conn.executemany('UPDATE stats SET value = value + ? WHERE name = ?',
+                                 [(n, name) for name, n in counts.items() if n])
+        except sqlite3.Error as e:
+            # Statistiques approximatives : on ne bloque pas la requête pour les réécrire
+            logger.warning("Erreur cache annonces : %s", e)
+
+    def set(self, key, text):
+        """Enregistre un texte puis évince les entrées expirées et les moins récemment utilisées."""
+        now = time.time()
+        try:
+            conn = self._conn()
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO annonces VALUES (?, ?, ?, ?)', (key, text, now, now))
+                conn.execute('DELETE FROM annonces WHERE created_at <= ?', (now - self.ttl,))
+                conn.execute(
+                    'DELETE FROM annonces WHERE key IN ('
+                    ' SELECT key FROM annonces ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                    (self.max_entries,)
+                )
+        except sqlite3.Error as e:
+            logger.warning("Erreur cache annonces : %s", e)
+
+    def stats(self):
+        """Compteurs de tous les workers (ceux des autres processus avec flush_interval de retard)."""
+        self.flush()
+        conn = self._conn()
+        counters = dict(conn.execute('SELECT name, value FROM stats').fetchall())
+        counters['entries'] = conn.execute('SELECT COUNT(*) FROM annonces').fetchone()[0]
+        return counters
@@ -8,9 +8,53 @@ from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash
 from models import db, Lead, User
 from datetime import datetime
+from fieldsets import load_columns, parse_fields
+from sqlalchemy.orm import load_only
 
 api_bp = Blueprint('api', __name__)
 
+# Colonnes exposables via ?fields=
+LEAD_FIELDS = tuple(Lead.__table__.columns.keys())
+
+
+def with_fields(query):
+    """Applique ?fields= : seules les colonnes demandées sont lues en base.
+
+    Retourne (requête, champs) ; champs vaut None sans ?fields= (lead.to_dict() complet).
+    """
+    fields = parse_fields(request.args.get('fields'), LEAD_FIELDS)
+    if fields:
+        query = query.options(load_only(*load_columns(Lead, fields)))
+    return query, fields
+
+
+def agence_courante():
+    """Agence de l'appelant : celle de l'agent connecté, sinon ?agency_id= (pages publiques).
+
+    Toute lecture de leads est filtrée sur cette agence ; ValueError si elle est inconnue,
+    PermissionError pour un agent connecté sans agence (pas de repli sur ?agency_id=).
+    """
+    if current_user.is_authenticated:
+        if not current_user.agency_id:
+            raise PermissionError("Aucune agence n'est associée à ce compte")
+        return current_user.agency_id
+    agency_id = request.args.get('agency_id')
+    if not agency_id:
+        raise ValueError('agency_id est requis')
+    return agency_id
+
+
+def leads_agence():
+    """Requête des leads de l'agence de l'appelant."""
+    return Lead.query.filter(Lead.agency_id == agence_courante())
+
+
+def lead_payload(lead, fields):
+    """Dictionnaire du lead, limité aux champs demandés."""
+    if fields is None:
+        return lead.to_dict()
+    return {field: getattr(lead, field) for field in fields}
+
 
 @api_bp.route('/login', methods=['POST'])
 def login():
@@ -107,7 +151,7 @@ def dashboard():
     """Endpoint protégé pour accéder au tableau de bord.
     
     Retourne les données du dashboard (leads chauds, statistiques, etc.)
-    Nécessite une authentification via Flask-Login.
+    Nécessite une authentification via Flask-Login ; 403 si le compte n'a pas d'agence.
     
     Retourne :
     {
@@ -124,16 +168,16 @@ def dashboard():
     }
     """
     try:
-        # Récupérer les leads chauds (score >= 8)
+        # Récupérer les leads chauds de l'agence (score >= 8)
         leads_chauds = (
-            Lead.query
+            leads_agence()
             .filter(Lead.score_qualification_ia >= 8)
             .order_by(Lead.score_qualification_ia.desc())
             .all()
         )
         
         # Récupérer tous les leads pour les statistiques
-        total_leads = Lead.query.count()
+        total_leads = leads_agence().count()
         
         # Convertir les leads en dictionnaires
         leads_data = [lead.to_dict() for lead in leads_chauds]
@@ -157,6 +201,11 @@ def dashboard():
             }
         }), 200
     
+    except PermissionError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 403
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -277,16 +326,19 @@ def submit_lead():
 
 @api_bp.route('/get-leads', methods=['GET'])
 def get_leads():
-    """Endpoint pour récupérer tous les leads.
+    """Endpoint pour récupérer tous les leads de l'agence.
 
-    Retourne la liste de tous les leads avec leurs scores de qualification.
+    Retourne la liste des leads de l'agence avec leurs scores de qualification.
     """
     try:
-        # Récupérer tous les leads, triés par date de création (plus récents en premier)
-        leads = Lead.query.order_by(Lead.created_at.desc()).all()
+        query = leads_agence()
+
+        # Récupérer les leads de l'agence, triés par date de création (plus récents en premier)
+        query, fields = with_fields(query)
+        leads = query.order_by(Lead.created_at.desc()).all()
 
         # Convertir en liste de dictionnaires
-        leads_data = [lead.to_dict() for lead in leads]
+        leads_data = [lead_payload(lead, fields) for lead in leads]
 
         return jsonify({
             'status': 'success',
@@ -294,6 +346,16 @@ def get_leads():
             'data': leads_data
         }), 200
 
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except PermissionError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 403
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -308,16 +370,14 @@ def get_leads_chauds():
     Utilisé pour alimenter le tableau de bord.
     """
     try:
+        query = leads_agence().filter(Lead.score_qualification_ia >= 8)
+
         # Récupérer les leads avec un score >= 8
-        leads_chauds = (
-            Lead.query
-            .filter(Lead.score_qualification_ia >= 8)
-            .order_by(Lead.score_qualification_ia.desc())
-            .all()
-        )
+        query, fields = with_fields(query)
+        leads_chauds = query.order_by(Lead.score_qualification_ia.desc()).all()
 
         # Convertir en liste de dictionnaires
-        leads_data = [lead.to_dict() for lead in leads_chauds]
+        leads_data = [lead_payload(lead, fields) for lead in leads_chauds]
 
         return jsonify({
             'status': 'success',
@@ -325,6 +385,16 @@ def get_leads_chauds():
             'data': leads_data
         }), 200
 
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except PermissionError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 403
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -339,16 +409,14 @@ def leads_chauds():
     Utilisé pour alimenter le tableau de bord avec les leads chauds (score >= 8).
     """
     try:
+        query = leads_agence().filter(Lead.score_qualification_ia >= 8)
+
         # Récupérer les leads avec un score >= 8
-        leads_chauds = (
-            Lead.query
-            .filter(Lead.score_qualification_ia >= 8)
-            .order_by(Lead.score_qualification_ia.desc())
-            .all()
-        )
+        query, fields = with_fields(query)
+        leads_chauds = query.order_by(Lead.score_qualification_ia.desc()).all()
 
         # Convertir en liste de dictionnaires
-        leads_data = [lead.to_dict() for lead in leads_chauds]
+        leads_data = [lead_payload(lead, fields) for lead in leads_chauds]
 
         return jsonify({
             'status': 'success',
@@ -356,6 +424,16 @@ def leads_chauds():
             'data': leads_data
         }), 200
 
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except PermissionError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 403
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -392,8 +470,8 @@ def planifier_rdv():
                 'message': 'Le champ "lead_id" est requis'
             }), 400
 
-        # Récupérer le lead depuis la base de données
-        lead = Lead.query.get(lead_id)
+        # Récupérer le lead depuis la base de données (uniquement dans l'agence de l'appelant)
+        lead = leads_agence().filter(Lead.id == lead_id).first()
         if not lead:
             return jsonify({
                 'status': 'error',
@@ -430,10 +508,20 @@ def planifier_rdv():
                 'lead_id': lead.id,
                 'nom_client': lead.nom_client,
                 'statut_rdv': lead.statut_rdv,
-                'date_rdv': date_rdv.isoformat()
+                'date_rdv': date_rdv
             }
         }), 200
 
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except PermissionError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 403
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -446,12 +534,23 @@ def planifier_rdv():
 def get_lead(lead_id):
     """Endpoint pour récupérer un lead spécifique par son ID."""
     try:
-        lead = Lead.query.get_or_404(lead_id)
+        query, fields = with_fields(leads_agence())
+        lead = query.filter(Lead.id == lead_id).first_or_404()
         return jsonify({
             'status': 'success',
-            'data': lead.to_dict()
+            'data': lead_payload(lead, fields)
         }), 200
 
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except PermissionError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 403
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -1,32 +1,163 @@
+"""
+Backend LeadQualif CRM
+Fabrique d'application create_app() : aucun accès réseau ni base de données à l'import,
+clients lourds (OpenAI, cache d'annonces) créés au premier usage,
+schéma créé explicitement par `flask --app app init-db`
+"""
+
+import csv
 import os
+import time
 import uuid
+import click
 from datetime import datetime
-from flask import Flask, jsonify, request
+from functools import cached_property
+from itertools import islice
+from flask import Blueprint, Flask, Response, current_app, jsonify, request, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
-from openai import OpenAI
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.exc import IntegrityError
+from pagination import encode_cursor, keyset_page, parse_limit
+from annonce_cache import AnnonceCache, make_key
+from bulk_load import load_rows, uuid7
+from compression import gzip_stream, init_compression
+from fieldsets import load_columns, parse_fields, parse_include
+from db_pool import engine_options, pool_status
+from conditional import aggregate_validator, is_fresh, make_etag, not_modified, with_validators
+import csv_import
+import export
+import dedup
+from dedup import LeadIndex, dedup_keys, normalize_email, normalize_phone
+from jobs import DONE, ERROR, JobQueue, QueueFull, SqliteJobStore
+from json_provider import FastJSONProvider
+from metrics import init_metrics, observe_openai, render as render_metrics
+from scoring import parse_budget, score_batch, score_columns, score_lead
+import search
+import stats
+from singleflight import SingleFlight, SqliteLeases
+from slow_queries import init_slow_query_log
+from synthetic import populate
+from write_behind import BufferFull, WriteBehindBuffer
+
+db = SQLAlchemy()
 
-app = Flask(__name__)
+# Routes et commandes CLI (commandes au niveau racine : flask --app app init-db)
+bp = Blueprint('crm', __name__, cli_group=None)
 
 # --- 1. CONFIGURATION ---
-CORS(app, resources={r"/*": {"origins": "*"}})
+def database_uri():
+    """URL Supabase PostgreSQL, DATABASE_URL (Render) ou SQLite local."""
+    supabase_url = os.environ.get('SUPABASE_DB_URL')
+    if not supabase_url:
+        # Fallback pour développement local
+        supabase_url = os.environ.get('DATABASE_URL')
+        if supabase_url and supabase_url.startswith("postgres://"):
+            supabase_url = supabase_url.replace("postgres://", "postgresql://", 1)
+    return supabase_url or 'sqlite:///site.db'
+
+def load_config(app):
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['OPENAI_API_KEY'] = os.environ.get("OPENAI_API_KEY")
+
+    # Filtre de Bloom anti-doublons (taille prévue, taux de faux positifs)
+    app.config['DEDUP_BLOOM_CAPACITY'] = int(os.environ.get('DEDUP_BLOOM_CAPACITY', 1_000_000))
+    app.config['DEDUP_BLOOM_ERROR_RATE'] = float(os.environ.get('DEDUP_BLOOM_ERROR_RATE', 0.01))
+    # Chargement du filtre au premier lead : background (thread), sync (dans la requête) ou off (désactivé)
+    app.config['DEDUP_BLOOM_WARMUP'] = os.environ.get('DEDUP_BLOOM_WARMUP', 'background').lower()
+
+    # Journal des requêtes SQL lentes (seuil en ms, 0 = désactivé) et capture des plans
+    app.config['SLOW_QUERY_MS'] = int(os.environ.get('SLOW_QUERY_MS', 500))
+    app.config['SLOW_QUERY_EXPLAIN'] = os.environ.get('SLOW_QUERY_EXPLAIN', 'true').lower() in ('1', 'true', 'yes', 'on')
+
+    # Pool de génération d'annonces en arrière-plan (mode asynchrone)
+    app.config['ANNONCE_WORKERS'] = int(os.environ.get('ANNONCE_WORKERS', 4))
+    app.config['ANNONCE_QUEUE_SIZE'] = int(os.environ.get('ANNONCE_QUEUE_SIZE', 32))
 
-# Configuration Base de données Supabase PostgreSQL
-supabase_url = os.environ.get('SUPABASE_DB_URL')
-if not supabase_url:
-    # Fallback pour développement local
-    supabase_url = os.environ.get('DATABASE_URL')
-    if supabase_url and supabase_url.startswith("postgres://"):
-        supabase_url = supabase_url.replace("postgres://", "postgresql://", 1)
+    # Cache des annonces générées (fichier SQLite partagé par les workers de la machine)
+    app.config['ANNONCE_CACHE_PATH'] = os.environ.get(
+        'ANNONCE_CACHE_PATH', os.path.join(app.instance_path, 'annonce_cache.db'))
+    app.config['ANNONCE_CACHE_TTL'] = int(os.environ.get('ANNONCE_CACHE_TTL', 7 * 24 * 3600))
+    app.config['ANNONCE_CACHE_MAX_ENTRIES'] = int(os.environ.get('ANNONCE_CACHE_MAX_ENTRIES', 10000))
 
-app.config['SQLALCHEMY_DATABASE_URI'] = supabase_url or 'sqlite:///site.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Écriture différée des interactions : journal local, insertion groupée toutes les N ms ou M lignes
+    app.config['INTERACTIONS_WRITE_BEHIND'] = os.environ.get('INTERACTIONS_WRITE_BEHIND', 'false').lower() in ('1', 'true', 'yes', 'on')
+    app.config['INTERACTIONS_FLUSH_MS'] = int(os.environ.get('INTERACTIONS_FLUSH_MS', 200))
+    app.config['INTERACTIONS_FLUSH_ROWS'] = int(os.environ.get('INTERACTIONS_FLUSH_ROWS', 500))
+    app.config['INTERACTIONS_MAX_PENDING'] = int(os.environ.get('INTERACTIONS_MAX_PENDING', 50000))
+    app.config['INTERACTIONS_SPILL_DIR'] = os.environ.get(
+        'INTERACTIONS_SPILL_DIR', os.path.join(app.instance_path, 'interactions'))
+    app.config['INTERACTIONS_SPILL_FSYNC'] = os.environ.get('INTERACTIONS_SPILL_FSYNC', 'true').lower() in ('1', 'true', 'yes', 'on')
+
+class AnnonceServices:
+    """Client OpenAI, cache, pool et single-flight des annonces, créés au premier usage."""
+
+    def __init__(self, config):
+        self.config = config
+
+    @cached_property
+    def client(self):
+        # Import différé : le SDK OpenAI représente près de la moitié du temps d'import
+        from openai import OpenAI
+        return OpenAI(api_key=self.config['OPENAI_API_KEY'])
+
+    @cached_property
+    def jobs(self):
+        # État des tâches dans le fichier du cache : le suivi peut être servi par un autre worker
+        return JobQueue(self.config['ANNONCE_WORKERS'], self.config['ANNONCE_QUEUE_SIZE'],
+                        store=SqliteJobStore(self.config['ANNONCE_CACHE_PATH']))
+
+    @cached_property
+    def cache(self):
+        return AnnonceCache(
+            self.config['ANNONCE_CACHE_PATH'],
+            ttl=self.config['ANNONCE_CACHE_TTL'],
+            max_entries=self.config['ANNONCE_CACHE_MAX_ENTRIES']
+        )
 
-db = SQLAlchemy(app)
+    @cached_property
+    def flights(self):
+        # Un seul appel OpenAI pour des demandes identiques simultanées (threads et workers de la machine)
+        return SingleFlight(SqliteLeases(self.config['ANNONCE_CACHE_PATH']))
 
-# Client OpenAI
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+def annonces():
+    """Services d'annonce de l'application courante."""
+    return current_app.extensions['annonces']
+
+def interactions_buffer():
+    """Tampon d'écriture différée des interactions, None en mode synchrone."""
+    return current_app.extensions['interactions']
+
+def create_app(config=None):
+    """Construit l'application ; config (dict) surcharge les valeurs lues dans l'environnement."""
+    app = Flask(__name__)
+    load_config(app)
+    if config:
+        app.config.update(config)
+    # Pool de connexions (taille par worker, pre-ping, recyclage, timeout, mode PgBouncer)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    CORS(app, resources={r"/*": {"origins": "*"}})
+
+    # JSON rapide (orjson : UUID, dates, Decimal natifs) et compression gzip/brotli des grosses réponses
+    app.json = FastJSONProvider(app)
+    init_compression(app)
+    # Latence par route, requêtes SQL et appels OpenAI : /metrics et en-tête Server-Timing
+    init_metrics(app)
+
+    db.init_app(app)
+    with app.app_context():
+        init_slow_query_log(app, db.engine)
+    app.extensions['annonces'] = AnnonceServices(app.config)
+    app.extensions['lead_index'] = LeadIndex(app.config['DEDUP_BLOOM_CAPACITY'], app.config['DEDUP_BLOOM_ERROR_RATE'])
+    app.extensions['interactions'] = WriteBehindBuffer(
+        app, db, Interaction.__table__, app.config['INTERACTIONS_SPILL_DIR'],
+        flush_ms=app.config['INTERACTIONS_FLUSH_MS'], max_rows=app.config['INTERACTIONS_FLUSH_ROWS'],
+        max_pending=app.config['INTERACTIONS_MAX_PENDING'], fsync=app.config['INTERACTIONS_SPILL_FSYNC']
+    ) if app.config['INTERACTIONS_WRITE_BEHIND'] else None
+    app.register_blueprint(bp)
+    return app
 
 # --- 2. MODÈLE DE DONNÉES (COMPATIBLE SUPABASE) ---
 class Agency(db.Model):
@@ -61,6 +192,11 @@ class Interaction(db.Model):
     date = db.Column(db.DateTime, default=datetime.utcnow)
     created_by = db.Column(UUID(as_uuid=True), db.ForeignKey('profiles.id'))
 
+    # Interactions d'une page de leads (lead_id IN (...)), les plus récentes d'abord
+    __table_args__ = (
+        db.Index('ix_interactions_lead_date', lead_id, date.desc()),
+    )
+
 class Lead(db.Model):
     __tablename__ = 'leads'
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -72,8 +208,12 @@ class Lead(db.Model):
     type_bien = db.Column(db.String(50))
     adresse = db.Column(db.String(500))
     score_ia = db.Column(db.Integer, default=0)
+    statut = db.Column(db.String(50))
     statut_crm = db.Column(db.String(50), default='À traiter')
     source = db.Column(db.String(100))
+    # Identifiants normalisés pour la détection des doublons (voir dedup.py)
+    email_normalise = db.Column(db.String(120))
+    telephone_e164 = db.Column(db.String(20))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -81,18 +221,116 @@ class Lead(db.Model):
     agency = db.relationship('Agency', backref='leads')
     interactions = db.relationship('Interaction', backref='lead', lazy=True, order_by='Interaction.date.desc()')
 
-# Création des tables au démarrage (si elles n'existent pas)
-with app.app_context():
-    db.create_all()
+    # Une personne = un lead par agence (NULL non comparés : email ou téléphone absent)
+    __table_args__ = (
+        db.Index('uq_leads_agency_email', 'agency_id', 'email_normalise', unique=True),
+        db.Index('uq_leads_agency_telephone', 'agency_id', 'telephone_e164', unique=True),
+        # Listes par agence : parcours d'index dans l'ordre du tri, sans tri de la table ;
+        # updated_at en fin de clé rend l'agrégat de l'ETag (count, max(updated_at)) couvert par l'index
+        db.Index('ix_leads_agency_created', agency_id, created_at.desc(), id.desc(), updated_at),
+        db.Index('ix_leads_agency_score', agency_id, score_ia.desc(), id.desc()),
+        db.Index('ix_leads_agency_statut_crm', agency_id, statut_crm),
+        # Parcours par lots du re-scoring (keyset agency_id, id > ? ORDER BY id)
+        db.Index('ix_leads_agency_id', agency_id, id),
+    )
+
+class AgencyStats(db.Model):
+    """Compteurs du tableau de bord par agence, tenus à jour à chaque écriture de lead (stats.py)"""
+    __tablename__ = 'agency_stats'
+    agency_id = db.Column(UUID(as_uuid=True), db.ForeignKey('agencies.id'), primary_key=True)
+    total_leads = db.Column(db.Integer, nullable=False, default=0)
+    leads_chauds = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Index de recherche (trigrammes PostgreSQL / FTS5 SQLite) créés avec la table
+search.register(Lead.__table__)
+# Identifiants normalisés calculés aussi en base pour les leads écrits hors backend (PostgreSQL)
+dedup.register(Lead.__table__)
+# Compteurs du tableau de bord tenus par des triggers sur leads, créés avec les tables
+stats.register(Lead.__table__, AgencyStats.__table__)
+
+@db.event.listens_for(Lead, 'before_insert')
+@db.event.listens_for(Lead, 'before_update')
+def normaliser_identifiants(mapper, connection, lead):
+    # Seulement si la valeur change : une mise à jour de statut ne touche pas aux identifiants
+    attrs = db.inspect(lead).attrs
+    if attrs.email.history.has_changes():
+        lead.email_normalise = normalize_email(lead.email)
+    if attrs.telephone.history.has_changes():
+        lead.telephone_e164 = normalize_phone(lead.telephone)
 
 # --- 3. ROUTES API ---
 
-@app.route('/', methods=['GET'])
+@bp.route('/', methods=['GET'])
 def home():
     return "Backend LeadQualif CRM est en ligne 🚀"
 
+# --- DÉTECTION DES DOUBLONS ---
+TYPE_DOUBLON = 'Nouvelle demande'
+
+def charger_identifiants():
+    return (
+        db.session.query(Lead.agency_id, Lead.email_normalise, Lead.telephone_e164)
+        .execution_options(stream_results=True)
+        .yield_per(10000)
+    )
+
+def lead_index():
+    """Filtre anti-doublons du processus (chargé au premier appel selon DEDUP_BLOOM_WARMUP)."""
+    index = current_app.extensions['lead_index']
+    mode = current_app.config['DEDUP_BLOOM_WARMUP']
+    if mode != 'off':
+        index.warm(current_app._get_current_object(), charger_identifiants, background=mode != 'sync')
+    return index
+
+def trouver_doublon(agency_id, email_normalise, telephone_e164):
+    """Lead existant de l'agence ayant le même email (prioritaire) ou le même téléphone."""
+    conditions = []
+    if email_normalise:
+        conditions.append(Lead.email_normalise == email_normalise)
+    if telephone_e164:
+        conditions.append(Lead.telephone_e164 == telephone_e164)
+    if not conditions:
+        return None
+    return (
+        Lead.query
+        .filter(Lead.agency_id == agency_id, db.or_(*conditions))
+        .order_by((Lead.email_normalise == email_normalise).desc())
+        .first()
+    )
+
+def resume_demande(data):
+    """Détails de l'interaction créée pour une demande en doublon."""
+    parties = [f"{nom} : {data.get(champ)}" for champ, nom in
+               (('source', 'source'), ('budget', 'budget'), ('type_bien', 'bien'), ('adresse', 'adresse'))
+               if data.get(champ)]
+    return ('Demande renouvelée' + (' — ' + ', '.join(parties) if parties else ''))[:500]
+
+def telephone_libre(lead, telephone):
+    """Le numéro peut compléter le lead : aucun autre lead de l'agence ne l'a (index unique)."""
+    telephone_e164 = normalize_phone(telephone)
+    return telephone_e164 is None or trouver_doublon(lead.agency_id, None, telephone_e164) is None
+
+def fusionner_doublon(lead, data, avec_telephone=True):
+    """Ajoute la demande à l'historique du lead existant au lieu de créer une ligne."""
+    db.session.add(Interaction(lead_id=lead.id, type_action=TYPE_DOUBLON, details=resume_demande(data),
+                               date=datetime.utcnow()))
+    if avec_telephone and not lead.telephone and data.get('telephone') and telephone_libre(lead, data['telephone']):
+        lead.telephone = data['telephone']
+    lead.updated_at = datetime.utcnow()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Numéro attribué entre-temps à un autre lead : la demande est gardée, sans le téléphone
+        db.session.rollback()
+        if not avec_telephone:
+            raise
+        return fusionner_doublon(db.session.get(Lead, lead.id), data, avec_telephone=False)
+    return jsonify({'status': 'success', 'message': 'Lead déjà connu : demande ajoutée à son historique',
+                    'lead_id': lead.id, 'doublon': True, 'score': lead.score_ia}), 200
+
 # --- ROUTE 1 : AJOUT DE LEAD (AVEC SCORING INTELLIGENT) ---
-@app.route('/api/leads', methods=['POST'])
+@bp.route('/api/leads', methods=['POST'])
 def add_lead():
     try:
         data = request.json
@@ -102,42 +340,24 @@ def add_lead():
         if not agency_id:
             return jsonify({'error': 'agency_id est requis'}), 400
         
-        # Scoring Strict (Marché FR/EU)
-        score = 0
-        telephone = data.get('telephone', '')
-        email = data.get('email', '')
-        ville = data.get('adresse', '').lower()
-        
-        # Nettoyage budget
-        try:
-            budget_str = str(data.get('budget', '0')).replace(' ', '').replace('€', '')
-            budget = int(budget_str)
-        except ValueError:
-            budget = 0
+        agency_id = uuid.UUID(str(agency_id))
+        email_normalise = normalize_email(data.get('email'))
+        telephone_e164 = normalize_phone(data.get('telephone'))
 
-        # Critères
-        if len(telephone) > 8: score += 4
-        elif len(email) > 5: score += 1
-            
-        if budget > 500000: score += 5
-        elif budget > 250000: score += 3
-        elif budget > 100000: score += 1
+        # Cas courant (lead nouveau d'après le filtre) : aucune requête de recherche
+        index = lead_index()
+        if index.maybe_exists(agency_id, email_normalise, telephone_e164):
+            existant = trouver_doublon(agency_id, email_normalise, telephone_e164)
+            if existant:
+                return fusionner_doublon(existant, data)
 
-        # Pénalité cohérence (Ex: Paris à 50k€)
-        if 'paris' in ville and budget < 200000 and budget > 0:
-            score -= 3
-
-        # Bornes 0-10
-        score = max(0, min(10, score))
-
-        # Statut IA
-        statut_ia = 'Chaud 🔥' if score >= 7 else ('Tiède 😐' if score >= 4 else 'Froid ❄️')
+        budget, score, statut_ia = score_lead(data)
 
         new_lead = Lead(
             agency_id=agency_id,
             nom=data.get('nom'),
-            email=email,
-            telephone=telephone,
+            email=data.get('email', ''),
+            telephone=data.get('telephone', ''),
             budget=budget,
             type_bien=data.get('type_bien'),
             adresse=data.get('adresse'),
@@ -146,46 +366,634 @@ def add_lead():
             statut_crm='À traiter'
         )
         db.session.add(new_lead)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Créé entre-temps par un autre worker : l'index unique tranche
+            db.session.rollback()
+            existant = trouver_doublon(agency_id, email_normalise, telephone_e164)
+            if not existant:
+                raise
+            return fusionner_doublon(existant, data)
+        index.add(agency_id, email_normalise, telephone_e164)
         
-        return jsonify({'status': 'success', 'message': 'Lead qualifié', 'score': score}), 201
+        return jsonify({'status': 'success', 'message': 'Lead qualifié', 'score': score, 'lead_id': new_lead.id}), 201
+
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f"agency_id invalide : {e}"}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# --- ROUTE 1 BIS : IMPORT EN MASSE (JSON OU NDJSON) ---
+# Nombre de lignes par INSERT multi-lignes / par transaction
+BULK_CHUNK_SIZE = 1000
+
+# Colonnes texte saisies par le client, bornées par la longueur du schéma
+LEAD_TEXT_COLUMNS = ('nom', 'email', 'telephone', 'type_bien', 'adresse', 'source')
+# Lead.budget est un INTEGER (int4)
+BUDGET_MIN, BUDGET_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def prepare_lead_row(data, default_agency_id=None, new_id=uuid.uuid4):
+    """Valide un lead du lot ; retourne les colonnes à insérer ou lève ValueError."""
+    if isinstance(data, Exception):
+        raise ValueError(f"JSON invalide : {data}")
+    if not isinstance(data, dict):
+        raise ValueError('Objet JSON attendu')
 
+    agency_id = data.get('agency_id') or default_agency_id
+    if not agency_id:
+        raise ValueError('agency_id est requis')
+    if not isinstance(agency_id, uuid.UUID):
+        try:
+            agency_id = uuid.UUID(str(agency_id))
+        except ValueError:
+            raise ValueError(f"agency_id invalide : {agency_id}")
+    if not data.get('nom'):
+        raise ValueError('nom est requis')
+    if not data.get('email'):
+        raise ValueError('email est requis')
+    # Validé ici : une seule valeur refusée par la base ferait échouer tout le lot (COPY)
+    for colonne in LEAD_TEXT_COLUMNS:
+        valeur = data.get(colonne)
+        limite = Lead.__table__.c[colonne].type.length
+        if valeur is not None and len(str(valeur)) > limite:
+            raise ValueError(f"{colonne} trop long ({limite} caractères max)")
+    if not BUDGET_MIN <= parse_budget(data.get('budget', '0')) <= BUDGET_MAX:
+        raise ValueError(f"budget hors limites : {data.get('budget')}")
+
+    return {
+        'id': new_id(),
+        'agency_id': agency_id,
+        'nom': data['nom'],
+        'email': data['email'],
+        'telephone': data.get('telephone', ''),
+        'budget': data.get('budget', '0'),
+        'type_bien': data.get('type_bien'),
+        'adresse': data.get('adresse'),
+        'statut_crm': 'À traiter',
+        'source': data.get('source'),
+        'email_normalise': normalize_email(data['email']),
+        'telephone_e164': normalize_phone(data.get('telephone'))
+    }
+
+def iter_bulk_payload():
+    """Itère sur les leads du corps : tableau JSON ({"leads": [...]} accepté) ou NDJSON lu en flux."""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield current_app.json.loads(line)
+            except ValueError as e:
+                yield e
+        return
+
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('leads')
+    if not isinstance(payload, list):
+        raise ValueError('Tableau JSON de leads ou flux NDJSON attendu')
+    yield from payload
+
+def doublons_en_base(rows, tout_verifier=False):
+    """Leads existants correspondant aux lignes du lot, en une requête : {clé de dédoublonnage: id}.
+
+    Seules les lignes que le filtre de Bloom ne déclare pas nouvelles sont recherchées.
+    """
+    suspects = rows
+    if not tout_verifier:
+        peut_etre = lead_index().maybe_exists_many(
+            [(r['agency_id'], r['email_normalise'], r['telephone_e164']) for r in rows])
+        suspects = [r for r, suspect in zip(rows, peut_etre) if suspect]
+    emails = {r['email_normalise'] for r in suspects if r['email_normalise']}
+    telephones = {r['telephone_e164'] for r in suspects if r['telephone_e164']}
+    conditions = []
+    if emails:
+        conditions.append(Lead.email_normalise.in_(emails))
+    if telephones:
+        conditions.append(Lead.telephone_e164.in_(telephones))
+    if not conditions:
+        return {}
+
+    existants = {}
+    query = (
+        db.session.query(Lead.id, Lead.agency_id, Lead.email_normalise, Lead.telephone_e164)
+        .filter(Lead.agency_id.in_({r['agency_id'] for r in suspects}), db.or_(*conditions))
+    )
+    for id, agency_id, email_normalise, telephone_e164 in query:
+        for key in dedup_keys(agency_id, email_normalise, telephone_e164):
+            existants[key] = id
+    return existants
+
+def insert_lead_chunk(chunk, tout_verifier=False):
+    """Score le lot en un passage vectorisé puis l'insère (COPY ou INSERT groupé, une transaction).
+
+    Les doublons (en base ou dans le lot) deviennent des interactions du lead existant.
+    """
+    cibles = doublons_en_base([row for _, row in chunk], tout_verifier)
+    nouveaux, fusions = [], []
+    for index, row in chunk:
+        keys = dedup_keys(row['agency_id'], row['email_normalise'], row['telephone_e164'])
+        cible = next((cibles[k] for k in keys if k in cibles), None)
+        if cible is None:
+            cibles.update(dict.fromkeys(keys, row['id']))
+            nouveaux.append((index, row))
+        else:
+            fusions.append((index, cible, row))
+
+    rows = [row for _, row in nouveaux]
+    if rows:
+        budgets, scores, statuts = score_batch(rows)
+        for row, budget, score, statut_ia in zip(rows, budgets, scores.tolist(), statuts):
+            row.update(budget=budget, score_ia=score, statut=statut_ia)
+    try:
+        if rows:
+            load_rows(db.session.connection(), Lead.__table__, rows)
+        if fusions:
+            maintenant = datetime.utcnow()
+            db.session.execute(db.insert(Interaction), [
+                {'id': uuid.uuid4(), 'lead_id': cible, 'type_action': TYPE_DOUBLON,
+                 'details': resume_demande(row), 'date': maintenant}
+                for _, cible, row in fusions
+            ])
+            db.session.execute(
+                db.update(Lead).where(Lead.id.in_({cible for _, cible, _ in fusions})).values(updated_at=maintenant)
+            )
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if not tout_verifier:
+            # Doublon inséré entre-temps par un autre worker : on revérifie tout le lot en base
+            return insert_lead_chunk(chunk, tout_verifier=True)
+        return [{'index': index, 'status': 'error', 'message': str(e)} for index, _ in chunk]
+    except Exception as e:
+        db.session.rollback()
+        return [{'index': index, 'status': 'error', 'message': str(e)} for index, _ in chunk]
+
+    lead_index().add_many([(row['agency_id'], row['email_normalise'], row['telephone_e164']) for row in rows])
+    return ([{'index': index, 'status': 'created', 'id': row['id'], 'score': row['score_ia']}
+             for index, row in nouveaux] +
+            [{'index': index, 'status': 'merged', 'id': cible} for index, cible, _ in fusions])
+
+@bp.route('/api/leads/bulk', methods=['POST'])
+def add_leads_bulk():
+    try:
+        default_agency_id = request.args.get('agency_id')
+        results = []
+        chunk = []
+        for index, data in enumerate(iter_bulk_payload()):
+            try:
+                chunk.append((index, prepare_lead_row(data, default_agency_id)))
+            except ValueError as e:
+                results.append({'index': index, 'status': 'error', 'message': str(e)})
+                continue
+            if len(chunk) >= BULK_CHUNK_SIZE:
+                results.extend(insert_lead_chunk(chunk))
+                chunk = []
+        if chunk:
+            results.extend(insert_lead_chunk(chunk))
+
+        results.sort(key=lambda r: r['index'])
+        created = sum(1 for r in results if r['status'] == 'created')
+        merged = sum(1 for r in results if r['status'] == 'merged')
+        return jsonify({
+            'status': 'success',
+            'created': created,
+            'merged': merged,
+            'errors': len(results) - created - merged,
+            'results': results
+        }), 200
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# --- ROUTE 1 TER : IMPORT CSV (MIGRATION DEPUIS UN AUTRE CRM) ---
+# Lignes par lot : dédoublonnage, scoring vectorisé et chargement (COPY) en une transaction
+IMPORT_CHUNK_SIZE = 10000
+# Lignes refusées affichées par la commande import-leads sans --errors
+IMPORT_ERRORS_SHOWN = 20
+
+def import_leads(records, agency_id, chunk_size=IMPORT_CHUNK_SIZE):
+    """Importe les enregistrements (numéro de ligne, champs) par lots ; génère des événements.
+
+    {'type': 'error', 'line', 'message'} pour chaque ligne refusée,
+    {'type': 'progress', ...} après chaque lot et {'type': 'summary', ...} à la fin.
+    Les lots passent par insert_lead_chunk comme l'import JSON : doublons fusionnés
+    dans l'historique du lead existant, une transaction par lot. Les id sont des
+    UUID v7, croissants : insertion en fin d'index plutôt qu'au hasard.
+    """
+    debut = time.perf_counter()
+    comptes = {'rows': 0, 'created': 0, 'merged': 0, 'errors': 0}
+
+    def bilan(type_evenement):
+        ecoule = time.perf_counter() - debut
+        return {'type': type_evenement, **comptes, 'elapsed_s': round(ecoule, 3),
+                'rows_per_s': round(comptes['rows'] / ecoule) if ecoule else 0}
+
+    records = iter(records)
+    while True:
+        chunk, lues = [], 0
+        for line, data in islice(records, chunk_size):
+            lues += 1
+            try:
+                chunk.append((line, prepare_lead_row(data, agency_id, new_id=uuid7)))
+            except ValueError as e:
+                comptes['errors'] += 1
+                yield {'type': 'error', 'line': line, 'message': str(e)}
+        if not lues:
+            break
+        comptes['rows'] += lues
+        for result in insert_lead_chunk(chunk) if chunk else ():
+            if result['status'] == 'error':
+                comptes['errors'] += 1
+                yield {'type': 'error', 'line': result['index'], 'message': result['message']}
+            else:
+                comptes[result['status']] += 1
+        yield bilan('progress')
+    yield bilan('summary')
+
+def ouvrir_import(binary, mapping=None, delimiter=None):
+    """Lit l'en-tête du CSV ; retourne (enregistrements, {champ: colonne}, colonnes ignorées)."""
+    reader, header = csv_import.open_csv(binary, delimiter=delimiter)
+    columns, ignorees = csv_import.resolve_columns(header, mapping)
+    return csv_import.iter_records(reader, columns), {champ: header[i] for champ, i in columns}, ignorees
+
+@bp.route('/api/leads/import', methods=['POST'])
+def import_leads_csv():
+    """Import d'un CSV envoyé comme corps brut (lu en flux) ; progression et erreurs en NDJSON."""
+    try:
+        agency_id = parse_agency_id(request.args.get('agency_id'))
+        if db.session.get(Agency, agency_id) is None:
+            return jsonify({'status': 'error', 'message': 'Agence non trouvée'}), 404
+        mapping = csv_import.parse_mapping(request.args.get('map'))
+        if request.mimetype == 'multipart/form-data':
+            # Fichiers de formulaire fermés dès la fin de la vue, avant la lecture en flux
+            raise ValueError('Envoyez le fichier comme corps brut (Content-Type: text/csv), pas en formulaire')
+        records, columns, ignorees = ouvrir_import(request.stream, mapping, request.args.get('delimiter') or None)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
+        db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+    def evenements():
+        dumps = current_app.json.dumps
+        yield dumps({'type': 'columns', 'columns': columns, 'ignored': ignorees}) + '\n'
+        try:
+            for evenement in import_leads(records, agency_id):
+                yield dumps(evenement) + '\n'
+        except Exception as e:
+            # Fichier illisible en cours de route : les lots précédents restent importés
+            db.session.rollback()
+            yield dumps({'type': 'fatal', 'message': str(e)}) + '\n'
+
+    return Response(stream_with_context(evenements()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # --- ROUTE 2 : LISTE DES LEADS ---
-@app.route('/api/leads-chauds', methods=['GET'])
+def interaction_to_dict(i):
+    return {
+        'id': i.id,
+        'type_action': i.type_action,
+        'details': i.details,
+        'date': i.date
+    }
+
+# Champs exposés par la liste (?fields=) et relations embarquables (?include=)
+LEAD_FIELDS = ('id', 'nom', 'email', 'telephone', 'type_bien', 'adresse', 'score_ia',
+               'statut', 'statut_crm', 'budget', 'created_at')
+LEAD_INCLUDES = ('interactions',)
+
+def lead_to_dict(l, interactions=None, fields=LEAD_FIELDS):
+    """Sérialise les seuls champs demandés (aucun accès aux colonnes non chargées)."""
+    data = {f: getattr(l, f) for f in fields}
+    if 'statut_crm' in data:
+        data['statut_crm'] = data['statut_crm'] or 'À traiter' # Sécurité si vide
+    if interactions is not None:
+        data['interactions'] = [interaction_to_dict(i) for i in interactions]
+    return data
+
+def load_interactions(lead_ids, per_lead=None):
+    """Charge les interactions d'une page de leads en UNE requête (lead_id IN (...)).
+
+    Remplace l'accès paresseux à Lead.interactions (une requête par lead).
+    per_lead limite le nombre d'interactions récentes gardées par lead via
+    ROW_NUMBER() OVER (PARTITION BY lead_id), calculé côté base.
+    """
+    by_lead = {id: [] for id in lead_ids}
+    if not lead_ids or per_lead == 0:
+        return by_lead
+
+    if per_lead is None:
+        query = (
+            Interaction.query
+            .filter(Interaction.lead_id.in_(lead_ids))
+            .order_by(Interaction.date.desc())
+        )
+    else:
+        rang = db.func.row_number().over(
+            partition_by=Interaction.lead_id,
+            order_by=(Interaction.date.desc(), Interaction.id.desc())
+        ).label('rang')
+        sub = (
+            db.session.query(Interaction, rang)
+            .filter(Interaction.lead_id.in_(lead_ids))
+            .subquery()
+        )
+        recentes = db.aliased(Interaction, sub)
+        query = (
+            db.session.query(recentes)
+            .filter(sub.c.rang <= per_lead)
+            .order_by(recentes.date.desc())
+        )
+
+    for i in query:
+        by_lead[i.lead_id].append(i)
+
+    # Écriture différée : les interactions pas encore insérées sont visibles tout de suite
+    buffer = interactions_buffer()
+    if buffer is not None:
+        connues = {i.id for interactions in by_lead.values() for i in interactions}
+        en_attente = [row for row in buffer.pending_for(lead_ids) if row['id'] not in connues]
+        for row in en_attente:
+            by_lead[row['lead_id']].append(Interaction(**row))
+        for lead_id in {row['lead_id'] for row in en_attente}:
+            by_lead[lead_id].sort(key=lambda i: i.date, reverse=True)
+            if per_lead is not None:
+                del by_lead[lead_id][per_lead:]
+    return by_lead
+
+def parse_agency_id(value):
+    """?agency_id= obligatoire : toute lecture de leads est limitée à une agence."""
+    if not value:
+        raise ValueError('agency_id est requis')
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        raise ValueError(f"agency_id invalide : {value}")
+
+# Tris de la liste : (colonne, type de la clé du curseur) ; chacun servi par un index (agency_id, colonne DESC, id DESC)
+LEAD_SORTS = {'recent': ('created_at', datetime), 'score': ('score_ia', int)}
+
+def parse_sort(value):
+    """?sort=recent (défaut) | score"""
+    sort = value or 'recent'
+    if sort not in LEAD_SORTS:
+        raise ValueError(f"Tri inconnu : {sort} (disponibles : {', '.join(LEAD_SORTS)})")
+    return sort
+
+def parse_interactions(value):
+    """?interactions=N : nombre max d'interactions par lead (toutes si absent)."""
+    if value in (None, ''):
+        return None
+    try:
+        return max(0, int(value))
+    except ValueError:
+        raise ValueError(f"Paramètre interactions invalide : {value}")
+
+def serialize_page(leads, per_lead, fields=LEAD_FIELDS, with_interactions=True):
+    if not with_interactions:
+        return [lead_to_dict(l, fields=fields) for l in leads]
+    interactions = load_interactions([l.id for l in leads], per_lead)
+    return [lead_to_dict(l, interactions[l.id], fields) for l in leads]
+
+def stream_leads(query, per_lead, fields=LEAD_FIELDS, with_interactions=True, batch_size=500):
+    """Génère le JSON de la liste par lots depuis un curseur serveur."""
+    yield '{"status": "success", "data": {"leads_chauds": ['
+    # stream_results => curseur côté serveur (psycopg2), yield_per => lots bornés en mémoire
+    rows = iter(query.execution_options(stream_results=True).yield_per(batch_size))
+    first = True
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        for lead in serialize_page(batch, per_lead, fields, with_interactions):
+            yield ('' if first else ',') + current_app.json.dumps(lead)
+            first = False
+    yield ']}}'
+
+@bp.route('/api/leads-chauds', methods=['GET'])
 def get_leads():
     try:
-        # On trie par ID décroissant (le plus récent en haut)
-        leads = Lead.query.order_by(Lead.id.desc()).all()
-        leads_data = [{
-            'id': l.id,
-            'nom': l.nom,
-            'email': l.email,
-            'telephone': l.telephone,
-            'type_bien': l.type_bien,
-            'adresse': l.adresse,
-            'score_ia': l.score_ia,
-            'statut': l.statut,
-            'statut_crm': l.statut_crm or 'À traiter', # Sécurité si vide
-            'budget': l.budget,
-            'interactions': [{
-                'id': i.id,
-                'type_action': i.type_action,
-                'details': i.details,
-                'date': i.date.isoformat() if i.date else None
-            } for i in l.interactions]
-        } for l in leads]
-        return jsonify({'status': 'success', 'data': {'leads_chauds': leads_data}}), 200
+        per_lead = parse_interactions(request.args.get('interactions'))
+
+        # ?fields= : champs partiels ; les interactions ne sont alors chargées que sur ?include=interactions
+        fields = parse_fields(request.args.get('fields'), LEAD_FIELDS)
+        include = parse_include(request.args.get('include'), LEAD_INCLUDES)
+        with_interactions = fields is None or 'interactions' in include
+
+        # Leads de l'agence uniquement (index composites commençant par agency_id)
+        leads_agence = Lead.query.filter(Lead.agency_id == parse_agency_id(request.args.get('agency_id')))
+        if request.args.get('statut_crm'):
+            leads_agence = leads_agence.filter(Lead.statut_crm == request.args.get('statut_crm'))
+        sort_name, key_type = LEAD_SORTS[parse_sort(request.args.get('sort'))]
+        sort_col = getattr(Lead, sort_name)
+
+        # Validateur (nombre de lignes + dernière modification), 304 avant de charger un seul lead
+        validateur = aggregate_validator(leads_agence, Lead.updated_at)
+        if with_interactions and per_lead != 0:
+            interactions_agence = Interaction.query.filter(
+                Interaction.lead_id.in_(leads_agence.with_entities(Lead.id).scalar_subquery()))
+            validateur += aggregate_validator(interactions_agence, Interaction.date)
+            if interactions_buffer() is not None:
+                # Interactions en attente d'insertion : l'ETag change dès l'ajout
+                validateur += (interactions_buffer().version,)
+        last_modified = max((d for d in validateur[1::2] if d), default=None)
+        etag = make_etag(*validateur)
+        if is_fresh(etag, last_modified):
+            return not_modified(etag, last_modified)
+
+        # Tri décroissant (date de création ou score), reprise après ?cursor=
+        query = keyset_page(leads_agence, sort_col, Lead.id, request.args.get('cursor'), key_type)
+        if fields is None:
+            fields = LEAD_FIELDS
+        else:
+            # Projection SQL : seules les colonnes demandées (+ clé de tri) sont lues
+            query = query.options(db.load_only(*load_columns(Lead, fields, ('id', sort_name))))
+
+        # Mode streaming (?stream=1) : toute la suite de la liste, sans la charger en mémoire
+        if request.args.get('stream') in ('1', 'true'):
+            if request.args.get('limit'):
+                query = query.limit(parse_limit(request.args.get('limit')))
+            response = Response(stream_with_context(stream_leads(query, per_lead, fields, with_interactions)), mimetype='application/json')
+            return with_validators(response, etag, last_modified)
+
+        # On lit une ligne de plus pour savoir s'il existe une page suivante
+        limit = parse_limit(request.args.get('limit'))
+        leads = query.limit(limit + 1).all()
+        next_cursor = None
+        if len(leads) > limit:
+            leads = leads[:limit]
+            next_cursor = encode_cursor(getattr(leads[-1], sort_name), leads[-1].id)
+
+        leads_data = serialize_page(leads, per_lead, fields, with_interactions)
+        response = jsonify({'status': 'success', 'data': {'leads_chauds': leads_data, 'next_cursor': next_cursor}})
+        return with_validators(response, etag, last_modified), 200
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# --- RECHERCHE (nom, email, téléphone, adresse) ---
+def parse_page(value):
+    if value in (None, ''):
+        return 1
+    try:
+        page = int(value)
+    except ValueError:
+        raise ValueError(f"Paramètre page invalide : {value}")
+    if page < 1:
+        raise ValueError(f"Paramètre page invalide : {value}")
+    return page
+
+@bp.route('/api/leads/search', methods=['GET'])
+def search_leads():
+    try:
+        agency_id = parse_agency_id(request.args.get('agency_id'))
+        q = request.args.get('q', '')
+        fields = parse_fields(request.args.get('fields'), LEAD_FIELDS) or LEAD_FIELDS
+        page = parse_page(request.args.get('page'))
+        limit = parse_limit(request.args.get('limit'), default=20)
+
+        # Un numéro ou un email saisi autrement que stocké est retrouvé par sa forme normalisée (index unique)
+        exactes = []
+        telephone_e164 = normalize_phone(q)
+        if telephone_e164:
+            exactes.append(Lead.telephone_e164 == telephone_e164)
+        if '@' in q:
+            exactes.append(Lead.email_normalise == normalize_email(q))
+
+        query = search.search_query(db, Lead, agency_id, q, exactes)
+        query = query.options(db.load_only(*load_columns(Lead, fields, ('id',))))
+        # Une ligne de plus pour savoir s'il existe une page suivante
+        leads = query.offset((page - 1) * limit).limit(limit + 1).all()
+        next_page = page + 1 if len(leads) > limit else None
+
+        data = [lead_to_dict(l, fields=fields) for l in leads[:limit]]
+        return jsonify({'status': 'success', 'data': {'leads': data, 'page': page, 'next_page': next_page}}), 200
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+# --- EXPORT (CSV / NDJSON) ---
+LEAD_EXPORT_FIELDS = LEAD_FIELDS + ('source', 'updated_at')
+EXPORT_BATCH_SIZE = 1000
+
+def export_interactions(lead_ids):
+    """Interactions d'un lot de leads en une requête (index lead_id, date) : {lead_id: [(id, type, détails, date)]}."""
+    by_lead = {}
+    query = (
+        db.session.query(Interaction.lead_id, Interaction.id, Interaction.type_action,
+                         Interaction.details, Interaction.date)
+        .filter(Interaction.lead_id.in_(lead_ids))
+        .order_by(Interaction.lead_id, Interaction.date.desc())
+    )
+    for lead_id, *interaction in query:
+        by_lead.setdefault(lead_id, []).append(interaction)
+    return by_lead
+
+def export_chunks(agency_id, export_format, fields, mode, batch_size=EXPORT_BATCH_SIZE):
+    """Génère l'export par lots : l'en-tête part avant la première lecture en base."""
+    columns = export.header(fields, mode)
+    if export_format == 'csv':
+        yield export.csv_chunk([columns])
+
+    # Tuples de colonnes (pas d'objets ORM), curseur serveur et lots bornés en mémoire
+    query = (
+        db.session.query(*[getattr(Lead, f) for f in fields])
+        .filter(Lead.agency_id == agency_id)
+        .order_by(Lead.created_at.desc(), Lead.id.desc())
+    )
+    rows = iter(query.execution_options(stream_results=True).yield_per(batch_size))
+    id_index = fields.index('id') if mode else None
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        interactions = export_interactions([r[id_index] for r in batch]) if mode else None
+        if mode == export.FLAT:
+            batch = export.flatten(batch, interactions, id_index)
+        if export_format == 'csv':
+            yield export.csv_chunk(batch)
+        else:
+            nested = (id_index, interactions) if mode == export.NESTED else None
+            yield export.ndjson_chunk(batch, columns, current_app.json.dumps, nested)
+
+@bp.route('/api/leads/export', methods=['GET'])
+def export_leads():
+    try:
+        agency_id = parse_agency_id(request.args.get('agency_id'))
+        export_format = export.parse_format(request.args.get('format'))
+        mode = export.parse_interactions_mode(request.args.get('interactions'), export_format)
+        fields = parse_fields(request.args.get('fields'), LEAD_EXPORT_FIELDS) or LEAD_EXPORT_FIELDS
+        if mode and 'id' not in fields:
+            # Clé de rattachement des interactions
+            fields = ('id',) + fields
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    chunks = stream_with_context(export_chunks(agency_id, export_format, fields, mode))
+    headers = {
+        'Content-Disposition': f'attachment; filename="leads-{datetime.utcnow():%Y%m%d}.{export_format}"',
+        'Cache-Control': 'no-store',
+        'Vary': 'Accept-Encoding',
+    }
+    # Compression au fil de l'eau (les réponses streamées échappent à init_compression)
+    if request.accept_encodings['gzip']:
+        chunks = gzip_stream(chunks, current_app.config['COMPRESS_LEVEL'])
+        headers['Content-Encoding'] = 'gzip'
+    mimetype = export.EXPORT_FORMATS[export_format]
+    return Response(chunks, mimetype=mimetype, headers=headers)
+
+# --- TABLEAU DE BORD ---
+# Nombre de leads chauds listés sur le tableau de bord (les compteurs couvrent le reste)
+DASHBOARD_LEADS_CHAUDS_LIMIT = 50
+
+@bp.route('/api/dashboard', methods=['GET'])
+def dashboard():
+    try:
+        agency_id = parse_agency_id(request.args.get('agency_id'))
+        fields = parse_fields(request.args.get('fields'), LEAD_FIELDS) or LEAD_FIELDS
+
+        # Compteurs précalculés de l'agence (une ligne lue, pas de parcours des leads)
+        total_leads, leads_chauds = stats.get_stats(db.session.connection(), Lead.__table__,
+                                                    AgencyStats.__table__, agency_id)
+        db.session.commit()
+
+        # Les leads chauds les mieux notés (index agency_id, score_ia DESC, id DESC)
+        meilleurs = (
+            Lead.query
+            .filter(Lead.agency_id == agency_id, Lead.score_ia >= stats.SEUIL_CHAUD)
+            .order_by(Lead.score_ia.desc(), Lead.id.desc())
+            .options(db.load_only(*load_columns(Lead, fields, ('id', 'score_ia'))))
+            .limit(DASHBOARD_LEADS_CHAUDS_LIMIT)
+            .all()
+        )
+        return jsonify({'status': 'success', 'data': {
+            'leads_chauds': [lead_to_dict(l, fields=fields) for l in meilleurs],
+            'stats': {
+                'total_leads': total_leads,
+                'leads_chauds': leads_chauds,
+                'taux_chauds': round(leads_chauds / total_leads * 100 if total_leads else 0, 2)
+            }
+        }}), 200
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
+        db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 # --- ROUTE 3 : MISE À JOUR CRM (Pour le menu déroulant) ---
-@app.route('/api/leads/<int:id>/statut', methods=['PUT'])
+@bp.route('/api/leads/<uuid:id>/statut', methods=['PUT'])
 def update_statut(id):
     try:
-        lead = Lead.query.get(id)
+        lead = db.session.get(Lead, id)
         if not lead:
             return jsonify({'error': 'Lead non trouvé'}), 404
         
@@ -197,11 +1005,14 @@ def update_statut(id):
         return jsonify({'error': str(e)}), 500
 
 # --- ROUTE 4 : AJOUT INTERACTION (HISTORIQUE CRM) ---
-@app.route('/api/leads/<int:id>/interactions', methods=['POST'])
+def lead_existe(id):
+    """Lecture de la seule clé primaire (pas de chargement du lead)."""
+    return db.session.query(Lead.id).filter(Lead.id == id).first() is not None
+
+@bp.route('/api/leads/<uuid:id>/interactions', methods=['POST'])
 def add_interaction(id):
     try:
-        lead = Lead.query.get(id)
-        if not lead:
+        if not lead_existe(id):
             return jsonify({'error': 'Lead non trouvé'}), 404
         
         data = request.json
@@ -210,36 +1021,50 @@ def add_interaction(id):
         
         if not type_action:
             return jsonify({'error': 'Type d\'action manquant'}), 400
+        # Validé ici : en écriture différée, une ligne refusée par la base serait perdue après la réponse
+        if len(type_action) > 50 or len(details or '') > 500:
+            return jsonify({'error': "type_action (50) ou details (500) trop long"}), 400
         
-        new_interaction = Interaction(
-            lead_id=id,
-            type_action=type_action,
-            details=details,
-            date=datetime.utcnow()
-        )
+        row = {
+            'id': uuid.uuid4(),
+            'lead_id': id,
+            'type_action': type_action,
+            'details': details,
+            'date': datetime.utcnow(),
+            'created_by': None
+        }
         
-        db.session.add(new_interaction)
-        db.session.commit()
+        buffer = interactions_buffer()
+        if buffer is not None:
+            # Journalisée et mise en attente ; insérée avec les autres au prochain lot
+            try:
+                buffer.add(row)
+            except BufferFull as e:
+                return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+            status = 202
+        else:
+            db.session.add(Interaction(**row))
+            db.session.commit()
+            status = 201
         
         return jsonify({
             'success': True, 
             'interaction': {
-                'id': new_interaction.id,
-                'type_action': new_interaction.type_action,
-                'details': new_interaction.details,
-                'date': new_interaction.date.isoformat()
+                'id': row['id'],
+                'type_action': row['type_action'],
+                'details': row['details'],
+                'date': row['date']
             }
-        }), 201
+        }), status
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # --- ROUTE 5 : GÉNÉRATION ANNONCE IA ---
-@app.route('/api/generate-annonce', methods=['POST'])
-def generate_annonce():
-    try:
-        data = request.json
-        prompt = f"""
+ANNONCE_MODEL = "gpt-3.5-turbo"
+
+def build_annonce_prompt(data):
+    return f"""
         Agis comme un agent immobilier de luxe en France. Rédige une annonce vendeuse pour :
         - Bien : {data.get('type')}
         - Lieu : {data.get('adresse')}
@@ -249,27 +1074,318 @@ def generate_annonce():
         Utilise des emojis, un ton professionnel et accrocheur.
         """
 
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return jsonify({'text': response.choices[0].message.content})
+def generer_annonce(prompt):
+    debut = time.perf_counter()
+    response = annonces().client.chat.completions.create(
+        model=ANNONCE_MODEL,
+        messages=[{"role": "user", "content": prompt}]
+    )
+    observe_openai(ANNONCE_MODEL, time.perf_counter() - debut, response.usage)
+    return response.choices[0].message.content
+
+def obtenir_annonce(data, no_cache=False):
+    """Retourne (texte, servi_depuis_le_cache) ; no_cache force une nouvelle génération."""
+    annonce_cache = annonces().cache
+    key = make_key(data, ANNONCE_MODEL)
+    if not no_cache:
+        text = annonce_cache.get(key)
+        if text is not None:
+            return text, True
+
+    def generer():
+        text = generer_annonce(build_annonce_prompt(data))
+        annonce_cache.set(key, text)
+        return text
+
+    # Entre workers, le résultat d'un appel concurrent est relu dans le cache partagé
+    lookup = None if no_cache else (lambda: annonce_cache.get(key))
+    return annonces().flights.do(key, generer, lookup), False
+
+@bp.route('/api/generate-annonce', methods=['POST'])
+def generate_annonce():
+    try:
+        data = request.json
+        no_cache = request.args.get('no_cache') in ('1', 'true') or bool(data.get('no_cache'))
+
+        # Mode asynchrone : on rend la main tout de suite, le pool fait l'appel OpenAI
+        if request.args.get('async') in ('1', 'true') or data.get('async'):
+            app = current_app._get_current_object()
+
+            def tache():
+                with app.app_context():
+                    return obtenir_annonce(data, no_cache)[0]
+
+            try:
+                job_id = annonces().jobs.submit(tache)
+            except QueueFull as e:
+                return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+            return (jsonify({'job_id': job_id, 'status': 'pending'}), 202,
+                    {'Location': f'/api/generate-annonce/{job_id}'})
+
+        text, cached = obtenir_annonce(data, no_cache)
+        return jsonify({'text': text, 'cached': cached})
 
     except Exception as e:
         print(f"Erreur IA: {e}")
         return jsonify({'error': str(e)}), 500
 
+def sse(data, event=None):
+    """Formate un message Server-Sent Events."""
+    message = f"event: {event}\n" if event else ''
+    return message + f"data: {current_app.json.dumps(data)}\n\n"
+
+def stream_annonce(data, no_cache=False):
+    """Génère les événements SSE d'une annonce : deltas de texte puis 'done' avec le texte complet."""
+    try:
+        annonce_cache = annonces().cache
+        key = make_key(data, ANNONCE_MODEL)
+        text = None if no_cache else annonce_cache.get(key)
+        if text is not None:
+            yield sse({'delta': text})
+            yield sse({'text': text, 'cached': True}, event='done')
+            return
+
+        # Premier octet envoyé avant même la réponse d'OpenAI
+        yield ': generation\n\n'
+        debut = time.perf_counter()
+        response = annonces().client.chat.completions.create(
+            model=ANNONCE_MODEL,
+            messages=[{"role": "user", "content": build_annonce_prompt(data)}],
+            stream=True,
+            # Dernier morceau sans choices, porteur de la consommation de tokens
+            stream_options={"include_usage": True}
+        )
+        morceaux = []
+        usage = None
+        for chunk in response:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                morceaux.append(delta)
+                yield sse({'delta': delta})
+            usage = getattr(chunk, 'usage', None) or usage
+        observe_openai(ANNONCE_MODEL, time.perf_counter() - debut, usage, mode='stream')
+
+        text = ''.join(morceaux)
+        annonce_cache.set(key, text)
+        yield sse({'text': text, 'cached': False}, event='done')
+    except Exception as e:
+        print(f"Erreur IA: {e}")
+        yield sse({'error': str(e)}, event='error')
+
+@bp.route('/api/generate-annonce/stream', methods=['GET', 'POST'])
+def generate_annonce_stream():
+    # GET (paramètres d'URL) pour EventSource, POST (JSON) pour fetch()
+    data = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+    no_cache = request.args.get('no_cache') in ('1', 'true') or bool(data.get('no_cache'))
+    return Response(
+        stream_with_context(stream_annonce(data, no_cache)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@bp.route('/api/generate-annonce/cache-stats', methods=['GET'])
+def generate_annonce_cache_stats():
+    stats = annonces().cache.stats()
+    # Requêtes servies par un appel identique déjà en cours (compteur du processus)
+    stats['coalesced'] = annonces().flights.coalesced
+    return jsonify(stats)
+
+@bp.route('/api/generate-annonce/<job_id>', methods=['GET'])
+def generate_annonce_status(job_id):
+    job = annonces().jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Tâche inconnue ou expirée'}), 404
+
+    body = {'job_id': job_id, 'status': job['status']}
+    if job['status'] == DONE:
+        body['text'] = job['result']
+    elif job['status'] == ERROR:
+        body['error'] = job['error']
+    return jsonify(body)
+
+# --- ROUTE 6 : ÉTAT DU POOL DE CONNEXIONS ---
+@bp.route('/api/metrics/pool', methods=['GET'])
+def metrics_pool():
+    return jsonify(pool_status(db.engine))
+
+# --- ROUTE 7 : MÉTRIQUES PROMETHEUS ---
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    pool = pool_status(db.engine)
+    extra = [
+        ('db_pool_checkouts_total', 'counter', 'Connexions obtenues du pool', pool['checkouts']),
+        ('db_pool_wait_seconds_total', 'counter', "Temps d'attente cumulé d'une connexion libre", pool['wait_seconds_total']),
+        ('db_pool_wait_seconds_max', 'gauge', "Plus longue attente d'une connexion libre", pool['wait_seconds_max']),
+    ]
+    if 'checked_out' in pool:
+        extra.append(('db_pool_checked_out', 'gauge', 'Connexions actuellement empruntées', pool['checked_out']))
+    if interactions_buffer() is not None:
+        extra.append(('interactions_buffer_pending', 'gauge', "Interactions en attente d'insertion", interactions_buffer().pending()))
+    return Response(render_metrics(extra), mimetype='text/plain; version=0.0.4')
+
+# --- 4. COMMANDES CLI ---
+@bp.cli.command('init-db')
+def init_db_command():
+    """Crée les tables manquantes (à lancer au déploiement, pas au démarrage des workers)."""
+    db.create_all()
+    # Tables déjà existantes : create_all ne déclenche pas la création des index de recherche
+    # ni celle des triggers (identifiants normalisés, compteurs du tableau de bord)
+    search.install(db.session.connection())
+    dedup.install(db.session.connection())
+    stats.install(db.session.connection())
+    db.session.commit()
+    print("✅ Tables créées")
+
+@bp.cli.command('search-rebuild')
+def search_rebuild_command():
+    """Réindexe la recherche plein texte SQLite (après un VACUUM ou un import hors application)."""
+    search.rebuild(db.session.connection())
+    db.session.commit()
+    print("✅ Index de recherche reconstruit")
+
+@bp.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Reconstruit les compteurs du tableau de bord depuis la table des leads."""
+    agences = stats.rebuild(db.session.connection(), Lead.__table__, AgencyStats.__table__)
+    db.session.commit()
+    print(f"✅ Compteurs recalculés pour {agences} agence(s)")
+
+# Taille des lots lus / réécrits par le re-scoring
+RESCORE_CHUNK_SIZE = 50000
+
+def rescore_agency(agency_id, chunk_size=RESCORE_CHUNK_SIZE):
+    """Re-score tous les leads d'une agence par lots ; n'écrit que les lignes dont le score change.
+
+    Seules les colonnes utiles au scoring sont lues (pas d'objets ORM), le lot
+    est scoré en vectoriel puis les lignes modifiées sont mises à jour en un
+    UPDATE par clé primaire (executemany) et une transaction par lot.
+    Retourne (leads analysés, leads mis à jour).
+    """
+    scanned = updated = 0
+    last_id = None
+    while True:
+        query = (
+            db.session.query(Lead.id, Lead.telephone, Lead.email, Lead.adresse,
+                             Lead.budget, Lead.score_ia, Lead.statut)
+            .filter(Lead.agency_id == agency_id)
+        )
+        if last_id is not None:
+            query = query.filter(Lead.id > last_id)
+        rows = query.order_by(Lead.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        scanned += len(rows)
+
+        ids, telephones, emails, adresses, budgets, anciens_scores, anciens_statuts = zip(*rows)
+        _, scores, statuts = score_columns(telephones, emails, adresses, budgets)
+        changes = [
+            {'id': id, 'score_ia': score, 'statut': statut_ia}
+            for id, score, statut_ia, ancien_score, ancien_statut in zip(
+                ids, scores.tolist(), statuts, anciens_scores, anciens_statuts)
+            if score != ancien_score or statut_ia != ancien_statut
+        ]
+        if changes:
+            db.session.execute(db.update(Lead), changes)
+            updated += len(changes)
+        db.session.commit()
+    return scanned, updated
+
+@bp.cli.command('rescore-agency')
+@click.argument('agency_id')
+@click.option('--chunk-size', default=RESCORE_CHUNK_SIZE, show_default=True, help='Leads par lot')
+def rescore_agency_command(agency_id, chunk_size):
+    """Re-score tous les leads d'une agence avec les règles actuelles."""
+    scanned, updated = rescore_agency(uuid.UUID(agency_id), chunk_size)
+    print(f"✅ {scanned} leads analysés, {updated} scores mis à jour")
+
+@bp.cli.command('import-leads')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--agency-id', required=True, help='Agence qui reçoit les leads')
+@click.option('--map', 'mapping', default='', help='Correspondances colonne=champ séparées par des virgules')
+@click.option('--delimiter', default=None, help="Séparateur (deviné sur l'en-tête par défaut)")
+@click.option('--chunk-size', default=IMPORT_CHUNK_SIZE, show_default=True, help='Lignes par lot')
+@click.option('--errors', 'errors_path', type=click.Path(dir_okay=False), default=None,
+              help='Rapport CSV des lignes refusées (ligne, message)')
+def import_leads_command(path, agency_id, mapping, delimiter, chunk_size, errors_path):
+    """Importe un fichier CSV de leads dans une agence (migration depuis un autre CRM)."""
+    try:
+        agency_id = parse_agency_id(agency_id)
+        mapping = csv_import.parse_mapping(mapping)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    if db.session.get(Agency, agency_id) is None:
+        raise click.ClickException('Agence non trouvée')
+
+    with open(path, 'rb') as fichier:
+        try:
+            records, columns, ignorees = ouvrir_import(fichier, mapping, delimiter)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        print('Colonnes : ' + ', '.join(f'{colonne} -> {champ}' for champ, colonne in columns.items())
+              + (f" (ignorées : {', '.join(ignorees)})" if ignorees else ''))
+        rapport = open(errors_path, 'w', newline='', encoding='utf-8') if errors_path else None
+        try:
+            writer = csv.writer(rapport) if rapport else None
+            if writer:
+                writer.writerow(('ligne', 'message'))
+            affichees = 0
+            for evenement in import_leads(records, agency_id, chunk_size):
+                if evenement['type'] == 'error':
+                    if writer:
+                        writer.writerow((evenement['line'], evenement['message']))
+                    elif affichees < IMPORT_ERRORS_SHOWN:
+                        affichees += 1
+                        print(f"  ligne {evenement['line']} : {evenement['message']}")
+                elif evenement['type'] == 'progress':
+                    print(f"  {evenement['rows']} lignes : {evenement['created']} créées, "
+                          f"{evenement['merged']} fusionnées, {evenement['errors']} refusées "
+                          f"({evenement['rows_per_s']:,} lignes/s)", flush=True)
+                else:
+                    bilan = evenement
+        finally:
+            if rapport:
+                rapport.close()
+    print(f"✅ {bilan['rows']} lignes en {bilan['elapsed_s']:.1f} s : {bilan['created']} leads créés, "
+          f"{bilan['merged']} fusionnés avec un lead existant, {bilan['errors']} refusées"
+          + (f" (détail : {errors_path})" if errors_path and bilan['errors'] else '')
+          + (' (--errors pour le rapport complet)' if not errors_path and bilan['errors'] > affichees else ''))
+
+@bp.cli.command('seed-data')
+@click.option('--agencies', default=10, show_default=True, help="Nombre d'agences")
+@click.option('--leads', default=10000, show_default=True, help='Nombre de leads (toutes agences)')
+@click.option('--profiles-per-agency', default=3, show_default=True, help='Agents par agence')
+@click.option('--interactions-mean', default=2.0, show_default=True, help="Interactions moyennes par lead")
+@click.option('--days', default=365, show_default=True, help='Période couverte par les dates de création')
+@click.option('--seed', default=42, show_default=True, help='Graine : même graine, mêmes données')
+@click.option('--chunk-size', default=10000, show_default=True, help='Lignes par INSERT')
+def seed_data_command(agencies, leads, profiles_per_agency, interactions_mean, days, seed, chunk_size):
+    """Remplit la base avec des données synthétiques réalistes et reproductibles."""
+    debut = time.perf_counter()
+
+    def progression(comptes):
+        ecoule = time.perf_counter() - debut
+        print(f"  {comptes['leads']}/{leads} leads, {comptes['interactions']} interactions "
+              f"({comptes['leads'] / ecoule:,.0f} leads/s)", flush=True)
+
+    db.create_all()
+    comptes = populate(db, (Agency, Profile, Lead, Interaction), agencies=agencies, leads=leads, seed=seed,
+                       profiles_per_agency=profiles_per_agency, interactions_mean=interactions_mean,
+                       days=days, chunk_size=chunk_size, progress=progression)
+    db.session.commit()
+    print(f"✅ {comptes['agencies']} agences, {comptes['profiles']} profils, {comptes['leads']} leads, "
+          f"{comptes['interactions']} interactions en {time.perf_counter() - debut:.1f} s")
+
 # --- 🚨 ROUTE DE SECOURS (RESET DB) 🚨 ---
-@app.route('/api/debug/reset-db', methods=['GET'])
+@bp.route('/api/debug/reset-db', methods=['GET'])
 def reset_database():
     try:
-        with app.app_context():
-            db.drop_all()
-            db.create_all()
+        db.drop_all()
+        db.create_all()
         return jsonify({'message': '✅ Base de données réparée et mise à jour avec succès !'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port)
\ No newline at end of file
+    create_app().run(host="0.0.0.0", port=port)
\ No newline at end of file
@@ -0,0 +1,388 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark des routes critiques de l'API
+Démarre le serveur (gunicorn ou serveur de dev) sur une base SQLite jetable ou
+DATABASE_URL, avec un faux OpenAI local, puis mesure chaque scénario à concurrence donnée :
+latences p50/p95/p99, débit, codes de statut et pic de RSS du serveur, en JSON
+
+Usage :
+    python benchmarks/bench_api.py [--concurrency 8] [--requests 500] [--server gunicorn|dev]
+    python benchmarks/bench_api.py --save benchmarks/baselines/v1.json
+    python benchmarks/bench_api.py --compare benchmarks/baselines/v1.json [--tolerance 0.2]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench_cold_start import BACKEND_DIR, DEV_SERVER_SCRIPT, port_libre
+
+ANNONCE_STUB = "🏡 Superbe appartement lumineux, proche de toutes commodités. À visiter sans tarder !"
+
+
+class FakeOpenAI(BaseHTTPRequestHandler):
+    """Imite POST /v1/chat/completions (réponse complète ou SSE) avec une latence fixe."""
+
+    latency = 0.05
+
+    def do_POST(self):
+        corps = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        time.sleep(self.latency)
+        usage = {'prompt_tokens': 80, 'completion_tokens': 40, 'total_tokens': 120}
+        base = {'id': 'chatcmpl-bench', 'created': int(time.time()), 'model': corps.get('model', 'bench')}
+
+        if corps.get('stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            for mot in ANNONCE_STUB.split(' '):
+                chunk = dict(base, object='chat.completion.chunk',
+                             choices=[{'index': 0, 'delta': {'content': mot + ' '}, 'finish_reason': None}])
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            fin = dict(base, object='chat.completion.chunk', choices=[], usage=usage)
+            self.wfile.write(f"data: {json.dumps(fin)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+            return
+
+        reponse = json.dumps(dict(base, object='chat.completion', usage=usage, choices=[{
+            'index': 0, 'finish_reason': 'stop',
+            'message': {'role': 'assistant', 'content': ANNONCE_STUB}
+        }])).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reponse)))
+        self.end_headers()
+        self.wfile.write(reponse)
+
+    def log_message(self, *args):
+        pass
+
+
+def demarrer_faux_openai(latency):
+    FakeOpenAI.latency = latency
+    serveur = ThreadingHTTPServer(('127.0.0.1', port_libre()), FakeOpenAI)
+    threading.Thread(target=serveur.serve_forever, daemon=True).start()
+    return serveur
+
+
+def environnement(tmpdir, args, openai_port):
+    env = dict(os.environ)
+    if not args.database_url:
+        env.pop('SUPABASE_DB_URL', None)
+    env['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    env['ANNONCE_CACHE_PATH'] = os.path.join(tmpdir, 'annonce_cache.db')
+    env['OPENAI_API_KEY'] = 'bench'
+    env['OPENAI_BASE_URL'] = f'http://127.0.0.1:{openai_port}/v1'
+    env['WEB_CONCURRENCY'] = str(args.workers)
+    env['PORT'] = str(port_libre())
+    # Le journal des requêtes lentes fausserait les mesures
+    env['SLOW_QUERY_MS'] = '0'
+    return env
+
+
+SEED_SCRIPT = """
+import sys, uuid
+from app import create_app, db, Agency
+app = create_app()
+with app.app_context():
+    db.create_all()
+    agence = Agency(id=uuid.UUID(sys.argv[1]), nom_agence='Agence Benchmark')
+    db.session.merge(agence)
+    db.session.commit()
+"""
+
+
+def preparer_base(env, agency_id):
+    """Tables et agence de test, dans un processus séparé (les leads passent ensuite par l'API)."""
+    subprocess.run([sys.executable, '-c', SEED_SCRIPT, agency_id], cwd=BACKEND_DIR, env=env, check=True)
+
+
+def semer_leads(port, agency_id, nombre):
+    lots = [[{'agency_id': agency_id, 'nom': f'Lead {i}', 'email': f'lead{i}@bench.fr',
+              'telephone': f'06{i:08d}' if i % 2 else '', 'budget': str(50000 + 7919 * i % 900000),
+              'adresse': 'Paris' if i % 3 == 0 else 'Lyon', 'source': 'benchmark'}
+             for i in range(debut, min(debut + 1000, nombre))]
+            for debut in range(0, nombre, 1000)]
+    for lot in lots:
+        statut, _ = appeler(port, 'POST', '/api/leads/bulk', lot)
+        if statut != 200:
+            raise RuntimeError(f"Import des leads impossible (HTTP {statut})")
+
+
+_local = threading.local()
+
+
+def appeler(port, method, path, body=None):
+    """Requête HTTP en keep-alive (une connexion par thread client) ; retourne (statut, corps)."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _local.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    try:
+        conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        reponse = conn.getresponse()
+        return reponse.status, reponse.read()
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        _local.conn = None
+        raise
+
+
+def attendre_serveur(port, processus, timeout=30):
+    debut = time.monotonic()
+    while time.monotonic() - debut < timeout:
+        if processus.poll() is not None:
+            raise RuntimeError(f"Le serveur s'est arrêté (code {processus.returncode})")
+        try:
+            if appeler(port, 'GET', '/')[0] == 200:
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Aucune réponse après {timeout} s")
+
+
+def scenarios(agency_id, lead_ids):
+    """Nom -> fabrique (numéro de requête) -> (méthode, chemin, corps)."""
+    def lead(n):
+        # Email et téléphone distincts : chaque requête crée un lead (pas de fusion de doublon)
+        return {'agency_id': agency_id, 'nom': f'Bench {n}', 'email': f'bench{n}@test.fr',
+                'telephone': f'07{n:08d}', 'budget': '420000', 'adresse': 'Bordeaux'}
+
+    return {
+        'add_lead': lambda n: ('POST', '/api/leads', lead(n)),
+        'leads_chauds': lambda n: ('GET', f'/api/leads-chauds?agency_id={agency_id}&limit=50', None),
+        'dashboard': lambda n: ('GET', f'/api/dashboard?agency_id={agency_id}', None),
+        'submit_lead': lambda n: ('POST', '/api/submit-lead', {
+            'nom_client': f'Bench {n}', 'email_client': f'submit{n}@test.fr', 'telephone': '0611223344'}),
+        'add_interaction': lambda n: ('POST', f'/api/leads/{lead_ids[n % len(lead_ids)]}/interactions',
+                                      {'type_action': 'Appel', 'details': 'Benchmark'}),
+        # no_cache : chaque requête passe par le (faux) OpenAI
+        'generate_annonce': lambda n: ('POST', '/api/generate-annonce?no_cache=1', {
+            'type': 'Appartement', 'adresse': 'Lyon', 'prix': 300000 + n, 'surface': 60, 'pieces': 3}),
+    }
+
+
+def rss_arbre(pid):
+    """RSS (octets) du processus et de ses descendants, via /proc (Linux)."""
+    enfants = {}
+    for entree in os.listdir('/proc'):
+        if entree.isdigit():
+            try:
+                with open(f'/proc/{entree}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+                enfants.setdefault(ppid, []).append(int(entree))
+            except (OSError, IndexError, ValueError):
+                continue
+    total, pile = 0, [pid]
+    while pile:
+        courant = pile.pop()
+        pile.extend(enfants.get(courant, []))
+        try:
+            with open(f'/proc/{courant}/status') as f:
+                for ligne in f:
+                    if ligne.startswith('VmRSS:'):
+                        total += int(ligne.split()[1]) * 1024
+        except OSError:
+            continue
+    return total
+
+
+class RssSampler(threading.Thread):
+    """Échantillonne le RSS du serveur pendant le benchmark et garde le maximum."""
+
+    def __init__(self, pid, interval=0.1):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._arret = threading.Event()
+
+    def run(self):
+        if not os.path.isdir('/proc'):
+            return
+        while not self._arret.is_set():
+            self.peak = max(self.peak, rss_arbre(self.pid))
+            self._arret.wait(self.interval)
+
+    def stop(self):
+        self._arret.set()
+        self.join()
+
+
+def percentile(valeurs, p):
+    if len(valeurs) == 1:
+        return valeurs[0]
+    return statistics.quantiles(valeurs, n=100, method='inclusive')[p - 1]
+
+
+def executer(port, fabrique, total, concurrence):
+    """Envoie total requêtes sur concurrence threads ; retourne le résumé du scénario."""
+    latences, statuts = [], {}
+    verrou = threading.Lock()
+
+    def une(n):
+        method, path, body = fabrique(n)
+        debut = time.perf_counter()
+        try:
+            statut, _ = appeler(port, method, path, body)
+        except (OSError, http.client.HTTPException):
+            statut = 'erreur_reseau'
+        duree = time.perf_counter() - debut
+        with verrou:
+            latences.append(duree)
+            statuts[str(statut)] = statuts.get(str(statut), 0) + 1
+
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(concurrence) as pool:
+        list(pool.map(une, range(total)))
+    ecoule = time.perf_counter() - debut
+
+    erreurs = sum(n for s, n in statuts.items() if not s.startswith(('2', '3')))
+    return {
+        'requests': total,
+        'errors': erreurs,
+        'status_codes': statuts,
+        'throughput_rps': round(total / ecoule, 1),
+        'p50_ms': round(percentile(latences, 50) * 1000, 2),
+        'p95_ms': round(percentile(latences, 95) * 1000, 2),
+        'p99_ms': round(percentile(latences, 99) * 1000, 2),
+        'mean_ms': round(statistics.fmean(latences) * 1000, 2),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparer(resultat, reference, tolerance):
+    """Régressions au-delà de tolerance (0.2 = 20 %) sur p95 et débit, par scénario commun."""
+    regressions = []
+    for nom, mesure in resultat['scenarios'].items():
+        ref = reference.get('scenarios', {}).get(nom)
+        if not ref or 'skipped' in mesure or 'skipped' in ref:
+            continue
+        if mesure['p95_ms'] > ref['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{nom} : p95 {ref['p95_ms']} -> {mesure['p95_ms']} ms")
+        if mesure['throughput_rps'] < ref['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{nom} : débit {ref['throughput_rps']} -> {mesure['throughput_rps']} req/s")
+        if mesure['errors'] > ref['errors']:
+            regressions.append(f"{nom} : erreurs {ref['errors']} -> {mesure['errors']}")
+    ref_rss, rss = reference.get('peak_rss_mb'), resultat.get('peak_rss_mb')
+    if ref_rss and rss and rss > ref_rss * (1 + tolerance):
+        regressions.append(f"RSS max : {ref_rss} -> {rss} Mo")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500, help='requêtes par scénario')
+    parser.add_argument('--seed-leads', type=int, default=2000, help='leads créés avant les mesures')
+    parser.add_argument('--server', choices=('gunicorn', 'dev'), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2, help='workers gunicorn')
+    parser.add_argument('--database-url', help='PostgreSQL de test (défaut : SQLite temporaire)')
+    parser.add_argument('--openai-latency', type=float, default=0.05, help='latence simulée (s)')
+    parser.add_argument('--scenario', action='append', help='limite aux scénarios nommés (répétable)')
+    parser.add_argument('--save', help='enregistre le résultat comme référence')
+    parser.add_argument('--compare', help='référence à comparer (code de sortie 1 si régression)')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    faux_openai = demarrer_faux_openai(args.openai_latency)
+    agency_id = str(uuid.uuid4())
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = environnement(tmpdir, args, faux_openai.server_address[1])
+        port = int(env['PORT'])
+        preparer_base(env, agency_id)
+
+        commande = [sys.executable, 'serve.py'] if args.server == 'gunicorn' else [sys.executable, '-c', DEV_SERVER_SCRIPT]
+        processus = subprocess.Popen(commande, cwd=BACKEND_DIR, env=env,
+                                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        sampler = RssSampler(processus.pid)
+        try:
+            attendre_serveur(port, processus)
+            semer_leads(port, agency_id, args.seed_leads)
+            _, corps = appeler(port, 'GET', f'/api/leads-chauds?agency_id={agency_id}&fields=id&limit=200')
+            lead_ids = [l['id'] for l in json.loads(corps)['data']['leads_chauds']]
+
+            sampler.start()
+            resultats = {}
+            for nom, fabrique in scenarios(agency_id, lead_ids).items():
+                if args.scenario and nom not in args.scenario:
+                    continue
+                # Sonde : une route absente de cette application est signalée, pas mesurée
+                method, path, body = fabrique(0)
+                statut, _ = appeler(port, method, path, body)
+                if statut in (404, 405):
+                    resultats[nom] = {'skipped': f'{method} {path.split("?")[0]} -> HTTP {statut}'}
+                    continue
+                resultats[nom] = executer(port, fabrique, args.requests, args.concurrency)
+            sampler.stop()
+        finally:
+            processus.terminate()
+            try:
+                processus.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                # Connexions keep-alive encore ouvertes : inutile d'attendre graceful_timeout
+                processus.kill()
+                processus.wait()
+            faux_openai.shutdown()
+
+    resultat = {
+        'meta': {
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'server': args.server,
+            'workers': args.workers if args.server == 'gunicorn' else 1,
+            'concurrency': args.concurrency,
+            'requests_per_scenario': args.requests,
+            'seed_leads': args.seed_leads,
+            'database': 'postgresql' if args.database_url else 'sqlite',
+            'openai_latency_s': args.openai_latency,
+        },
+        'peak_rss_mb': round(sampler.peak / 1024 / 1024, 1) if sampler.peak else None,
+        'scenarios': resultats,
+    }
+    print(json.dumps(resultat, indent=2, ensure_ascii=False))
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(resultat, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            reference = json.load(f)
+        differences = [k for k in ('server', 'workers', 'concurrency', 'requests_per_scenario', 'seed_leads', 'database')
+                       if reference.get('meta', {}).get(k) != resultat['meta'][k]]
+        if differences:
+            print(f"\n⚠️  Paramètres différents de la référence : {', '.join(differences)}", file=sys.stderr)
+        regressions = comparer(resultat, reference, args.tolerance)
+        if regressions:
+            print("\n❌ Régressions par rapport à la référence :", file=sys.stderr)
+            for r in regressions:
+                print(f"  - {r}", file=sys.stderr)
+            sys.exit(1)
+        print("\n✅ Aucune régression au-delà de la tolérance", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
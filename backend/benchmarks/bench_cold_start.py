@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark de démarrage à froid du backend
+Mesure, dans des processus neufs, le temps d'import de app, de create_app()
+et le délai entre le lancement du serveur et la première requête servie
+
+Usage : python benchmarks/bench_cold_start.py [--runs 5] [--server gunicorn|dev] [--importtime]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import puis construction de l'application, chronométrés dans le processus enfant
+IMPORT_SCRIPT = """
+import json, time
+debut = time.perf_counter()
+import app
+importe = time.perf_counter()
+app.create_app()
+cree = time.perf_counter()
+print(json.dumps({'import': importe - debut, 'create_app': cree - importe}))
+"""
+
+DEV_SERVER_SCRIPT = """
+import os
+from app import create_app
+create_app().run(port=int(os.environ['PORT']), use_reloader=False)
+"""
+
+
+def port_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def environnement(tmpdir):
+    """Base SQLite jetable et clé factice : aucun appel réseau au démarrage."""
+    env = dict(os.environ)
+    env.pop('SUPABASE_DB_URL', None)
+    env['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    env['ANNONCE_CACHE_PATH'] = os.path.join(tmpdir, 'annonce_cache.db')
+    env.setdefault('OPENAI_API_KEY', 'bench')
+    env['WEB_CONCURRENCY'] = '1'
+    return env
+
+
+def mesurer_import(env):
+    sortie = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(sortie.stdout.strip().splitlines()[-1])
+
+
+def mesurer_premiere_requete(env, server, timeout=30):
+    """Secondes entre le lancement du processus serveur et la première réponse 200 sur /."""
+    port = port_libre()
+    env = dict(env, PORT=str(port))
+    if server == 'gunicorn':
+        commande = [sys.executable, 'serve.py']
+    else:
+        commande = [sys.executable, '-c', DEV_SERVER_SCRIPT]
+
+    debut = time.perf_counter()
+    processus = subprocess.Popen(commande, cwd=BACKEND_DIR, env=env,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - debut < timeout:
+            if processus.poll() is not None:
+                raise RuntimeError(f"Le serveur s'est arrêté (code {processus.returncode})")
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=1) as reponse:
+                    if reponse.status == 200:
+                        return time.perf_counter() - debut
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"Aucune réponse après {timeout} s")
+    finally:
+        processus.terminate()
+        processus.wait(timeout=10)
+
+
+def resume(valeurs):
+    return (f"médiane {statistics.median(valeurs) * 1000:8.1f} ms   "
+            f"min {min(valeurs) * 1000:8.1f} ms   max {max(valeurs) * 1000:8.1f} ms")
+
+
+def modules_les_plus_lents(env, nombre=10):
+    """Modules de premier niveau les plus coûteux à importer (python -X importtime)."""
+    sortie = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=BACKEND_DIR,
+                            env=env, capture_output=True, text=True, check=True)
+    modules = []
+    for ligne in sortie.stderr.splitlines():
+        if not ligne.startswith('import time:') or 'cumulative' in ligne:
+            continue
+        _, cumul, nom = ligne.split('|')
+        # Indentation = profondeur ; on ne garde que les imports directs de app et ses voisins
+        if len(nom) - len(nom.lstrip()) <= 3:
+            modules.append((int(cumul), nom.strip()))
+    return sorted(modules, reverse=True)[:nombre]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--server', choices=('gunicorn', 'dev'), default='gunicorn')
+    parser.add_argument('--importtime', action='store_true', help='détaille les imports les plus lents')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        env = environnement(tmpdir)
+        imports, creations, premieres = [], [], []
+        for _ in range(args.runs):
+            temps = mesurer_import(env)
+            imports.append(temps['import'])
+            creations.append(temps['create_app'])
+            premieres.append(mesurer_premiere_requete(env, args.server))
+
+        print(f"{args.runs} démarrages à froid, serveur {args.server}")
+        print(f"  import app            {resume(imports)}")
+        print(f"  create_app()          {resume(creations)}")
+        print(f"  première requête      {resume(premieres)}")
+
+        if args.importtime:
+            print("\nImports les plus lents (cumulés) :")
+            for cumul, nom in modules_les_plus_lents(env):
+                print(f"  {cumul / 1000:8.1f} ms  {nom}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark de sérialisation d'une réponse de liste de leads
+Compare le jsonify stdlib (avec .isoformat() manuels) au fournisseur orjson,
+et la taille / le coût de la compression gzip et brotli
+
+Usage : python benchmarks/bench_serialization.py [--leads 50000] [--repeat 3]
+"""
+
+import argparse
+import gzip
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from compression import brotli
+from json_provider import FastJSONProvider, orjson
+
+
+def generer_leads(nombre, interactions_par_lead=3, seed=42):
+    """Liste de leads au format de GET /api/leads-chauds (UUID et datetime natifs)."""
+    rnd = random.Random(seed)
+    debut = datetime(2024, 1, 1)
+    return [{
+        'id': uuid.UUID(int=rnd.getrandbits(128)),
+        'nom': f'Client {n}',
+        'email': f'client{n}@exemple.fr',
+        'telephone': f'06{rnd.randrange(10 ** 8):08d}',
+        'type_bien': rnd.choice(['Appartement', 'Maison', 'Studio', 'Loft']),
+        'adresse': f'{rnd.randrange(1, 200)} rue de la Paix, {rnd.choice(["Paris", "Lyon", "Nantes"])}',
+        'score_ia': rnd.randrange(11),
+        'statut': rnd.choice(['Chaud 🔥', 'Tiède 😐', 'Froid ❄️']),
+        'statut_crm': 'À traiter',
+        'budget': rnd.randrange(50000, 900000),
+        'created_at': debut + timedelta(seconds=n),
+        'interactions': [{
+            'id': uuid.UUID(int=rnd.getrandbits(128)),
+            'type_action': rnd.choice(['Appel', 'Email', 'Visite']),
+            'details': 'Relance suite à la visite',
+            'date': debut + timedelta(seconds=n, minutes=i)
+        } for i in range(interactions_par_lead)]
+    } for n in range(nombre)]
+
+
+def preconvertir(leads):
+    """Ancien chemin : .isoformat() et str() faits à la main avant jsonify."""
+    return [dict(l, id=str(l['id']), created_at=l['created_at'].isoformat(), interactions=[
+        dict(i, id=str(i['id']), date=i['date'].isoformat()) for i in l['interactions']
+    ]) for l in leads]
+
+
+def chrono(fn, repeat):
+    """Meilleur temps (ms) sur repeat exécutions, et le résultat de la dernière."""
+    meilleur = None
+    for _ in range(repeat):
+        debut = time.perf_counter()
+        resultat = fn()
+        duree = (time.perf_counter() - debut) * 1000
+        meilleur = duree if meilleur is None else min(meilleur, duree)
+    return meilleur, resultat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--leads', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    stdlib = DefaultJSONProvider(app)
+    rapide = FastJSONProvider(app)
+    leads = generer_leads(args.leads)
+    payload = {'status': 'success', 'data': {'leads_chauds': leads}}
+
+    print("=" * 60)
+    print(f"📊 Sérialisation de {args.leads} leads (meilleur de {args.repeat})")
+    print(f"   orjson : {'oui' if orjson else 'non (repli stdlib)'} | brotli : {'oui' if brotli else 'non'}")
+    print("=" * 60)
+
+    t_stdlib, corps = chrono(
+        lambda: stdlib.dumps({'status': 'success', 'data': {'leads_chauds': preconvertir(leads)}}).encode('utf-8'),
+        args.repeat
+    )
+    t_rapide, corps_rapide = chrono(lambda: rapide.dumps_bytes(payload), args.repeat)
+    print(f"stdlib + isoformat   : {t_stdlib:8.1f} ms  {len(corps) / 1e6:6.2f} Mo")
+    print(f"FastJSONProvider     : {t_rapide:8.1f} ms  {len(corps_rapide) / 1e6:6.2f} Mo"
+          f"  (x{t_stdlib / t_rapide:.1f})")
+
+    t_gzip, compresse = chrono(lambda: gzip.compress(corps_rapide, compresslevel=6), args.repeat)
+    print(f"gzip (niveau 6)      : {t_gzip:8.1f} ms  {len(compresse) / 1e6:6.2f} Mo"
+          f"  ({len(compresse) / len(corps_rapide):.0%} de la taille)")
+    if brotli is not None:
+        t_br, compresse = chrono(lambda: brotli.compress(corps_rapide, quality=6), args.repeat)
+        print(f"brotli (qualité 6)   : {t_br:8.1f} ms  {len(compresse) / 1e6:6.2f} Mo"
+              f"  ({len(compresse) / len(corps_rapide):.0%} de la taille)")
+
+
+if __name__ == '__main__':
+    main()
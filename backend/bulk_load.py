@@ -0,0 +1,131 @@
+"""
+Chargement en masse de lignes déjà validées dans une table
+PostgreSQL : COPY ; SQLite : table temporaire puis un seul INSERT ... SELECT ; autres : executemany
+"""
+
+import io
+import os
+import time
+import uuid
+from datetime import date, datetime
+
+from sqlalchemy import Column, MetaData, Table, select
+from sqlalchemy.exc import DBAPIError
+
+
+def uuid7():
+    """UUID version 7 (RFC 9562) : horodatage en millisecondes en tête, puis 74 bits aléatoires.
+
+    Des id croissants dans le temps s'insèrent en fin d'index (clé primaire et
+    index terminés par id) au lieu d'être dispersés comme des UUID v4.
+    """
+    ms = time.time_ns() // 1_000_000
+    aleatoire = int.from_bytes(os.urandom(10), 'big')
+    return uuid.UUID(int=(ms & 0xFFFF_FFFF_FFFF) << 80 | 0x7 << 76 | (aleatoire >> 62 & 0xFFF) << 64
+                     | 0b10 << 62 | aleatoire & (1 << 62) - 1)
+
+
+def with_defaults(table, rows):
+    """Complète les lignes avec les valeurs par défaut Python des colonnes absentes (created_at...).
+
+    Le COPY et l'INSERT ... SELECT ne passent pas par les défauts de SQLAlchemy.
+    """
+    manquantes = [c for c in table.c if c.name not in rows[0] and c.default is not None and
+                  (c.default.is_scalar or c.default.is_callable)]
+    for colonne in manquantes:
+        defaut = colonne.default
+        if defaut.is_scalar:
+            for row in rows:
+                row[colonne.name] = defaut.arg
+        else:
+            for row in rows:
+                row[colonne.name] = defaut.arg(None)
+    return rows
+
+
+def load_rows(connection, table, rows):
+    """Insère rows (dicts aux mêmes clés) dans la transaction courante de connection.
+
+    Une ligne refusée (contrainte unique, clé étrangère) fait échouer tout
+    l'appel avec une IntegrityError SQLAlchemy, comme un executemany.
+    """
+    if not rows:
+        return
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        copy_rows(connection, table, rows)
+    elif dialect == 'sqlite':
+        staged_insert(connection, table, rows)
+    else:
+        connection.execute(table.insert(), rows)
+
+
+# --- PostgreSQL : COPY ... FROM STDIN (format texte) ---
+
+_COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def copy_text(rows, columns):
+    """Lignes -> données COPY au format texte (tabulations, \\N pour NULL)."""
+    return ''.join('\t'.join([copy_value(row[c]) for c in columns]) + '\n' for row in rows)
+
+
+def copy_rows(connection, table, rows):
+    rows = with_defaults(table, rows)
+    columns = list(rows[0])
+    sql = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN"
+    data = copy_text(rows, columns)
+    dbapi = connection.dialect.loaded_dbapi
+    # Curseur du pilote sur la connexion de la transaction en cours
+    cursor = connection.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            # psycopg2
+            cursor.copy_expert(sql, io.StringIO(data))
+        else:
+            # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(data)
+    except dbapi.Error as e:
+        # Même exception qu'un execute SQLAlchemy (IntegrityError pour un doublon)
+        raise DBAPIError.instance(sql, None, e, dbapi.Error) from e
+    finally:
+        cursor.close()
+
+
+# --- SQLite : table temporaire ---
+
+def staging_table(table):
+    """Copie sans contraintes ni index de table, propre à la connexion (TEMP)."""
+    return Table(f'{table.name}_staging', MetaData(), *(Column(c.name, c.type) for c in table.c),
+                 prefixes=['TEMPORARY'])
+
+
+def staged_insert(connection, table, rows):
+    """executemany dans une table temporaire puis un seul INSERT ... SELECT dans la table.
+
+    Les triggers de la table (index FTS5 de la recherche) s'exécutent alors dans
+    une seule instruction : FTS5 écrit un segment par instruction, un segment par
+    ligne avec un executemany direct.
+    """
+    rows = with_defaults(table, rows)
+    staging = staging_table(table)
+    staging.create(connection, checkfirst=True)
+    columns = list(rows[0])
+    # Conversions des types (UUID, dates) appliquées ici : executemany du pilote, deux fois plus rapide
+    processors = [(c, staging.c[c].type.bind_processor(connection.dialect)) for c in columns]
+    params = [tuple([p(row[c]) if p else row[c] for c, p in processors]) for row in rows]
+    connection.exec_driver_sql(
+        f"INSERT INTO {staging.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", params)
+    connection.execute(table.insert().from_select(columns, select(*(staging.c[c] for c in columns))))
+    connection.execute(staging.delete())
@@ -0,0 +1,79 @@
+"""
+Compression des réponses (brotli ou gzip selon Accept-Encoding)
+Appliquée aux réponses JSON/texte au-delà d'un seuil de taille
+"""
+
+import gzip
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/plain', 'text/csv')
+
+
+def choose_encoding(accept_encodings):
+    """Retourne 'br', 'gzip' ou None selon les préférences du client."""
+    br = accept_encodings['br'] if brotli is not None else 0
+    gz = accept_encodings['gzip']
+    if br and br >= gz:
+        return 'br'
+    if gz:
+        return 'gzip'
+    return None
+
+
+def init_compression(app):
+    """Enregistre la compression sur l'application.
+
+    COMPRESS_MIN_SIZE : taille minimale (octets) d'une réponse compressée
+    COMPRESS_LEVEL : niveau gzip (1-9) ; brotli utilise une qualité équivalente
+    Les réponses streamées (SSE, ?stream=1) ne sont pas compressées ici pour
+    ne pas retarder l'envoi des premiers octets.
+    """
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+
+    @app.after_request
+    def compress_response(response):
+        if (response.direct_passthrough or response.is_streamed
+                or not 200 <= response.status_code < 300 or response.status_code == 204
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        if len(data) < app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding == 'br':
+            data = brotli.compress(data, quality=min(11, app.config['COMPRESS_LEVEL']))
+        elif encoding == 'gzip':
+            data = gzip.compress(data, compresslevel=app.config['COMPRESS_LEVEL'])
+        else:
+            return response
+
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    return app
+
+
+def gzip_stream(chunks, level=6):
+    """Compresse un flux (gzip) au fil de l'eau : chaque morceau est vidé (Z_SYNC_FLUSH)
+    pour que le client reçoive les premiers octets sans attendre la fin du flux."""
+    compresseur = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compresseur.compress(chunk) + compresseur.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compresseur.flush()
@@ -0,0 +1,44 @@
+"""
+GET conditionnels (ETag / Last-Modified) pour les listes de leads
+Le validateur est calculé par agrégat SQL (nombre de lignes, date max) sans charger les leads
+"""
+
+import hashlib
+
+from flask import Response, request
+from sqlalchemy import func
+
+
+def aggregate_validator(query, *timestamp_cols):
+    """Retourne (nombre de lignes, date max...) de la requête, sans matérialiser les lignes."""
+    colonnes = [func.count()] + [func.max(col) for col in timestamp_cols]
+    return tuple(query.order_by(None).with_entities(*colonnes).one())
+
+
+def make_etag(*parts):
+    """ETag faible dérivé des agrégats et des paramètres de la requête (filtres, page...)."""
+    cle = repr((request.path, sorted(request.args.items(multi=True))) + parts)
+    return hashlib.sha1(cle.encode('utf-8')).hexdigest()
+
+
+def is_fresh(etag, last_modified=None):
+    """Vrai si le client a déjà cette version (If-None-Match, sinon If-Modified-Since)."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified and request.if_modified_since:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def with_validators(response, etag, last_modified=None):
+    """Ajoute ETag / Last-Modified à la réponse et force la revalidation côté client."""
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    """Réponse 304 vide, avant toute lecture ou sérialisation des leads."""
+    return with_validators(Response(status=304), etag, last_modified)
@@ -6,6 +6,8 @@ Gère les paramètres de la base de données et autres configurations
 import os
 from pathlib import Path
 
+from db_pool import engine_options
+
 class Config:
     """Configuration de base pour l'application"""
     
@@ -28,6 +30,9 @@ class Config:
     
     # Désactiver le suivi des modifications SQLAlchemy (améliore les performances)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Pool de connexions (taille par worker, pre-ping, recyclage, timeout, mode PgBouncer)
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     
     # Configuration CORS
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', '*').split(',')
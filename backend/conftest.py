@@ -0,0 +1,45 @@
+"""
+Fixtures communes des tests du backend
+Application sur une base SQLite en mémoire, neuve pour chaque test, avec une agence
+"""
+
+import os
+
+os.environ.pop('SUPABASE_DB_URL', None)
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+import pytest
+
+import app as backend
+
+# Filtre anti-doublons chargé dans la requête : un thread de chargement partagerait
+# la connexion unique de la base en mémoire et pourrait en terminer la transaction
+TEST_CONFIG = {'SLOW_QUERY_MS': 0, 'DEDUP_BLOOM_WARMUP': 'sync'}
+
+
+@pytest.fixture
+def app_config():
+    """Surcharges de configuration d'un fichier de test (à redéfinir dans le fichier)."""
+    return {}
+
+
+@pytest.fixture
+def app(app_config):
+    """Application dans son contexte, tables créées ; app.agency_id : agence de test."""
+    app = backend.create_app({**TEST_CONFIG, **app_config})
+    with app.app_context():
+        backend.db.create_all()
+        agence = backend.Agency(nom_agence='Agence Test')
+        backend.db.session.add(agence)
+        backend.db.session.commit()
+        app.agency_id = str(agence.id)
+        yield app
+        backend.db.session.remove()
+        backend.db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.agency_id = app.agency_id
+    return client
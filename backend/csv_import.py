@@ -0,0 +1,102 @@
+"""
+Import de fichiers CSV de leads exportés d'un autre CRM
+Séparateur détecté, colonnes reconnues par leur en-tête (ou correspondance explicite) et lues en flux
+"""
+
+import csv
+import io
+import unicodedata
+
+# Champs du lead alimentés par un import ; nom et email sont obligatoires
+IMPORT_FIELDS = ('nom', 'email', 'telephone', 'budget', 'type_bien', 'adresse', 'source')
+REQUIRED_FIELDS = ('nom', 'email')
+# En-têtes reconnus (forme comparable : minuscules, sans accents ni ponctuation)
+HEADER_ALIASES = {
+    'nom': ('nom', 'name', 'nomcomplet', 'fullname', 'contact', 'client', 'prospect'),
+    'email': ('email', 'mail', 'courriel', 'adressemail', 'adresseemail', 'emailaddress'),
+    'telephone': ('telephone', 'tel', 'phone', 'mobile', 'portable', 'numero', 'phonenumber'),
+    'budget': ('budget', 'budgetmax', 'prix', 'price'),
+    'type_bien': ('typebien', 'typedebien', 'bien', 'propertytype'),
+    'adresse': ('adresse', 'address', 'ville', 'city', 'localisation'),
+    'source': ('source', 'origine', 'canal', 'leadsource'),
+}
+DELIMITERS = ',;\t|'
+
+
+def header_key(name):
+    """En-tête comparable : "Téléphone portable" -> "telephoneportable"."""
+    sans_accents = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    return ''.join(c for c in sans_accents.lower() if c.isalnum())
+
+
+def parse_mapping(value):
+    """?map=Colonne CSV=champ,... -> {colonne: champ} (ValueError si le champ n'existe pas)."""
+    mapping = {}
+    for paire in (value or '').split(','):
+        if not paire.strip():
+            continue
+        colonne, sep, champ = paire.rpartition('=')
+        champ = champ.strip()
+        if not sep or not colonne.strip():
+            raise ValueError(f"Correspondance invalide : {paire} (attendu colonne=champ)")
+        if champ not in IMPORT_FIELDS:
+            raise ValueError(f"Champ inconnu : {champ} (disponibles : {', '.join(IMPORT_FIELDS)})")
+        mapping[colonne.strip()] = champ
+    return mapping
+
+
+def resolve_columns(header, mapping=None):
+    """Associe les colonnes du fichier aux champs : [(champ, index)], colonnes ignorées.
+
+    La correspondance explicite passe avant les en-têtes reconnus ; ValueError
+    si une colonne citée n'existe pas ou si nom / email restent sans colonne.
+    """
+    mapping = mapping or {}
+    absentes = set(mapping) - set(header)
+    if absentes:
+        raise ValueError(f"Colonne(s) absente(s) du fichier : {', '.join(sorted(absentes))}")
+    alias = {a: champ for champ, noms in HEADER_ALIASES.items() for a in noms}
+    colonnes = {champ: header.index(nom) for nom, champ in mapping.items()}
+    ignorees = []
+    for index, nom in enumerate(header):
+        if index in colonnes.values():
+            continue
+        champ = None if nom in mapping else alias.get(header_key(nom))
+        if champ is None or champ in colonnes:
+            ignorees.append(nom)
+        else:
+            colonnes[champ] = index
+    manquants = [c for c in REQUIRED_FIELDS if c not in colonnes]
+    if manquants:
+        raise ValueError(f"Aucune colonne pour : {', '.join(manquants)} (précisez map=colonne=champ)")
+    return list(colonnes.items()), ignorees
+
+
+def open_csv(binary, encoding='utf-8-sig', delimiter=None):
+    """Flux binaire -> (lecteur csv, en-tête) ; séparateur deviné sur la ligne d'en-tête si absent.
+
+    utf-8-sig retire le BOM ajouté par Excel ; le fichier n'est jamais chargé en entier.
+    """
+    texte = io.TextIOWrapper(binary, encoding=encoding, newline='')
+    premiere = texte.readline()
+    if not premiere.strip():
+        raise ValueError('Fichier vide : ligne d\'en-tête attendue')
+    if delimiter is None:
+        delimiter = max(DELIMITERS, key=premiere.count)
+    header = [h.strip() for h in next(csv.reader([premiere], delimiter=delimiter))]
+    return csv.reader(texte, delimiter=delimiter), header
+
+
+def iter_records(reader, columns):
+    """(numéro de ligne, {champ: valeur}) par ligne non vide ; cellules vides -> None.
+
+    Le numéro est celui de la première ligne de l'enregistrement dans le fichier
+    (en-tête = 1), juste même si un champ entre guillemets contient des retours à la ligne.
+    """
+    lues = reader.line_num
+    for row in reader:
+        debut, lues = lues + 2, reader.line_num
+        if not row or (len(row) == 1 and not row[0].strip()):
+            continue
+        taille = len(row)
+        yield debut, {champ: (row[i].strip() or None) if i < taille else None for champ, i in columns}
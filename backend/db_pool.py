@@ -0,0 +1,105 @@
+"""
+Configuration du pool de connexions SQLAlchemy (Supabase / PgBouncer)
+Options du moteur pilotées par variables d'environnement et mesure de l'attente au checkout
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy.pool import QueuePool
+
+
+class PoolWaitStats:
+    """Temps passé à attendre une connexion libre du pool (cumul, max, nombre de checkouts)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def observe(self, seconds):
+        with self._lock:
+            self.count += 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.count,
+                'wait_seconds_total': round(self.total_seconds, 6),
+                'wait_seconds_max': round(self.max_seconds, 6),
+                'wait_seconds_avg': round(self.total_seconds / self.count, 6) if self.count else 0.0
+            }
+
+
+# Statistiques du processus (un pool par worker)
+pool_wait = PoolWaitStats()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool qui mesure le temps d'obtention de chaque connexion"""
+
+    def _do_get(self):
+        debut = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.observe(time.perf_counter() - debut)
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_bool(name, default=False):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+def engine_options(database_uri):
+    """Options create_engine (SQLALCHEMY_ENGINE_OPTIONS) pour l'URL donnée.
+
+    DB_POOL_SIZE / DB_MAX_OVERFLOW : connexions par worker (total = workers x (taille + débordement))
+    DB_POOL_TIMEOUT : secondes d'attente max d'une connexion libre
+    DB_POOL_RECYCLE : âge max (s) d'une connexion, sous le délai d'inactivité de Supabase
+    DB_POOL_PRE_PING : vérifie la connexion au checkout (connexions coupées après une inactivité)
+    DB_STATEMENT_TIMEOUT_MS : durée max d'une requête côté PostgreSQL (0 = illimitée)
+    DB_PGBOUNCER : mode transaction pooling (PgBouncer / pooler Supabase port 6543) :
+                   ni paramètres de démarrage ni instructions préparées côté serveur
+    """
+    if not database_uri or database_uri.startswith('sqlite'):
+        # SQLite : Flask-SQLAlchemy choisit déjà le pool adapté
+        return {}
+
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': _env_int('DB_POOL_SIZE', 5),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 5),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 300),
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', True),
+    }
+
+    connect_args = {}
+    statement_timeout = _env_int('DB_STATEMENT_TIMEOUT_MS', 30000)
+    if _env_bool('DB_PGBOUNCER'):
+        # PgBouncer refuse les options de démarrage : le timeout se règle sur le rôle
+        # (ALTER ROLE ... SET statement_timeout). psycopg 3 : pas d'instructions préparées.
+        if database_uri.startswith('postgresql+psycopg:'):
+            connect_args['prepare_threshold'] = None
+    elif statement_timeout:
+        connect_args['options'] = f'-c statement_timeout={statement_timeout}'
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+def pool_status(engine):
+    """État du pool du processus : connexions et temps d'attente au checkout."""
+    status = pool_wait.snapshot()
+    pool = engine.pool
+    if isinstance(pool, QueuePool):
+        status.update(size=pool.size(), checked_out=pool.checkedout(), overflow=pool.overflow())
+    return status
@@ -0,0 +1,306 @@
+"""
+Détection des leads en doublon à l'ingestion
+Email normalisé et téléphone E.164 par agence, index unique en base
+et filtre de Bloom en mémoire pour éviter toute requête sur le cas courant (lead nouveau)
+"""
+
+import hashlib
+import math
+import re
+import threading
+
+from sqlalchemy import event, text
+
+try:
+    import phonenumbers
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    phonenumbers = None
+
+# Domaines qui ignorent les points de la partie locale (jean.dupont@gmail.com == jeandupont@gmail.com)
+GMAIL_DOMAINS = ('gmail.com', 'googlemail.com')
+DEFAULT_REGION = 'FR'
+# Indicatifs des numéros nationaux à 10 chiffres commençant par 0 (marché FR/EU)
+_INDICATIFS = {'FR': '33', 'BE': '32', 'CH': '41', 'LU': '352'}
+
+
+def normalize_email(email):
+    """Email comparable : casse, espaces, alias +tag ; points ignorés chez Gmail. None si vide."""
+    if not email:
+        return None
+    email = str(email).strip().lower()
+    if '@' not in email:
+        return email or None
+    local, _, domain = email.rpartition('@')
+    local = local.split('+', 1)[0]
+    if domain in GMAIL_DOMAINS:
+        local = local.replace('.', '')
+        domain = 'gmail.com'
+    return f'{local}@{domain}'
+
+
+def normalize_phone(phone, region=DEFAULT_REGION):
+    """Téléphone au format E.164 (+33612345678). None si vide ou illisible.
+
+    Utilise phonenumbers s'il est installé, sinon des règles simples :
+    00 -> +, numéro national 0XXXXXXXXX -> indicatif de la région.
+    """
+    if not phone:
+        return None
+    phone = str(phone).strip()
+    if phonenumbers is not None:
+        try:
+            numero = phonenumbers.parse(phone, region)
+        except phonenumbers.NumberParseException:
+            return None
+        if not phonenumbers.is_possible_number(numero):
+            return None
+        return phonenumbers.format_number(numero, phonenumbers.PhoneNumberFormat.E164)
+
+    chiffres = re.sub(r'\D', '', phone)
+    if phone.startswith('+'):
+        pass
+    elif chiffres.startswith('00'):
+        chiffres = chiffres[2:]
+    elif chiffres.startswith('0') and len(chiffres) == 10 and region in _INDICATIFS:
+        chiffres = _INDICATIFS[region] + chiffres[1:]
+    else:
+        return None
+    if not 8 <= len(chiffres) <= 15:
+        return None
+    return '+' + chiffres
+
+
+# PostgreSQL : mêmes règles que normalize_email / normalize_phone (sans phonenumbers, région FR),
+# pour les leads écrits hors backend (fonctions api/*.js, webhooks, client Supabase)
+_ESPACES = "E' \\t\\n\\r\\f\\v'"
+
+PG_DDL = (
+    f"""
+CREATE OR REPLACE FUNCTION leads_email_normalise(email TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+  SELECT CASE
+      WHEN e = '' THEN NULL
+      WHEN position('@' in e) = 0 THEN e
+      WHEN domaine IN ('gmail.com', 'googlemail.com') THEN replace(split_part(locale, '+', 1), '.', '') || '@gmail.com'
+      ELSE split_part(locale, '+', 1) || '@' || domaine
+    END
+  -- Partie locale et domaine séparés sur le dernier @ (rpartition)
+  FROM (SELECT e, substring(e from '[^@]*$') AS domaine,
+               left(e, length(e) - length(substring(e from '[^@]*$')) - 1) AS locale
+          FROM (SELECT lower(btrim(email, {_ESPACES})) AS e) saisie) parties
+$$""",
+    f"""
+CREATE OR REPLACE FUNCTION leads_telephone_e164(telephone TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+  SELECT CASE WHEN length(c) BETWEEN 8 AND 15 THEN '+' || c END
+  FROM (SELECT CASE
+            WHEN btrim(telephone, {_ESPACES}) LIKE '+%' THEN d
+            WHEN d LIKE '00%' THEN substr(d, 3)
+            WHEN d ~ '^0[0-9]{{9}}$' THEN '33' || substr(d, 2)
+          END AS c
+          FROM (SELECT regexp_replace(telephone, '\\D', '', 'g') AS d) chiffres) indicatif
+$$""",
+    """
+CREATE OR REPLACE FUNCTION leads_normaliser_identifiants() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+  calculer_email BOOLEAN;
+  calculer_telephone BOOLEAN;
+BEGIN
+  -- Valeurs fournies par le backend (normalize_email / normalize_phone) : conservées
+  IF TG_OP = 'INSERT' THEN
+    calculer_email := NEW.email_normalise IS NULL;
+    calculer_telephone := NEW.telephone_e164 IS NULL;
+  ELSE
+    calculer_email := NEW.email IS DISTINCT FROM OLD.email
+                      AND NEW.email_normalise IS NOT DISTINCT FROM OLD.email_normalise;
+    calculer_telephone := NEW.telephone IS DISTINCT FROM OLD.telephone
+                          AND NEW.telephone_e164 IS NOT DISTINCT FROM OLD.telephone_e164;
+  END IF;
+  -- Comme la reprise de l'existant : un doublon écrit hors backend ne prend pas l'identifiant
+  -- déjà porté par un autre lead de l'agence (l'index unique ferait échouer l'écriture)
+  IF calculer_email THEN
+    NEW.email_normalise := leads_email_normalise(NEW.email);
+    IF length(NEW.email_normalise) > 120 OR EXISTS (
+        SELECT 1 FROM leads WHERE agency_id = NEW.agency_id
+           AND email_normalise = NEW.email_normalise AND id <> NEW.id) THEN
+      NEW.email_normalise := NULL;
+    END IF;
+  END IF;
+  IF calculer_telephone THEN
+    NEW.telephone_e164 := leads_telephone_e164(NEW.telephone);
+    IF EXISTS (
+        SELECT 1 FROM leads WHERE agency_id = NEW.agency_id
+           AND telephone_e164 = NEW.telephone_e164 AND id <> NEW.id) THEN
+      NEW.telephone_e164 := NULL;
+    END IF;
+  END IF;
+  RETURN NEW;
+END $$""",
+    "DROP TRIGGER IF EXISTS leads_normaliser_identifiants ON leads",
+    "CREATE TRIGGER leads_normaliser_identifiants BEFORE INSERT OR UPDATE OF email, telephone ON leads "
+    "FOR EACH ROW EXECUTE FUNCTION leads_normaliser_identifiants()",
+)
+
+
+def install(connection):
+    """Crée les fonctions et le trigger de normalisation sous PostgreSQL (idempotent).
+
+    Sous SQLite, seul le backend écrit : le hook ORM et prepare_lead_row suffisent.
+    """
+    if connection.dialect.name == 'postgresql':
+        for ddl in PG_DDL:
+            connection.execute(text(ddl))
+
+
+def register(table):
+    """Installe la normalisation en base à la création de la table (db.create_all)."""
+    event.listen(table, 'after_create', lambda target, connection, **kw: install(connection))
+
+
+def dedup_keys(agency_id, email_normalise, telephone_e164):
+    """Clés du filtre : une par identifiant renseigné, préfixées par l'agence."""
+    keys = []
+    if email_normalise:
+        keys.append(f'{agency_id}|e|{email_normalise}')
+    if telephone_e164:
+        keys.append(f'{agency_id}|t|{telephone_e164}')
+    return keys
+
+
+class BloomFilter:
+    """Filtre de Bloom : "absent" est certain, "peut-être présent" a un taux d'erreur borné."""
+
+    def __init__(self, capacity=1_000_000, error_rate=0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _positions(self, key):
+        # Double hachage (Kirsch-Mitzenmacher) à partir d'un seul blake2b
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        positions = self._positions(key)
+        with self._lock:
+            for p in positions:
+                self.bits[p >> 3] |= 1 << (p & 7)
+            self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    # --- Lots (import en masse) : mêmes positions que _positions, calculées en NumPy ---
+
+    def _positions_many(self, keys):
+        """Positions des clés, tableau (clés x hashes) ; (h1 + i*h2) % m == (h1 % m + i * (h2 % m)) % m."""
+        import numpy as np
+
+        digests = b''.join(hashlib.blake2b(k.encode('utf-8'), digest_size=16).digest() for k in keys)
+        h = np.frombuffer(digests, dtype='<u8').reshape(-1, 2)
+        size = np.uint64(self.size)
+        h1, h2 = h[:, 0] % size, (h[:, 1] | np.uint64(1)) % size
+        return (h1[:, None] + np.arange(self.hashes, dtype=np.uint64) * h2[:, None]) % size
+
+    def add_many(self, keys):
+        if not keys:
+            return
+        import numpy as np
+
+        positions = self._positions_many(keys).ravel()
+        # Vue sur le bytearray : les bits sont modifiés en place
+        bits = np.frombuffer(self.bits, dtype=np.uint8)
+        masques = np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8))
+        with self._lock:
+            np.bitwise_or.at(bits, positions >> np.uint64(3), masques)
+            self.count += len(keys)
+
+    def contains_many(self, keys):
+        """Tableau de booléens aligné sur keys (même réponse que `key in filtre`)."""
+        import numpy as np
+
+        if not keys:
+            return np.zeros(0, dtype=bool)
+        positions = self._positions_many(keys)
+        bits = np.frombuffer(self.bits, dtype=np.uint8)
+        return ((bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1)
+
+
+class LeadIndex:
+    """Filtre de Bloom des identifiants (agence, email, téléphone) déjà en base, par processus.
+
+    Chargé au premier usage (en tâche de fond par défaut) ; tant qu'il n'est pas prêt, tout
+    lead est considéré comme un doublon possible (vérification en base). Les
+    leads créés par d'autres workers lui échappent : l'index unique reste le
+    garde-fou et l'IntegrityError renvoie vers la fusion.
+    """
+
+    def __init__(self, capacity=1_000_000, error_rate=0.01):
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.ready = False
+        self._loading = False
+        self._lock = threading.Lock()
+
+    def warm(self, app, load_rows, background=True):
+        """Lance le chargement (une fois) ; load_rows() itère sur (agency_id, email, téléphone).
+
+        background=False charge dans le thread appelant, avec sa session : aucun
+        thread ne partage la connexion de la requête (base SQLite en mémoire des tests).
+        """
+        with self._lock:
+            if self.ready or self._loading:
+                return
+            self._loading = True
+
+        def charger():
+            try:
+                for agency_id, email, telephone in load_rows():
+                    for key in dedup_keys(agency_id, email, telephone):
+                        self.bloom.add(key)
+                self.ready = True
+            except Exception as e:
+                app.logger.warning("Filtre anti-doublons non chargé : %s", e)
+            finally:
+                self._loading = False
+
+        if not background:
+            charger()
+            return
+
+        def en_tache_de_fond():
+            with app.app_context():
+                charger()
+
+        threading.Thread(target=en_tache_de_fond, daemon=True, name='lead-index-warmup').start()
+
+    def add(self, agency_id, email_normalise, telephone_e164):
+        for key in dedup_keys(agency_id, email_normalise, telephone_e164):
+            self.bloom.add(key)
+
+    def maybe_exists(self, agency_id, email_normalise, telephone_e164):
+        """False : lead certainement nouveau (aucune requête nécessaire)."""
+        if not self.ready:
+            return True
+        return any(key in self.bloom for key in dedup_keys(agency_id, email_normalise, telephone_e164))
+
+    def add_many(self, identifiants):
+        """add() pour une liste de (agency_id, email normalisé, téléphone E.164)."""
+        self.bloom.add_many([key for ids in identifiants for key in dedup_keys(*ids)])
+
+    def maybe_exists_many(self, identifiants):
+        """maybe_exists() pour une liste de (agency_id, email normalisé, téléphone E.164) ; liste de booléens."""
+        if not self.ready:
+            return [True] * len(identifiants)
+        import numpy as np
+
+        keys, lignes = [], []
+        for ligne, ids in enumerate(identifiants):
+            for key in dedup_keys(*ids):
+                keys.append(key)
+                lignes.append(ligne)
+        presentes = np.bincount(lignes, weights=self.bloom.contains_many(keys), minlength=len(identifiants))
+        return (presentes > 0).tolist()
@@ -0,0 +1,68 @@
+"""
+Export des leads en CSV ou NDJSON, par lots depuis un curseur serveur
+Interactions absentes, imbriquées (NDJSON) ou aplaties (une ligne par interaction)
+"""
+
+import csv
+import io
+
+# Format -> type MIME
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+# ?interactions= : aucune (défaut), une ligne par interaction, ou liste dans chaque lead (NDJSON)
+FLAT = 'flat'
+NESTED = 'nested'
+INTERACTION_FIELDS = ('id', 'type_action', 'details', 'date')
+FLAT_INTERACTION_COLUMNS = tuple(f'interaction_{f}' for f in INTERACTION_FIELDS)
+
+
+def parse_format(value):
+    export_format = value or 'csv'
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Format inconnu : {export_format} (disponibles : {', '.join(EXPORT_FORMATS)})")
+    return export_format
+
+
+def parse_interactions_mode(value, export_format):
+    """?interactions=flat|nested ; None si absent. Le CSV ne sait représenter que la forme aplatie."""
+    if value in (None, '', '0', 'false'):
+        return None
+    mode = FLAT if value in ('1', 'true') else value
+    if mode not in (FLAT, NESTED):
+        raise ValueError(f"Paramètre interactions invalide : {value} (flat ou nested)")
+    if mode == NESTED and export_format == 'csv':
+        raise ValueError("interactions=nested n'existe qu'en NDJSON")
+    return mode
+
+
+def header(fields, mode):
+    return tuple(fields) + (FLAT_INTERACTION_COLUMNS if mode == FLAT else ())
+
+
+def flatten(leads, interactions, id_index):
+    """Une ligne par interaction (colonnes du lead répétées) ; une ligne vide d'interaction sinon."""
+    vide = (None,) * len(INTERACTION_FIELDS)
+    for lead in leads:
+        rows = interactions.get(lead[id_index])
+        if not rows:
+            yield tuple(lead) + vide
+        for interaction in rows or ():
+            yield tuple(lead) + tuple(interaction)
+
+
+def csv_chunk(rows):
+    """Lignes -> texte CSV (UUID et dates écrits par str(), None vide)."""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    return buffer.getvalue()
+
+
+def ndjson_chunk(rows, columns, dumps, nested=None):
+    """Lignes -> un objet JSON par ligne ; nested = (id_index, {lead_id: interactions}) pour les imbriquer."""
+    lignes = []
+    for row in rows:
+        objet = dict(zip(columns, row))
+        if nested is not None:
+            id_index, interactions = nested
+            objet['interactions'] = [dict(zip(INTERACTION_FIELDS, i)) for i in interactions.get(row[id_index], ())]
+        lignes.append(dumps(objet))
+    return '\n'.join(lignes) + '\n' if lignes else ''
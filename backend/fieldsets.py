@@ -0,0 +1,34 @@
+"""
+Champs partiels (?fields=) et inclusions optionnelles (?include=) des listes de leads
+Permet de ne charger en base et de ne sérialiser que les colonnes demandées
+"""
+
+
+def parse_fields(value, allowed):
+    """?fields=id,nom,score_ia -> tuple des champs demandés (None si absent).
+
+    Lève ValueError si un champ ne fait pas partie de allowed.
+    """
+    if value in (None, ''):
+        return None
+    fields = tuple(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    inconnus = [f for f in fields if f not in allowed]
+    if inconnus:
+        raise ValueError(f"Champs inconnus : {', '.join(inconnus)} (disponibles : {', '.join(allowed)})")
+    return fields
+
+
+def parse_include(value, allowed):
+    """?include=interactions -> ensemble des relations à embarquer."""
+    if value in (None, ''):
+        return set()
+    include = {i.strip() for i in value.split(',') if i.strip()}
+    inconnus = include - set(allowed)
+    if inconnus:
+        raise ValueError(f"Inclusions inconnues : {', '.join(sorted(inconnus))} (disponibles : {', '.join(allowed)})")
+    return include
+
+
+def load_columns(model, fields, required=('id',)):
+    """Attributs à passer à load_only() : champs demandés + colonnes indispensables (clé, tri)."""
+    return [getattr(model, name) for name in dict.fromkeys(tuple(required) + tuple(fields))]
@@ -0,0 +1,81 @@
+"""
+Configuration gunicorn de production (Render et local)
+Lue automatiquement par `gunicorn 'app:create_app()'` lancé depuis backend/, ou via `python serve.py`
+
+Variables d'environnement :
+    PORT                 port d'écoute (5000)
+    WORKER_MODE          threaded (défaut) | gevent | process
+    WEB_CONCURRENCY      nombre de workers (défaut : calculé sur les cœurs disponibles)
+    GUNICORN_THREADS     threads par worker en mode threaded (4)
+    GUNICORN_KEEPALIVE   secondes de keep-alive HTTP (5)
+    GUNICORN_TIMEOUT     délai max d'une requête (60 s : appels OpenAI et flux SSE)
+    GUNICORN_PRELOAD     charge l'application avant le fork (true)
+    GUNICORN_RELOAD      rechargement automatique du code, développement uniquement (false)
+"""
+
+import math
+import os
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+def cpu_cores():
+    """Cœurs réellement alloués : quota cgroup (conteneurs Render) sinon affinité CPU."""
+    try:
+        quota, period = open('/sys/fs/cgroup/cpu.max').read().split()
+        if quota != 'max':
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+# Modes de workers : threads (E/S Supabase et OpenAI), gevent (beaucoup de connexions lentes), processus
+WORKER_CLASSES = {'threaded': 'gthread', 'gevent': 'gevent', 'process': 'sync'}
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+worker_class = WORKER_CLASSES.get(os.environ.get('WORKER_MODE', 'threaded'), 'gthread')
+if worker_class == 'sync':
+    # Règle classique (2 x cœurs) + 1 pour des workers mono-requête
+    workers = int(os.environ.get('WEB_CONCURRENCY', cpu_cores() * 2 + 1))
+else:
+    # Un worker par cœur, la concurrence vient des threads / greenlets
+    workers = int(os.environ.get('WEB_CONCURRENCY', cpu_cores()))
+threads = int(os.environ.get('GUNICORN_THREADS', 4)) if worker_class == 'gthread' else 1
+worker_connections = 1000
+
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+
+# Recyclage périodique des workers (fuites mémoire), décalé pour ne pas tous les relancer ensemble
+max_requests = 1000
+max_requests_jitter = 100
+
+preload_app = _env_bool('GUNICORN_PRELOAD', True)
+reload = _env_bool('GUNICORN_RELOAD', False)
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    """Chaque worker repart d'un pool vide : les connexions ouvertes par le maître
+    (preload) ne doivent pas être partagées entre processus."""
+    if server.cfg.preload_app:
+        from app import db
+        with server.app.wsgi().app_context():
+            db.engine.dispose(close=False)
+
+    if worker_class == 'gevent':
+        # psycopg2 coopératif avec gevent si psycogreen est installé
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            server.log.warning("psycogreen absent : les requêtes PostgreSQL bloqueront les greenlets")
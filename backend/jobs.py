@@ -0,0 +1,197 @@
+"""
+File de tâches en arrière-plan (threads du processus)
+Exécute les appels lents (ex : génération d'annonce OpenAI) hors du worker WSGI
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+# Statuts d'une tâche
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+ERROR = 'error'
+
+
+class QueueFull(Exception):
+    """La file d'attente a atteint sa profondeur maximale"""
+
+
+class SqliteJobStore:
+    """État des tâches dans un fichier SQLite partagé par les processus de la machine.
+
+    Le GET de suivi peut arriver sur un autre worker gunicorn que celui qui
+    exécute la tâche (ou sur son remplaçant après recyclage) : il y relit le
+    statut et le résultat.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                ' id TEXT PRIMARY KEY, status TEXT NOT NULL, result TEXT, error TEXT,'
+                ' created_at REAL NOT NULL, finished_at REAL)'
+            )
+            self._local.conn = conn
+        return conn
+
+    def save(self, job):
+        conn = self._conn()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?)', (
+                job['id'], job['status'], json.dumps(job['result']), job['error'],
+                job['created_at'], job['finished_at']))
+
+    def load(self, job_id):
+        row = self._conn().execute(
+            'SELECT id, status, result, error, created_at, finished_at FROM jobs WHERE id = ?', (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        id, status, result, error, created_at, finished_at = row
+        return {'id': id, 'status': status, 'result': json.loads(result) if result else None,
+                'error': error, 'created_at': created_at, 'finished_at': finished_at}
+
+    def delete(self, job_id):
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+
+    def purge(self, before):
+        """Oublie les tâches terminées avant before, et celles jamais terminées (worker tué)."""
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM jobs WHERE COALESCE(finished_at, created_at) < ?', (before,))
+
+
+class JobQueue:
+    """Pool borné de threads alimenté par une file de profondeur limitée.
+
+    Les threads sont démarrés au premier submit (pas de thread créé avant le
+    fork des workers gunicorn). Les tâches terminées sont conservées
+    result_ttl secondes pour être relues par GET puis oubliées. Avec store
+    (SqliteJobStore), chaque changement d'état y est aussi écrit : n'importe
+    quel worker de la machine répond au GET.
+    """
+
+    def __init__(self, workers=4, max_queue=32, result_ttl=3600, store=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+        self.store = store
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def submit(self, fn, *args, **kwargs):
+        """Met fn(*args, **kwargs) en file ; retourne l'id de tâche ou lève QueueFull."""
+        self._start()
+        self._purge()
+        job_id = uuid.uuid4().hex
+        job = {'id': job_id, 'status': PENDING, 'result': None, 'error': None,
+               'created_at': time.time(), 'finished_at': None}
+        with self._lock:
+            self._jobs[job_id] = job
+        # Enregistrée avant la mise en file : un thread libre peut la terminer aussitôt
+        self._save(job)
+        try:
+            self._queue.put_nowait((job, fn, args, kwargs))
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job_id]
+            self._delete(job_id)
+            raise QueueFull(f"File pleine ({self.max_queue} tâches en attente), réessayez plus tard")
+        return job_id
+
+    def get(self, job_id):
+        """Retourne une copie de l'état de la tâche, ou None si inconnue/expirée.
+
+        Une tâche d'un autre processus est relue dans store.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return dict(job)
+        if self.store is None:
+            return None
+        try:
+            job = self.store.load(job_id)
+        except sqlite3.Error as e:
+            print(f"Erreur suivi des tâches: {e}")
+            return None
+        if job and (job['finished_at'] or job['created_at']) < time.time() - self.result_ttl:
+            return None
+        return job
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'job-worker-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while True:
+            job, fn, args, kwargs = self._queue.get()
+            job['status'] = RUNNING
+            self._save(job)
+            try:
+                job['result'] = fn(*args, **kwargs)
+                job['status'] = DONE
+            except Exception as e:
+                job['error'] = str(e)
+                job['status'] = ERROR
+            finally:
+                job['finished_at'] = time.time()
+                self._save(job)
+                self._queue.task_done()
+
+    def _save(self, job):
+        """Écrit l'état dans store ; une erreur SQLite n'interrompt pas la tâche."""
+        if self.store is None:
+            return
+        try:
+            self.store.save(job)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"Erreur suivi des tâches: {e}")
+
+    def _delete(self, job_id):
+        if self.store is None:
+            return
+        try:
+            self.store.delete(job_id)
+        except sqlite3.Error as e:
+            print(f"Erreur suivi des tâches: {e}")
+
+    def _purge(self):
+        limite = time.time() - self.result_ttl
+        with self._lock:
+            for job_id in [id for id, job in self._jobs.items()
+                           if job['finished_at'] and job['finished_at'] < limite]:
+                del self._jobs[job_id]
+        if self.store is not None:
+            try:
+                self.store.purge(limite)
+            except sqlite3.Error as e:
+                print(f"Erreur suivi des tâches: {e}")
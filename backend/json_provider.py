@@ -0,0 +1,54 @@
+"""
+Fournisseur JSON rapide pour Flask
+orjson si installé (sinon json de la stdlib), avec prise en charge native
+des UUID, dates et Decimal : plus besoin d'appeler .isoformat() dans les routes
+"""
+
+import uuid
+from datetime import date
+from decimal import Decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    orjson = None
+
+
+def _default(o):
+    """Types non gérés nativement : mêmes représentations avec ou sans orjson."""
+    if isinstance(o, date):
+        return o.isoformat()
+    if isinstance(o, (uuid.UUID, Decimal)):
+        return str(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f"Objet de type {type(o).__name__} non sérialisable en JSON")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify / app.json.dumps via orjson, repli transparent sur la stdlib."""
+
+    default = staticmethod(_default)
+    sort_keys = False
+
+    def dumps_bytes(self, obj):
+        if orjson is not None:
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return super().dumps(obj).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Évite l'aller-retour bytes -> str -> bytes de l'implémentation par défaut
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
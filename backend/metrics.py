@@ -0,0 +1,185 @@
+"""
+Instrumentation des requêtes : latence par route, requêtes SQL, appels OpenAI
+Exposition au format texte Prometheus (/metrics) et en-tête Server-Timing
+"""
+
+import bisect
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Bornes des histogrammes de latence (secondes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    paires = ','.join(f'{n}="{_echapper(v)}"' for n, v in zip(names, values))
+    return '{' + paires + '}'
+
+
+def _echapper(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Counter:
+    """Compteur monotone par jeu de labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *values):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labels, k), v) for k, v in sorted(self._values.items())]
+
+
+class Histogram:
+    """Histogramme cumulatif (buckets, _sum, _count) par jeu de labels."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *values):
+        with self._lock:
+            serie = self._values.get(values)
+            if serie is None:
+                serie = self._values[values] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                serie[0][index] += 1
+            serie[1] += value
+            serie[2] += 1
+
+    def samples(self):
+        labels = self.labels + ('le',)
+        result = []
+        with self._lock:
+            for key, (compteurs, somme, total) in sorted(self._values.items()):
+                cumul = 0
+                for borne, n in zip(self.buckets, compteurs):
+                    cumul += n
+                    result.append((f'{self.name}_bucket', _labels(labels, key + (borne,)), cumul))
+                result.append((f'{self.name}_bucket', _labels(labels, key + ('+Inf',)), total))
+                result.append((f'{self.name}_sum', _labels(self.labels, key), somme))
+                result.append((f'{self.name}_count', _labels(self.labels, key), total))
+        return result
+
+
+# Métriques du processus (chaque worker gunicorn expose les siennes)
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Durée des requêtes HTTP',
+                            ('method', 'endpoint', 'status'))
+DB_QUERIES = Counter('db_queries_total', 'Instructions SQL exécutées', ('endpoint',))
+DB_SECONDS = Counter('db_query_duration_seconds_total', 'Temps passé dans les instructions SQL', ('endpoint',))
+OPENAI_LATENCY = Histogram('openai_request_duration_seconds', 'Durée des appels OpenAI', ('model', 'mode'))
+OPENAI_TOKENS = Counter('openai_tokens_total', 'Tokens consommés par les appels OpenAI', ('model', 'type'))
+METRICS = [REQUEST_LATENCY, DB_QUERIES, DB_SECONDS, OPENAI_LATENCY, OPENAI_TOKENS]
+
+
+def _endpoint():
+    """Route (gabarit d'URL, pas l'URL réelle : cardinalité bornée) ou 'hors_requete'."""
+    if not has_request_context():
+        return 'hors_requete'
+    return request.url_rule.rule if request.url_rule else 'inconnue'
+
+
+def _compteurs():
+    """Accumulateurs de la requête courante (None hors requête)."""
+    if not has_request_context():
+        return None
+    return g.setdefault('perf', {'db_queries': 0, 'db_seconds': 0.0, 'openai_seconds': 0.0})
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _avant_sql(conn, cursor, statement, parameters, context, executemany):
+    # Début porté par le contexte d'exécution (pas par la connexion du pool) : une instruction
+    # en échec, sans after_cursor_execute, ne laisse rien derrière elle
+    if context is not None:
+        context.perf_debut = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _apres_sql(conn, cursor, statement, parameters, context, executemany):
+    debut = getattr(context, 'perf_debut', None)
+    if debut is None:
+        return
+    duree = time.perf_counter() - debut
+    endpoint = _endpoint()
+    DB_QUERIES.inc(1, endpoint)
+    DB_SECONDS.inc(duree, endpoint)
+    compteurs = _compteurs()
+    if compteurs is not None:
+        compteurs['db_queries'] += 1
+        compteurs['db_seconds'] += duree
+
+
+def observe_openai(model, duree, usage=None, mode='sync'):
+    """Enregistre un appel OpenAI (durée, tokens de usage si fourni)."""
+    OPENAI_LATENCY.observe(duree, model, mode)
+    if usage is not None:
+        OPENAI_TOKENS.inc(usage.prompt_tokens or 0, model, 'prompt')
+        OPENAI_TOKENS.inc(usage.completion_tokens or 0, model, 'completion')
+    compteurs = _compteurs()
+    if compteurs is not None:
+        compteurs['openai_seconds'] += duree
+
+
+def init_metrics(app):
+    """Enregistre la mesure de latence et l'en-tête Server-Timing sur l'application."""
+
+    @app.before_request
+    def start_timer():
+        g.perf_debut = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        debut = g.pop('perf_debut', None)
+        if debut is None:
+            return response
+        duree = time.perf_counter() - debut
+        REQUEST_LATENCY.observe(duree, request.method, _endpoint(), response.status_code)
+
+        # Réponses streamées : seule la préparation est mesurée (le corps part après ce hook)
+        compteurs = _compteurs()
+        timing = [f'app;dur={duree * 1000:.1f}',
+                  f'db;dur={compteurs["db_seconds"] * 1000:.1f};desc="{compteurs["db_queries"]} SQL"']
+        if compteurs['openai_seconds']:
+            timing.append(f'openai;dur={compteurs["openai_seconds"] * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(timing)
+        return response
+
+    return app
+
+
+def render(extra=()):
+    """Texte Prometheus de toutes les métriques ; extra : (nom, type, aide, valeur) supplémentaires."""
+    lignes = []
+    for metric in METRICS:
+        lignes.append(f'# HELP {metric.name} {metric.help}')
+        lignes.append(f'# TYPE {metric.name} {metric.kind}')
+        lignes.extend(f'{nom}{labels} {valeur}' for nom, labels, valeur in metric.samples())
+    for nom, kind, aide, valeur in extra:
+        lignes.append(f'# HELP {nom} {aide}')
+        lignes.append(f'# TYPE {nom} {kind}')
+        lignes.append(f'{nom} {valeur}')
+    return '\n'.join(lignes) + '\n'
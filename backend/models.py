@@ -7,6 +7,7 @@ class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
+    agency_id = db.Column(db.String(36), index=True)  # Agence de l'agent (UUID Supabase)
 
 class Lead(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -16,4 +17,5 @@ class Lead(db.Model):
     type_bien = db.Column(db.String(200))  # Contiendra l'adresse
     budget = db.Column(db.Integer)         # Contiendra le prix
     score_ia = db.Column(db.Integer)
-    statut = db.Column(db.String(50), default="Nouveau")
\ No newline at end of file
+    statut = db.Column(db.String(50), default="Nouveau")
+    agency_id = db.Column(db.String(36), index=True)
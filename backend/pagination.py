@@ -0,0 +1,63 @@
+"""
+Pagination par curseur (keyset) pour les listes de leads
+Le curseur encode la dernière clé de tri (created_at ou score_ia, id) vue par le client
+"""
+
+import base64
+import json
+import uuid
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+# Taille de page par défaut et maximale
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class InvalidCursor(ValueError):
+    """Curseur de pagination illisible ou falsifié"""
+
+
+def encode_cursor(key, id):
+    """Encode la clé de tri (created_at ou score) et l'id d'un lead en jeton opaque."""
+    payload = json.dumps([key.isoformat() if isinstance(key, datetime) else key, str(id)])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, key_type=datetime):
+    """Décode un jeton produit par encode_cursor en (clé, id) ; key_type est le type de la clé de tri."""
+    try:
+        padding = '=' * (-len(token) % 4)
+        key, id = json.loads(base64.urlsafe_b64decode(token + padding))
+        key = datetime.fromisoformat(key) if key_type is datetime else key_type(key)
+        return key, uuid.UUID(id)
+    except (TypeError, ValueError) as e:
+        raise InvalidCursor(f"Curseur invalide : {token}") from e
+
+
+def parse_limit(value, default=DEFAULT_LIMIT):
+    """Convertit le paramètre ?limit= en entier borné à [1, MAX_LIMIT]."""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError(f"Paramètre limit invalide : {value}")
+    return max(1, min(MAX_LIMIT, limit))
+
+
+def keyset_page(query, sort_col, id_col, cursor=None, key_type=datetime):
+    """Applique le tri (sort_col DESC, id DESC) et la reprise après le curseur.
+
+    La condition est écrite en OR/AND plutôt qu'en comparaison de tuples pour
+    rester compatible avec le fallback SQLite, tout en restant servie par un
+    index sur (agency_id, sort_col DESC, id DESC) côté PostgreSQL.
+    """
+    if cursor:
+        key, id = decode_cursor(cursor, key_type)
+        query = query.filter(or_(
+            sort_col < key,
+            and_(sort_col == key, id_col < id)
+        ))
+    return query.order_by(sort_col.desc(), id_col.desc())
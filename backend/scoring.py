@@ -0,0 +1,105 @@
+"""
+Moteur de scoring des leads (Marché FR/EU)
+API scalaire (score_lead) et API vectorisée NumPy (score_batch) aux résultats identiques
+NumPy n'est importé qu'au premier scoring vectorisé (démarrage plus rapide)
+"""
+
+# Statuts IA par tranche de score
+STATUT_CHAUD = 'Chaud 🔥'
+STATUT_TIEDE = 'Tiède 😐'
+STATUT_FROID = 'Froid ❄️'
+STATUTS = (STATUT_FROID, STATUT_TIEDE, STATUT_CHAUD)
+# Score à partir duquel un lead est "chaud" (statut IA, compteurs du tableau de bord)
+SEUIL_CHAUD = 7
+
+# Bornes int64 : les budgets hors bornes gardent le même score une fois écrêtés
+_BUDGET_MIN = -(2 ** 62)
+_BUDGET_MAX = 2 ** 62
+
+
+def parse_budget(value):
+    """Nettoie un budget saisi ("350 000€", 350000, None...) en entier (0 si illisible)."""
+    try:
+        return int(str(value if value is not None else '0').replace(' ', '').replace('€', ''))
+    except ValueError:
+        return 0
+
+
+def statut_for_score(score):
+    return STATUT_CHAUD if score >= SEUIL_CHAUD else (STATUT_TIEDE if score >= 4 else STATUT_FROID)
+
+
+def score_lead(data):
+    """Score un lead (dict de formulaire) : retourne (budget, score, statut_ia)."""
+    score = 0
+    telephone = data.get('telephone') or ''
+    email = data.get('email') or ''
+    ville = (data.get('adresse') or '').lower()
+    budget = parse_budget(data.get('budget', '0'))
+
+    # Critères
+    if len(telephone) > 8: score += 4
+    elif len(email) > 5: score += 1
+
+    if budget > 500000: score += 5
+    elif budget > 250000: score += 3
+    elif budget > 100000: score += 1
+
+    # Pénalité cohérence (Ex: Paris à 50k€)
+    if 'paris' in ville and budget < 200000 and budget > 0:
+        score -= 3
+
+    # Bornes 0-10
+    score = max(0, min(10, score))
+    return budget, score, statut_for_score(score)
+
+
+def score_arrays(telephone_len, email_len, budget, paris):
+    """Cœur vectorisé : mêmes règles que score_lead sur des colonnes NumPy.
+
+    telephone_len, email_len : longueurs des chaînes
+    budget : budgets déjà nettoyés (entiers)
+    paris : booléen "l'adresse contient 'paris'"
+    Retourne (scores int8, statuts object).
+    """
+    import numpy as np
+
+    telephone_len = np.asarray(telephone_len)
+    email_len = np.asarray(email_len)
+    budget = np.clip(np.asarray(budget, dtype=np.int64), _BUDGET_MIN, _BUDGET_MAX)
+    paris = np.asarray(paris, dtype=bool)
+
+    score = np.where(telephone_len > 8, 4, np.where(email_len > 5, 1, 0))
+    score = score + np.select(
+        [budget > 500000, budget > 250000, budget > 100000], [5, 3, 1], default=0
+    )
+    score = score - 3 * (paris & (budget < 200000) & (budget > 0))
+    score = np.clip(score, 0, 10).astype(np.int8)
+
+    tranche = (score >= 4).astype(np.int8) + (score >= SEUIL_CHAUD)
+    return score, np.array(STATUTS, dtype=object)[tranche]
+
+
+def score_columns(telephones, emails, adresses, budgets):
+    """Score des colonnes brutes alignées (ex : lignes lues en base) ; retourne (budgets, scores, statuts)."""
+    import numpy as np
+
+    n = len(budgets)
+    budgets = [parse_budget(b) for b in budgets]
+    scores, statuts = score_arrays(
+        np.fromiter((len(t or '') for t in telephones), dtype=np.int32, count=n),
+        np.fromiter((len(e or '') for e in emails), dtype=np.int32, count=n),
+        np.fromiter((min(max(b, _BUDGET_MIN), _BUDGET_MAX) for b in budgets), dtype=np.int64, count=n),
+        np.fromiter(('paris' in (a or '').lower() for a in adresses), dtype=bool, count=n)
+    )
+    return budgets, scores, statuts
+
+
+def score_batch(leads):
+    """Score une liste de leads (dicts) en un passage ; retourne (budgets, scores, statuts)."""
+    return score_columns(
+        [l.get('telephone') for l in leads],
+        [l.get('email') for l in leads],
+        [l.get('adresse') for l in leads],
+        [l.get('budget', '0') for l in leads]
+    )
@@ -0,0 +1,152 @@
+"""
+Recherche plein texte des leads (nom, email, téléphone, adresse)
+PostgreSQL : index GIN trigrammes + tsvector ; SQLite : table FTS5 synchronisée par triggers
+"""
+
+from sqlalchemy import event, text
+
+MIN_QUERY_LENGTH = 3
+# Rang bm25 attribué aux correspondances exactes (bm25 est négatif, plus petit = meilleur)
+EXACT_RANK = -1e9
+
+# Document indexé côté PostgreSQL : l'expression des index et celle des requêtes doivent être identiques
+PG_DOCUMENT = ("lower(coalesce(nom, '') || ' ' || coalesce(email, '') || ' ' || "
+               "coalesce(telephone, '') || ' ' || coalesce(adresse, ''))")
+
+PG_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_leads_search_trgm ON leads USING gin (({PG_DOCUMENT}) gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS ix_leads_search_tsv ON leads USING gin (to_tsvector('simple', {PG_DOCUMENT}))",
+)
+
+# Table FTS5 à contenu externe (pas de copie des colonnes), tokenizer trigramme : recherche de sous-chaînes
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS leads_fts USING fts5("
+    "nom, email, telephone, adresse, content='leads', tokenize='{tokenizer}')",
+    "CREATE TRIGGER IF NOT EXISTS leads_fts_ai AFTER INSERT ON leads BEGIN "
+    "INSERT INTO leads_fts(rowid, nom, email, telephone, adresse) "
+    "VALUES (new.rowid, new.nom, new.email, new.telephone, new.adresse); END",
+    "CREATE TRIGGER IF NOT EXISTS leads_fts_ad AFTER DELETE ON leads BEGIN "
+    "INSERT INTO leads_fts(leads_fts, rowid, nom, email, telephone, adresse) "
+    "VALUES ('delete', old.rowid, old.nom, old.email, old.telephone, old.adresse); END",
+    "CREATE TRIGGER IF NOT EXISTS leads_fts_au AFTER UPDATE OF nom, email, telephone, adresse ON leads BEGIN "
+    "INSERT INTO leads_fts(leads_fts, rowid, nom, email, telephone, adresse) "
+    "VALUES ('delete', old.rowid, old.nom, old.email, old.telephone, old.adresse); "
+    "INSERT INTO leads_fts(rowid, nom, email, telephone, adresse) "
+    "VALUES (new.rowid, new.nom, new.email, new.telephone, new.adresse); END",
+)
+
+
+def install(connection):
+    """Crée les index de recherche s'ils manquent (idempotent) ; indexe les lignes existantes."""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        for ddl in PG_DDL:
+            connection.execute(text(ddl))
+    elif dialect == 'sqlite':
+        existe = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'leads_fts'")).first()
+        tokenizer = 'trigram' if sqlite_has_trigram(connection) else 'unicode61 remove_diacritics 2'
+        # Les triggers disparaissent avec la table leads (drop_all) : toujours les recréer
+        for ddl in SQLITE_DDL:
+            connection.execute(text(ddl.replace('{tokenizer}', tokenizer)))
+        if not existe:
+            rebuild(connection)
+
+
+def rebuild(connection):
+    """Reconstruit l'index FTS5 (après un VACUUM, qui peut renuméroter les rowid de leads)."""
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("INSERT INTO leads_fts(leads_fts) VALUES ('rebuild')"))
+
+
+def sqlite_has_trigram(connection):
+    """Le tokenizer trigram n'existe qu'à partir de SQLite 3.34."""
+    version = tuple(int(x) for x in connection.exec_driver_sql('SELECT sqlite_version()').scalar().split('.'))
+    return version >= (3, 34, 0)
+
+
+def register(table):
+    """Installe les index de recherche à la création de la table (db.create_all)."""
+    def installer(target, connection, **kw):
+        # Table neuve : un index FTS5 resté d'une table supprimée doit être vidé
+        install(connection)
+        rebuild(connection)
+
+    event.listen(table, 'after_create', installer)
+
+
+def terms(q):
+    """Termes de la recherche (mots de moins de 3 caractères ignorés : aucun trigramme à indexer).
+
+    ValueError si aucun terme ne reste.
+    """
+    words = [w for w in (q or '').lower().split() if len(w) >= MIN_QUERY_LENGTH]
+    if not words:
+        raise ValueError(f"Recherche trop courte (au moins un mot de {MIN_QUERY_LENGTH} caractères)")
+    return words
+
+
+def fts5_query(words):
+    """Requête MATCH : chaque terme entre guillemets (aucune syntaxe FTS5 interprétée), tous requis."""
+    return ' '.join('"' + w.replace('"', '""') + '"' for w in words)
+
+
+def like_pattern(word):
+    return '%' + word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def search_query(db, Lead, agency_id, q, extra_conditions=()):
+    """Requête ORM des leads de l'agence correspondant à q, triés par pertinence.
+
+    extra_conditions : conditions alternatives indexées (ex : téléphone E.164 exact).
+    """
+    words = terms(q)
+    query = Lead.query.filter(Lead.agency_id == agency_id)
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        document = db.literal_column(PG_DOCUMENT)
+        # Chaque terme est une sous-chaîne du document (index trigrammes), ou un mot (tsvector)
+        tsquery = db.func.plainto_tsquery('simple', ' '.join(words))
+        correspond = db.or_(
+            db.and_(*[document.ilike(like_pattern(w), escape='\\') for w in words]),
+            db.func.to_tsvector('simple', document).op('@@')(tsquery),
+            *extra_conditions
+        )
+        rang = db.func.greatest(
+            db.func.ts_rank_cd(db.func.to_tsvector('simple', document), tsquery),
+            db.func.similarity(document, ' '.join(words))
+        )
+        return query.filter(correspond).order_by(rang.desc(), Lead.created_at.desc(), Lead.id.desc())
+
+    if dialect == 'sqlite':
+        fts = db.table('leads_fts', db.column('rowid'))
+        rowid = db.literal_column('leads.rowid')
+        # Parcours piloté par l'index FTS5 (rank = bm25 : plus petit = plus pertinent), puis accès
+        # aux leads par rowid. Le « + » neutralise l'index sur agency_id : sans lui, SQLite peut
+        # choisir de parcourir tous les leads de l'agence et d'évaluer MATCH ligne par ligne
+        agence = db.literal_column('+leads.agency_id', Lead.agency_id.type)
+        correspondances = (
+            db.select(fts.c.rowid.label('rowid'), db.literal_column('leads_fts.rank').label('rang'))
+            .join(Lead, rowid == fts.c.rowid)
+            .where(db.text('leads_fts MATCH :fts_q').bindparams(fts_q=fts5_query(words)),
+                   agence == agency_id)
+        )
+        for condition in extra_conditions:
+            # Correspondance exacte (indexée) classée avant tout résultat plein texte
+            correspondances = correspondances.union_all(
+                db.select(rowid.label('rowid'), db.literal(EXACT_RANK).label('rang'))
+                .where(condition, Lead.agency_id == agency_id)
+            )
+        rangs = correspondances.subquery()
+        if extra_conditions:
+            rangs = db.select(rangs.c.rowid, db.func.min(rangs.c.rang).label('rang')).group_by(rangs.c.rowid).subquery()
+        return (Lead.query.join(rangs, rangs.c.rowid == rowid)
+                .order_by(rangs.c.rang, Lead.created_at.desc(), Lead.id.desc()))
+
+    # Autres bases : LIKE sans index
+    correspond = db.and_(*[db.or_(*[col.ilike(like_pattern(w), escape='\\')
+                                   for col in (Lead.nom, Lead.email, Lead.telephone, Lead.adresse)])
+                           for w in words])
+    return query.filter(db.or_(correspond, *extra_conditions)).order_by(Lead.created_at.desc(), Lead.id.desc())
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lanceur de production : gunicorn avec gunicorn.conf.py
+Même commande en local et sur Render (Start Command : python serve.py)
+
+Usage : python serve.py [options gunicorn supplémentaires]
+Rechargement gracieux : kill -HUP <pid du maître> (relit la configuration,
+relance les workers un par un ; avec GUNICORN_PRELOAD=true le code n'est
+rechargé que par un redémarrage complet)
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    try:
+        from gunicorn.app.wsgiapp import run
+    except ImportError:
+        print("=" * 60)
+        print("❌ ERREUR : gunicorn n'est pas disponible")
+        print("=" * 60)
+        print("\n📦 Installez-le avec : pip install -r requirements.txt")
+        print("💡 gunicorn ne fonctionne pas sous Windows : utilisez WSL, ou python run.py en développement")
+        sys.exit(1)
+
+    # Depuis backend/ pour que `app` et les modules voisins soient importables
+    os.chdir(BACKEND_DIR)
+    sys.path.insert(0, BACKEND_DIR)
+    sys.argv = ['gunicorn', '--config', os.path.join(BACKEND_DIR, 'gunicorn.conf.py')] + sys.argv[1:] + ['app:create_app()']
+    run()
+
+
+if __name__ == '__main__':
+    main()
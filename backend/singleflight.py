@@ -0,0 +1,140 @@
+"""
+Regroupement des appels identiques simultanés ("single-flight")
+Un seul appel amont par clé ; les autres requêtes attendent et reçoivent son résultat
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger('leadqualif.singleflight')
+
+
+class _Call:
+    """Appel en cours pour une clé, partagé par le leader et ses suiveurs"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SqliteLeases:
+    """Baux exclusifs par clé dans un fichier SQLite partagé par les processus de la machine.
+
+    Un bail expire au bout de ttl secondes : un worker tué en plein appel ne
+    bloque pas les autres indéfiniment.
+    """
+
+    def __init__(self, path, ttl=60):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS leases ('
+                ' key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, key, owner):
+        """Prend le bail de key pour owner ; retourne False s'il est détenu ailleurs."""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM leases WHERE key = ? AND expires_at < ?', (key, now))
+            cursor = conn.execute('INSERT OR IGNORE INTO leases VALUES (?, ?, ?)', (key, owner, now + self.ttl))
+        return cursor.rowcount == 1
+
+    def release(self, key, owner):
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM leases WHERE key = ? AND owner = ?', (key, owner))
+
+
+class SingleFlight:
+    """Exécute fn une seule fois par clé pour toutes les requêtes simultanées.
+
+    Dans le processus, les suiveurs attendent l'appel du leader. Entre
+    processus (si leases est fourni), le leader prend un bail SQLite ; s'il a
+    dû attendre le bail d'un autre worker, il relit d'abord le résultat via
+    lookup() (ex : le cache partagé) avant de relancer fn.
+    """
+
+    def __init__(self, leases=None, wait_timeout=60, poll_interval=0.1):
+        self.leases = leases
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, lookup=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, fn, lookup)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def _run(self, key, fn, lookup):
+        if self.leases is None or lookup is None:
+            return fn()
+
+        owner = uuid.uuid4().hex
+        deadline = time.time() + self.wait_timeout
+        waited = False
+        try:
+            while not self.leases.acquire(key, owner):
+                if time.time() >= deadline:
+                    # Bail bloqué trop longtemps : on appelle sans attendre davantage
+                    return fn()
+                waited = True
+                time.sleep(self.poll_interval)
+        except sqlite3.Error as e:
+            logger.warning("Erreur bail single-flight : %s", e)
+            return fn()
+
+        try:
+            if waited:
+                result = lookup()
+                if result is not None:
+                    with self._lock:
+                        self.coalesced += 1
+                    return result
+            return fn()
+        finally:
+            try:
+                self.leases.release(key, owner)
+            except sqlite3.Error as e:
+                logger.warning("Erreur bail single-flight : %s", e)
@@ -0,0 +1,156 @@
+"""
+Journal des requêtes SQL lentes
+Au-delà d'un seuil : instruction, paramètres masqués, route d'origine,
+et plan d'exécution (EXPLAIN) capturé une seule fois par forme de requête
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+from metrics import Counter, METRICS
+
+logger = logging.getLogger('leadqualif.slow_queries')
+
+SLOW_QUERIES = Counter('db_slow_queries_total', 'Instructions SQL au-dessus du seuil SLOW_QUERY_MS', ('endpoint',))
+METRICS.append(SLOW_QUERIES)
+
+# Nombre max de formes distinctes dont le plan est mémorisé (borne mémoire)
+MAX_SHAPES = 1000
+
+# Seules ces instructions acceptent EXPLAIN sans effet de bord
+EXPLAINABLE = ('select', 'with', 'insert', 'update', 'delete')
+
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+_LISTE = re.compile(r"\(\s*" + _PLACEHOLDER + r"(?:\s*,\s*" + _PLACEHOLDER + r")*\s*\)")
+_CHAINE = re.compile(r"'(?:[^']|'')*'")
+_NOMBRE = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+
+def statement_shape(statement):
+    """Forme d'une requête : littéraux et listes IN (...) de taille variable ramenés à '?'."""
+    shape = _CHAINE.sub('?', statement)
+    shape = _NOMBRE.sub('?', shape)
+    shape = re.sub(_PLACEHOLDER, '?', shape)
+    shape = _LISTE.sub('(?)', shape)
+    return ' '.join(shape.split())
+
+
+def redact(parameters):
+    """Remplace chaque valeur par son type : aucune donnée client (email, téléphone) dans les logs."""
+    if isinstance(parameters, dict):
+        return {k: f'<{type(v).__name__}>' for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            # executemany : forme du premier jeu de paramètres et nombre de lignes
+            return {'lignes': len(parameters), 'premiere': redact(parameters[0])}
+        return [f'<{type(v).__name__}>' for v in parameters]
+    return parameters
+
+
+def _route():
+    if not has_request_context():
+        return 'hors_requete'
+    return f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+
+
+class SlowQueryLog:
+    """Écoute un moteur SQLAlchemy et journalise les instructions plus lentes que threshold_ms."""
+
+    def __init__(self, threshold_ms=500, explain=True):
+        self.threshold = threshold_ms / 1000
+        self.explain = explain
+        self._plans = {}
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._avant)
+        event.listen(engine, 'after_cursor_execute', self._apres)
+        return self
+
+    def _avant(self, conn, cursor, statement, parameters, context, executemany):
+        # Début porté par le contexte d'exécution : une instruction en échec l'emporte avec elle
+        if context is not None:
+            context.slow_debut = time.perf_counter()
+
+    def _apres(self, conn, cursor, statement, parameters, context, executemany):
+        debut = getattr(context, 'slow_debut', None)
+        if debut is None:
+            return
+        duree = time.perf_counter() - debut
+        if duree < self.threshold or conn.info.get('slow_explain_en_cours'):
+            return
+
+        route = _route()
+        SLOW_QUERIES.inc(1, route)
+        shape = statement_shape(statement)
+        shape_id = hashlib.sha1(shape.encode('utf-8')).hexdigest()[:12]
+        logger.warning("Requête lente %.1f ms [%s] forme=%s : %s | paramètres : %s",
+                       duree * 1000, route, shape_id, ' '.join(statement.split()), redact(parameters))
+
+        if not self.explain or executemany or not shape.lower().startswith(EXPLAINABLE):
+            return
+        with self._lock:
+            if shape_id in self._plans or len(self._plans) >= MAX_SHAPES:
+                return
+            self._plans[shape_id] = None
+        plan = self._capturer_plan(conn, statement, parameters)
+        with self._lock:
+            self._plans[shape_id] = plan
+        if plan:
+            logger.warning("Plan de la forme %s :\n%s", shape_id, plan)
+
+    def _capturer_plan(self, conn, statement, parameters):
+        """EXPLAIN (PostgreSQL) ou EXPLAIN QUERY PLAN (SQLite) sur un curseur séparé ;
+        ne ré-exécute pas la requête et n'interrompt jamais la transaction en cours."""
+        postgres = conn.dialect.name == 'postgresql'
+        prefixe = 'EXPLAIN ' if postgres else 'EXPLAIN QUERY PLAN '
+        conn.info['slow_explain_en_cours'] = True
+        cursor = conn.connection.cursor()
+        try:
+            if postgres:
+                # Un EXPLAIN en échec annulerait la transaction : on l'isole dans un savepoint
+                cursor.execute('SAVEPOINT slow_query_explain')
+            try:
+                cursor.execute(prefixe + statement, parameters)
+                lignes = cursor.fetchall()
+            except Exception as e:
+                if postgres:
+                    cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                logger.info("EXPLAIN impossible : %s", e)
+                return None
+            if postgres:
+                cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+                return '\n'.join(ligne[0] for ligne in lignes)
+            # SQLite : (id, parent, notused, detail)
+            return '\n'.join(str(ligne[-1]) for ligne in lignes)
+        except Exception as e:
+            logger.info("EXPLAIN impossible : %s", e)
+            return None
+        finally:
+            cursor.close()
+            conn.info['slow_explain_en_cours'] = False
+
+    def plans(self):
+        with self._lock:
+            return dict(self._plans)
+
+
+def init_slow_query_log(app, engine):
+    """Active le journal sur le moteur de l'application.
+
+    SLOW_QUERY_MS : seuil en millisecondes (0 = désactivé)
+    SLOW_QUERY_EXPLAIN : capture du plan d'exécution par forme de requête
+    """
+    app.config.setdefault('SLOW_QUERY_MS', 500)
+    app.config.setdefault('SLOW_QUERY_EXPLAIN', True)
+    if not app.config['SLOW_QUERY_MS']:
+        return None
+    log = SlowQueryLog(app.config['SLOW_QUERY_MS'], app.config['SLOW_QUERY_EXPLAIN']).attach(engine)
+    app.extensions['slow_queries'] = log
+    return log
@@ -0,0 +1,192 @@
+"""
+Statistiques du tableau de bord tenues à jour de façon incrémentale
+Les compteurs par agence sont modifiés par des triggers sur la table leads (toutes les
+écritures, y compris celles des fonctions JS et de Supabase) et lus en O(1) par /api/dashboard
+"""
+
+from sqlalchemy import case, delete, event, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from scoring import SEUIL_CHAUD
+
+# Fonction d'ajustement : si l'agence n'a pas encore de compteurs (leads antérieurs à la
+# migration), ils sont initialisés depuis leads, qui contient déjà l'instruction en cours
+PG_AJUSTER = f"""
+CREATE OR REPLACE FUNCTION agency_stats_ajuster(p_agency_id UUID, p_total INTEGER, p_chauds INTEGER)
+RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+  UPDATE agency_stats
+     SET total_leads = total_leads + p_total, leads_chauds = leads_chauds + p_chauds, updated_at = now()
+   WHERE agency_id = p_agency_id;
+  IF NOT FOUND THEN
+    INSERT INTO agency_stats (agency_id, total_leads, leads_chauds, updated_at)
+    SELECT p_agency_id, count(*), count(*) FILTER (WHERE score_ia >= {SEUIL_CHAUD}), now()
+      FROM leads WHERE agency_id = p_agency_id
+    -- Compteurs créés entre-temps par une transaction concurrente : ils n'ont pas vu nos lignes
+    ON CONFLICT (agency_id) DO UPDATE
+       SET total_leads = agency_stats.total_leads + p_total,
+           leads_chauds = agency_stats.leads_chauds + p_chauds,
+           updated_at = now();
+  END IF;
+END $$
+"""
+
+# Triggers par instruction : un COPY de 1000 lignes fait un ajustement par agence, pas 1000
+PG_LEADS = f"""
+CREATE OR REPLACE FUNCTION agency_stats_leads() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+  d RECORD;
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    FOR d IN SELECT agency_id, count(*)::int AS total,
+                    (count(*) FILTER (WHERE score_ia >= {SEUIL_CHAUD}))::int AS chauds
+               FROM nouveaux GROUP BY agency_id LOOP
+      PERFORM agency_stats_ajuster(d.agency_id, d.total, d.chauds);
+    END LOOP;
+  ELSIF TG_OP = 'DELETE' THEN
+    FOR d IN SELECT agency_id, count(*)::int AS total,
+                    (count(*) FILTER (WHERE score_ia >= {SEUIL_CHAUD}))::int AS chauds
+               FROM anciens GROUP BY agency_id LOOP
+      PERFORM agency_stats_ajuster(d.agency_id, -d.total, -d.chauds);
+    END LOOP;
+  ELSE
+    -- Seules les lignes dont le score ou l'agence change comptent (pas de liste de colonnes
+    -- possible sur un trigger à tables de transition)
+    FOR d IN SELECT agency_id, sum(total)::int AS total, sum(chauds)::int AS chauds FROM (
+               SELECT n.agency_id, 1 AS total, CASE WHEN n.score_ia >= {SEUIL_CHAUD} THEN 1 ELSE 0 END AS chauds
+                 FROM nouveaux n JOIN anciens a ON a.id = n.id
+                WHERE (a.score_ia, a.agency_id) IS DISTINCT FROM (n.score_ia, n.agency_id)
+               UNION ALL
+               SELECT a.agency_id, -1, CASE WHEN a.score_ia >= {SEUIL_CHAUD} THEN -1 ELSE 0 END
+                 FROM nouveaux n JOIN anciens a ON a.id = n.id
+                WHERE (a.score_ia, a.agency_id) IS DISTINCT FROM (n.score_ia, n.agency_id)
+             ) changements GROUP BY agency_id LOOP
+      IF d.total <> 0 OR d.chauds <> 0 THEN
+        PERFORM agency_stats_ajuster(d.agency_id, d.total, d.chauds);
+      END IF;
+    END LOOP;
+  END IF;
+  RETURN NULL;
+END $$
+"""
+
+PG_DDL = (
+    PG_AJUSTER,
+    PG_LEADS,
+    "DROP TRIGGER IF EXISTS agency_stats_leads_ai ON leads",
+    "CREATE TRIGGER agency_stats_leads_ai AFTER INSERT ON leads "
+    "REFERENCING NEW TABLE AS nouveaux FOR EACH STATEMENT EXECUTE FUNCTION agency_stats_leads()",
+    "DROP TRIGGER IF EXISTS agency_stats_leads_au ON leads",
+    "CREATE TRIGGER agency_stats_leads_au AFTER UPDATE ON leads "
+    "REFERENCING OLD TABLE AS anciens NEW TABLE AS nouveaux FOR EACH STATEMENT EXECUTE FUNCTION agency_stats_leads()",
+    "DROP TRIGGER IF EXISTS agency_stats_leads_ad ON leads",
+    "CREATE TRIGGER agency_stats_leads_ad AFTER DELETE ON leads "
+    "REFERENCING OLD TABLE AS anciens FOR EACH STATEMENT EXECUTE FUNCTION agency_stats_leads()",
+)
+
+# SQLite (développement, tests) : triggers par ligne, exécutés juste après chaque ligne ;
+# l'initialisation depuis leads compte donc la ligne courante, sans delta à ajouter
+_SQLITE_CHAUD = f"(coalesce({{ligne}}.score_ia, 0) >= {SEUIL_CHAUD})"
+_SQLITE_AJOUTER = (
+    "UPDATE agency_stats SET total_leads = total_leads + 1, leads_chauds = leads_chauds + {chaud}, "
+    "updated_at = CURRENT_TIMESTAMP WHERE agency_id = new.agency_id; "
+)
+_SQLITE_RETIRER = (
+    "UPDATE agency_stats SET total_leads = total_leads - 1, leads_chauds = leads_chauds - {chaud}, "
+    "updated_at = CURRENT_TIMESTAMP WHERE agency_id = old.agency_id; "
+)
+_SQLITE_INITIALISER = (
+    "INSERT OR IGNORE INTO agency_stats (agency_id, total_leads, leads_chauds, updated_at) "
+    f"SELECT {{ligne}}.agency_id, count(*), coalesce(sum(score_ia >= {SEUIL_CHAUD}), 0), CURRENT_TIMESTAMP "
+    "FROM leads WHERE agency_id = {ligne}.agency_id; "
+)
+_NEW = _SQLITE_CHAUD.format(ligne='new')
+_OLD = _SQLITE_CHAUD.format(ligne='old')
+
+SQLITE_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS agency_stats_leads_ai AFTER INSERT ON leads BEGIN "
+    + _SQLITE_AJOUTER.format(chaud=_NEW) + _SQLITE_INITIALISER.format(ligne='new') + "END",
+    "CREATE TRIGGER IF NOT EXISTS agency_stats_leads_ad AFTER DELETE ON leads BEGIN "
+    + _SQLITE_RETIRER.format(chaud=_OLD) + _SQLITE_INITIALISER.format(ligne='old') + "END",
+    "CREATE TRIGGER IF NOT EXISTS agency_stats_leads_au AFTER UPDATE OF score_ia, agency_id ON leads "
+    "WHEN old.score_ia IS NOT new.score_ia OR old.agency_id IS NOT new.agency_id BEGIN "
+    + _SQLITE_RETIRER.format(chaud=_OLD) + _SQLITE_AJOUTER.format(chaud=_NEW)
+    + _SQLITE_INITIALISER.format(ligne='old') + _SQLITE_INITIALISER.format(ligne='new') + "END",
+)
+
+
+def install(connection):
+    """Crée les triggers de maintenance des compteurs s'ils manquent (idempotent)."""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        for ddl in PG_DDL:
+            connection.execute(text(ddl))
+    elif dialect == 'sqlite':
+        # Les triggers disparaissent avec la table leads (drop_all) : toujours les recréer
+        for ddl in SQLITE_DDL:
+            connection.execute(text(ddl))
+
+
+def register(leads_table, stats_table):
+    """Installe les triggers à la création des tables (db.create_all), quel que soit leur ordre."""
+    def installer(target, connection, **kw):
+        if all(connection.dialect.has_table(connection, t.name) for t in (leads_table, stats_table)):
+            install(connection)
+
+    event.listen(leads_table, 'after_create', installer)
+    event.listen(stats_table, 'after_create', installer)
+
+
+def _upsert(connection, stats_table):
+    return postgresql.insert(stats_table) if connection.dialect.name == 'postgresql' else sqlite.insert(stats_table)
+
+
+def count(connection, leads_table, agency_id=None):
+    """Recalcule les compteurs depuis la table des leads : [(agency_id, total, chauds)]."""
+    query = select(
+        leads_table.c.agency_id,
+        func.count(),
+        func.coalesce(func.sum(case((leads_table.c.score_ia >= SEUIL_CHAUD, 1), else_=0)), 0)
+    )
+    if agency_id is not None:
+        query = query.where(leads_table.c.agency_id == agency_id)
+    return connection.execute(query.group_by(leads_table.c.agency_id)).all()
+
+
+def get_stats(connection, leads_table, stats_table, agency_id):
+    """Retourne (total_leads, leads_chauds) de l'agence.
+
+    Lecture d'une ligne ; si l'agence n'a pas encore de compteurs, ils sont
+    calculés une fois depuis la table des leads puis enregistrés (à valider
+    par l'appelant).
+    """
+    row = connection.execute(
+        select(stats_table.c.total_leads, stats_table.c.leads_chauds)
+        .where(stats_table.c.agency_id == agency_id)
+    ).first()
+    if row is not None:
+        return tuple(row)
+
+    lignes = count(connection, leads_table, agency_id)
+    total, chauds = (lignes[0][1], lignes[0][2]) if lignes else (0, 0)
+    # Compteurs créés entre-temps par une écriture concurrente : ils font foi
+    connection.execute(_upsert(connection, stats_table).values(
+        agency_id=agency_id, total_leads=total, leads_chauds=chauds, updated_at=func.now()
+    ).on_conflict_do_nothing(index_elements=[stats_table.c.agency_id]))
+    return total, chauds
+
+
+def rebuild(connection, leads_table, stats_table):
+    """Réconciliation : reconstruit tous les compteurs depuis zéro (à valider par l'appelant).
+
+    Rattrape les écarts laissés par une écriture faite triggers désactivés
+    (restauration, session_replication_role). Retourne le nombre d'agences recalculées.
+    """
+    lignes = count(connection, leads_table)
+    connection.execute(delete(stats_table))
+    if lignes:
+        connection.execute(stats_table.insert(), [
+            {'agency_id': agency_id, 'total_leads': total, 'leads_chauds': chauds}
+            for agency_id, total, chauds in lignes
+        ])
+    return len(lignes)
@@ -0,0 +1,184 @@
+"""
+Générateur de données synthétiques (agences, profils, leads, interactions)
+Distributions réalistes et déterministes à partir d'une graine, écriture par INSERT en masse
+"""
+
+import bisect
+import itertools
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from dedup import normalize_email, normalize_phone
+from scoring import score_batch
+
+# Date de fin par défaut : fixe pour que deux générations avec la même graine soient identiques
+DEFAULT_END = datetime(2025, 1, 1)
+CHUNK_SIZE = 10000
+
+
+def _table(options):
+    """((valeur, poids), ...) -> (valeurs, poids cumulés) pour Generateur.choix."""
+    valeurs, poids = zip(*options)
+    return valeurs, tuple(itertools.accumulate(poids))
+
+
+PRENOMS = ('Camille', 'Léa', 'Manon', 'Chloé', 'Inès', 'Sarah', 'Emma', 'Julie', 'Lucas', 'Hugo',
+           'Thomas', 'Nicolas', 'Antoine', 'Julien', 'Maxime', 'Karim', 'Mehdi', 'Sofia', 'Yanis', 'Louis')
+NOMS = ('Martin', 'Bernard', 'Dubois', 'Thomas', 'Robert', 'Richard', 'Petit', 'Durand', 'Leroy', 'Moreau',
+        'Simon', 'Laurent', 'Lefebvre', 'Michel', 'Garcia', 'Fontaine', 'Benali', 'Nguyen', 'Rousseau', 'Blanc')
+DOMAINES = ('gmail.com', 'orange.fr', 'hotmail.fr', 'free.fr', 'yahoo.fr', 'outlook.fr', 'sfr.fr', 'laposte.net')
+# ((ville, budget médian), poids) : Paris concentre les demandes et les prix
+VILLES = _table(((('Paris', 520000), 30), (('Lyon', 340000), 12), (('Marseille', 260000), 10),
+                 (('Bordeaux', 330000), 8), (('Toulouse', 280000), 8), (('Nantes', 290000), 7),
+                 (('Lille', 230000), 6), (('Nice', 420000), 6), (('Rennes', 270000), 5),
+                 (('Montpellier', 280000), 5), (('Strasbourg', 240000), 3)))
+RUES = ('rue de la République', 'avenue Victor Hugo', 'boulevard Voltaire', 'rue Nationale', 'place du Marché',
+        'rue des Lilas', 'avenue Jean Jaurès', 'rue Pasteur', 'chemin des Vignes', 'quai de la Loire')
+TYPES_BIEN = _table((('Appartement', 50), ('Maison', 30), ('Studio', 10), ('Terrain', 5), ('Local commercial', 5)))
+SOURCES = _table((('Formulaire site', 40), ('SeLoger', 20), ('Leboncoin', 20), ('Recommandation', 10), ('Facebook', 10)))
+STATUTS_CRM = _table((('À traiter', 45), ('Contacté', 25), ('RDV planifié', 12), ('Négociation', 8),
+                      ('Gagné', 4), ('Perdu', 6)))
+PLANS = _table((('starter', 60), ('pro', 30), ('enterprise', 10)))
+ACTIONS = _table((('Appel', 40), ('Email', 30), ('SMS', 15), ('Visite', 10), ('Note', 5)))
+
+
+class Generateur:
+    """Tirages déterministes : même graine, mêmes lignes (identifiants compris)."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def choix(self, table):
+        """Tirage pondéré dans une table construite par _table()."""
+        valeurs, cumul = table
+        return valeurs[bisect.bisect(cumul, self.rng.random() * cumul[-1])]
+
+    def date(self, fin, jours):
+        """Date dans les `jours` précédant fin, plus dense sur la période récente."""
+        recul = jours * 86400 * (1 - self.rng.random() ** 0.5)
+        return fin - timedelta(seconds=int(recul))
+
+    def telephone(self, numero=None):
+        """Mobile français ; numero donne un numéro distinct par valeur (bijection modulo 10^8)."""
+        abonne = self.rng.randrange(10 ** 8) if numero is None else numero * 48271 % 10 ** 8
+        return f"0{self.rng.choice('67')}{abonne:08d}"
+
+    def personne(self, numero=None):
+        """(prénom, nom, email) ; numero rend l'email unique (un lead = une personne)."""
+        prenom, nom = self.rng.choice(PRENOMS), self.rng.choice(NOMS)
+        suffixe = self.rng.randrange(1000) if numero is None else f"{numero:x}"
+        email = f"{prenom}.{nom}.{suffixe}@{self.rng.choice(DOMAINES)}".lower()
+        return prenom, nom, email
+
+    def interactions(self, moyenne):
+        """Nombre d'interactions d'un lead : loi géométrique (beaucoup de 0-1, longue traîne)."""
+        if moyenne <= 0:
+            return 0
+        p = 1 / (1 + moyenne)
+        n = 0
+        while self.rng.random() > p:
+            n += 1
+        return n
+
+
+def _par_lots(iterable, taille):
+    lot = []
+    for element in iterable:
+        lot.append(element)
+        if len(lot) >= taille:
+            yield lot
+            lot = []
+    if lot:
+        yield lot
+
+
+def agences(gen, nombre, fin):
+    for i in range(nombre):
+        cree = gen.date(fin, 3 * 365)
+        yield {'id': gen.uuid(), 'nom_agence': f"{gen.choix(VILLES)[0]} Immobilier {i + 1}",
+               'plan': gen.choix(PLANS), 'created_at': cree, 'updated_at': cree}
+
+
+def profils(gen, agence, nombre):
+    for i in range(nombre):
+        prenom, nom, email = gen.personne()
+        yield {'id': gen.uuid(), 'user_id': gen.uuid(), 'agency_id': agence['id'], 'email': email,
+               'role': 'admin' if i == 0 else 'agent', 'nom_complet': f"{prenom} {nom}",
+               'telephone': gen.telephone(), 'created_at': agence['created_at'], 'updated_at': agence['created_at']}
+
+
+def lead(gen, numero, agency_id, fin, jours):
+    ville, median = gen.choix(VILLES)
+    prenom, nom, email = gen.personne(numero)
+    # Budget log-normal autour du prix médian de la ville, arrondi au millier
+    budget = int(round(median * gen.rng.lognormvariate(0, 0.5), -3)) if gen.rng.random() < 0.9 else 0
+    cree = gen.date(fin, jours)
+    telephone = gen.telephone(numero) if gen.rng.random() < 0.7 else ''
+    return {
+        'id': gen.uuid(), 'agency_id': agency_id, 'nom': f"{prenom} {nom}", 'email': email,
+        'telephone': telephone, 'email_normalise': normalize_email(email), 'telephone_e164': normalize_phone(telephone),
+        'budget': budget, 'type_bien': gen.choix(TYPES_BIEN),
+        'adresse': f"{gen.rng.randint(1, 150)} {gen.rng.choice(RUES)}, {ville}",
+        'statut_crm': gen.choix(STATUTS_CRM), 'source': gen.choix(SOURCES),
+        'created_at': cree, 'updated_at': cree + timedelta(hours=gen.rng.randint(0, 720)),
+    }
+
+
+def populate(db, models, agencies=10, leads=10000, seed=42, profiles_per_agency=3,
+             interactions_mean=2.0, days=365, end=DEFAULT_END, chunk_size=CHUNK_SIZE, progress=None):
+    """Remplit la base ; models = (Agency, Profile, Lead, Interaction). Retourne les nombres de lignes.
+
+    Les leads sont répartis entre agences selon des poids de Pareto (quelques
+    grosses agences, beaucoup de petites) ; les interactions par lead suivent
+    une loi géométrique de moyenne interactions_mean. Chaque lot est inséré en
+    un INSERT multi-lignes (executemany) et validé dans sa propre transaction.
+    """
+    Agency, Profile, Lead, Interaction = models
+    gen = Generateur(seed)
+    comptes = {'agencies': 0, 'profiles': 0, 'leads': 0, 'interactions': 0}
+
+    liste_agences = list(agences(gen, agencies, end))
+    liste_profils = [p for a in liste_agences for p in profils(gen, a, profiles_per_agency)]
+    for table, lignes in ((Agency, liste_agences), (Profile, liste_profils)):
+        for lot in _par_lots(lignes, chunk_size):
+            db.session.execute(table.__table__.insert(), lot)
+    db.session.commit()
+    comptes['agencies'], comptes['profiles'] = len(liste_agences), len(liste_profils)
+
+    repartition = _table((a['id'], gen.rng.paretovariate(1.2)) for a in liste_agences) if liste_agences else None
+    agents = {a['id']: [] for a in liste_agences}
+    for p in liste_profils:
+        agents[p['agency_id']].append(p['id'])
+
+    def generer_leads():
+        if repartition is None:
+            return
+        for numero in range(leads):
+            yield lead(gen, numero, gen.choix(repartition), end, days)
+
+    for lot in _par_lots(generer_leads(), chunk_size):
+        _, scores, statuts = score_batch(lot)
+        for ligne, score, statut_ia in zip(lot, scores.tolist(), statuts):
+            ligne.update(score_ia=score, statut=statut_ia)
+        interactions = []
+        for ligne in lot:
+            equipe = agents[ligne['agency_id']]
+            for _ in range(gen.interactions(interactions_mean)):
+                interactions.append({
+                    'id': gen.uuid(), 'lead_id': ligne['id'], 'type_action': gen.choix(ACTIONS),
+                    'details': 'Suivi généré', 'created_by': gen.rng.choice(equipe) if equipe else None,
+                    'date': ligne['created_at'] + timedelta(hours=gen.rng.randint(1, 24 * 60)),
+                })
+        db.session.execute(Lead.__table__.insert(), lot)
+        for sous_lot in _par_lots(interactions, chunk_size):
+            db.session.execute(Interaction.__table__.insert(), sous_lot)
+        db.session.commit()
+        comptes['leads'] += len(lot)
+        comptes['interactions'] += len(interactions)
+        if progress:
+            progress(comptes)
+    return comptes
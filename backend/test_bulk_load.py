@@ -0,0 +1,146 @@
+"""
+Test du chargement en masse PostgreSQL (COPY ... FROM STDIN) sans serveur PostgreSQL
+Le curseur du pilote est simulé : instruction COPY, encodage des valeurs, erreurs traduites
+"""
+
+import io
+import uuid
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import Boolean, Column, DateTime, Integer, MetaData, String, Table, exc
+
+from bulk_load import load_rows
+
+LEADS = Table(
+    'leads', MetaData(),
+    Column('id', String(36), primary_key=True),
+    Column('nom', String(100)),
+    Column('budget', Integer),
+    Column('actif', Boolean),
+    Column('created_at', DateTime, default=lambda: datetime(2025, 1, 2, 3, 4, 5)),
+)
+
+DIFFICILES = [
+    'Dupont, Jean',
+    'Le "Clos" des Lilas',
+    "l'Étang",
+    'ligne 1\nligne 2\r\nligne 3',
+    'tab\there',
+    'C:\\chemin\\N',
+    '\\N',
+    '',
+]
+
+
+class Error(Exception):
+    pass
+
+
+class IntegrityError(Error):
+    pass
+
+
+DBAPI = SimpleNamespace(Error=Error, IntegrityError=IntegrityError)
+
+
+class Psycopg2Cursor:
+    def __init__(self, erreur=None):
+        self.copies = []
+        self.closed = False
+        self.erreur = erreur
+
+    def copy_expert(self, sql, fichier):
+        assert isinstance(fichier, io.StringIO)
+        self.copies.append((sql, fichier.read()))
+        if self.erreur:
+            raise self.erreur
+
+    def close(self):
+        self.closed = True
+
+
+class Psycopg3Cursor:
+    def __init__(self):
+        self.copies = []
+        self.closed = False
+
+    def copy(self, sql):
+        cursor = self
+
+        class Copy:
+            def __enter__(self):
+                cursor.copies.append([sql, ''])
+                return self
+
+            def write(self, data):
+                cursor.copies[-1][1] += data
+
+            def __exit__(self, *exc_info):
+                return False
+
+        return Copy()
+
+    def close(self):
+        self.closed = True
+
+
+def connexion(cursor):
+    dialect = SimpleNamespace(name='postgresql', loaded_dbapi=DBAPI)
+    return SimpleNamespace(dialect=dialect, connection=SimpleNamespace(cursor=lambda: cursor))
+
+
+def lire_copy(data):
+    """Décode le format texte de COPY comme PostgreSQL : tabulations, \\N pour NULL, échappements \\."""
+    echappements = {'\\': '\\', 't': '\t', 'n': '\n', 'r': '\r'}
+    lignes = []
+    for ligne in data.split('\n')[:-1]:
+        valeurs = []
+        for champ in ligne.split('\t'):
+            if champ == '\\N':
+                valeurs.append(None)
+                continue
+            valeur, i = [], 0
+            while i < len(champ):
+                if champ[i] == '\\':
+                    valeur.append(echappements[champ[i + 1]])
+                    i += 2
+                else:
+                    valeur.append(champ[i])
+                    i += 1
+            valeurs.append(''.join(valeur))
+        lignes.append(valeurs)
+    return lignes
+
+
+def lignes():
+    return [{'id': str(uuid.UUID(int=n)), 'nom': nom, 'budget': n or None, 'actif': n % 2 == 0}
+            for n, nom in enumerate(DIFFICILES)] + [{'id': 'x', 'nom': None, 'budget': -5, 'actif': None}]
+
+
+@pytest.mark.parametrize('cursor', [Psycopg2Cursor(), Psycopg3Cursor()], ids=['psycopg2', 'psycopg3'])
+def test_copy(cursor):
+    load_rows(connexion(cursor), LEADS, lignes())
+
+    [(sql, data)] = cursor.copies
+    assert sql == 'COPY leads (id, nom, budget, actif, created_at) FROM STDIN'
+    # Une ligne COPY par lead : les retours à la ligne des valeurs sont échappés
+    assert data.count('\n') == len(DIFFICILES) + 1
+    attendu = [[row['id'], row['nom'], None if row['budget'] is None else str(row['budget']),
+                None if row['actif'] is None else 'tf'[not row['actif']], '2025-01-02T03:04:05']
+               for row in lignes()]
+    assert lire_copy(data) == attendu
+    # Virgules et guillemets n'ont pas de sens en format texte : transmis tels quels
+    assert 'Dupont, Jean\t' in data and 'Le "Clos" des Lilas\t' in data
+    # NULL (\N) distinct de la chaîne '\N' et de la chaîne vide
+    assert lire_copy(data)[6][1] == '\\N' and lire_copy(data)[7][1] == '' and lire_copy(data)[8][1] is None
+    assert cursor.closed
+
+
+def test_erreur_du_pilote_traduite():
+    cursor = Psycopg2Cursor(erreur=IntegrityError('duplicate key value violates unique constraint'))
+    with pytest.raises(exc.IntegrityError) as erreur:
+        load_rows(connexion(cursor), LEADS, lignes())
+    assert erreur.value.statement.startswith('COPY leads (')
+    assert cursor.closed
@@ -0,0 +1,121 @@
+"""
+Test de la détection des doublons à l'ingestion
+Même personne (email normalisé ou téléphone E.164) dans une agence => une interaction, pas un lead
+"""
+
+import uuid
+
+import app as backend
+from dedup import BloomFilter, normalize_email, normalize_phone
+
+
+def compter(modele):
+    return backend.db.session.query(modele).count()
+
+
+def test_normalisation():
+    assert normalize_email('  Jean.Dupont+immo@GoogleMail.com ') == 'jeandupont@gmail.com'
+    assert normalize_email('Marie.Curie@orange.fr') == 'marie.curie@orange.fr'
+    assert normalize_phone('06 12 34 56 78') == '+33612345678'
+    assert normalize_phone('+33 6 12 34 56 78') == '+33612345678'
+    assert normalize_phone('0033612345678') == '+33612345678'
+    assert normalize_phone('12') is None
+
+
+def test_bloom_sans_faux_negatif():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for n in range(1000):
+        bloom.add(f'cle-{n}')
+    assert all(f'cle-{n}' in bloom for n in range(1000))
+    faux_positifs = sum(f'autre-{n}' in bloom for n in range(10000))
+    assert faux_positifs < 300
+
+
+def test_bloom_par_lots_identique():
+    # Import en masse : add_many / contains_many positionnent et lisent les mêmes bits
+    unitaire, par_lots = BloomFilter(capacity=1000), BloomFilter(capacity=1000)
+    cles = [f'cle-{n}' for n in range(1000)]
+    for cle in cles:
+        unitaire.add(cle)
+    par_lots.add_many(cles)
+    assert par_lots.bits == unitaire.bits
+    autres = [f'autre-{n}' for n in range(5000)]
+    assert par_lots.contains_many(autres).tolist() == [cle in unitaire for cle in autres]
+
+
+def test_add_lead_fusionne_les_doublons(client):
+    lead = {'agency_id': client.agency_id, 'nom': 'Jean', 'email': 'jean.dupont@gmail.com', 'telephone': '0612345678'}
+    assert client.post('/api/leads', json=lead).status_code == 201
+
+    # Même email écrit autrement, puis même téléphone au format international
+    reponse = client.post('/api/leads', json=dict(lead, email='Jean.Dupont+2@gmail.com', telephone=''))
+    assert reponse.status_code == 200 and reponse.get_json()['doublon']
+    reponse = client.post('/api/leads', json=dict(lead, email='autre@orange.fr', telephone='+33 6 12 34 56 78'))
+    assert reponse.status_code == 200
+
+    assert compter(backend.Lead) == 1
+    assert compter(backend.Interaction) == 2
+
+    # Une autre agence garde ses propres leads
+    autre = backend.Agency(nom_agence='Autre')
+    backend.db.session.add(autre)
+    backend.db.session.commit()
+    assert client.post('/api/leads', json=dict(lead, agency_id=str(autre.id))).status_code == 201
+    assert compter(backend.Lead) == 2
+
+
+def test_fusion_garde_le_telephone_d_un_autre_lead(client):
+    # A sans téléphone, B avec ; une demande de A portant le numéro de B ne le lui transfère pas
+    client.post('/api/leads', json={'agency_id': client.agency_id, 'nom': 'A', 'email': 'a@x.fr'})
+    client.post('/api/leads', json={'agency_id': client.agency_id, 'nom': 'B', 'email': 'b@x.fr',
+                                    'telephone': '0612345678'})
+    reponse = client.post('/api/leads', json={'agency_id': client.agency_id, 'nom': 'A', 'email': 'a@x.fr',
+                                              'telephone': '06 12 34 56 78'})
+    assert reponse.status_code == 200 and reponse.get_json()['doublon']
+    leads = {l.nom: l for l in backend.Lead.query}
+    assert (leads['A'].telephone, leads['B'].telephone_e164) == ('', '+33612345678')
+    assert compter(backend.Interaction) == 1
+
+    # Numéro libre : il complète le lead
+    client.post('/api/leads', json={'agency_id': client.agency_id, 'nom': 'A', 'email': 'a@x.fr',
+                                    'telephone': '0699999999'})
+    assert backend.db.session.get(backend.Lead, leads['A'].id).telephone_e164 == '+33699999999'
+
+
+def test_filtre_charge_evite_la_recherche(client):
+    lead = {'agency_id': client.agency_id, 'nom': 'Jean', 'email': 'jean@orange.fr'}
+    client.post('/api/leads', json=lead)
+    # Chargé pendant la première requête (DEDUP_BLOOM_WARMUP=sync)
+    index = client.application.extensions['lead_index']
+    assert index.ready
+    agency_id = uuid.UUID(client.agency_id)
+    assert index.maybe_exists(agency_id, 'jean@orange.fr', None)
+    assert not index.maybe_exists(agency_id, 'nouveau@orange.fr', None)
+
+
+def test_import_en_masse(client):
+    client.post('/api/leads', json={'agency_id': client.agency_id, 'nom': 'A', 'email': 'a@test.fr'})
+    reponse = client.post(f'/api/leads/bulk?agency_id={client.agency_id}', json=[
+        {'nom': 'A bis', 'email': 'A@test.fr'},
+        {'nom': 'B', 'email': 'b@test.fr', 'telephone': '0611111111'},
+        {'nom': 'B bis', 'email': 'b2@test.fr', 'telephone': '06 11 11 11 11'},
+    ]).get_json()
+    assert (reponse['created'], reponse['merged'], reponse['errors']) == (1, 2, 0)
+    assert compter(backend.Lead) == 2
+    assert compter(backend.Interaction) == 2
+
+
+def test_import_en_masse_valide_chaque_ligne(client):
+    # Une valeur hors schéma est refusée seule au lieu de faire échouer le lot entier
+    reponse = client.post(f'/api/leads/bulk?agency_id={client.agency_id}', json=[
+        {'nom': 'A', 'email': 'a@test.fr'},
+        {'nom': 'B' * 101, 'email': 'b@test.fr'},
+        {'nom': 'C', 'email': 'c@test.fr', 'telephone': '0' * 21},
+        {'nom': 'D', 'email': 'd@test.fr', 'budget': '3 000 000 000 €'},
+        {'nom': 'E', 'email': 'e@test.fr', 'budget': 2 ** 31 - 1, 'adresse': 'x' * 500},
+    ]).get_json()
+    assert (reponse['created'], reponse['merged'], reponse['errors']) == (2, 0, 3)
+    assert [r['message'] for r in reponse['results'] if r['status'] == 'error'] == [
+        'nom trop long (100 caractères max)', 'telephone trop long (20 caractères max)',
+        'budget hors limites : 3 000 000 000 €']
+    assert compter(backend.Lead) == 2
@@ -0,0 +1,75 @@
+"""
+Test de l'export des leads (GET /api/leads/export)
+CSV / NDJSON streamés, limités à l'agence, interactions aplaties ou imbriquées
+"""
+
+import csv
+import gzip
+import io
+import json
+import uuid
+
+import pytest
+
+import app as backend
+
+
+@pytest.fixture
+def client(client):
+    agence, autre = uuid.UUID(client.agency_id), backend.Agency(nom_agence='Agence B')
+    backend.db.session.add(autre)
+    backend.db.session.flush()
+    for n in range(3):
+        lead = backend.Lead(agency_id=agence, nom=f'Lead {n}', email=f'lead{n}@test.fr')
+        backend.db.session.add(lead)
+        backend.db.session.flush()
+        for action in ('Appel', 'Email')[:n]:
+            backend.db.session.add(backend.Interaction(lead_id=lead.id, type_action=action))
+    backend.db.session.add(backend.Lead(agency_id=autre.id, nom='Autre', email='autre@test.fr'))
+    backend.db.session.commit()
+    return client
+
+
+def exporter(client, **params):
+    return client.get('/api/leads/export', query_string={'agency_id': client.agency_id, **params})
+
+
+def test_csv(client):
+    reponse = exporter(client, fields='nom,email')
+    assert reponse.mimetype == 'text/csv'
+    assert reponse.headers['Content-Disposition'].startswith('attachment;')
+    lignes = list(csv.reader(io.StringIO(reponse.get_data(as_text=True))))
+    assert lignes[0] == ['nom', 'email']
+    assert sorted(l[0] for l in lignes[1:]) == ['Lead 0', 'Lead 1', 'Lead 2']
+
+
+def test_csv_interactions_aplaties(client):
+    reponse = exporter(client, fields='nom', interactions='flat')
+    lignes = list(csv.DictReader(io.StringIO(reponse.get_data(as_text=True))))
+    # id ajouté pour rattacher les interactions ; une ligne par interaction, une ligne vide pour Lead 0
+    assert list(lignes[0]) == ['id', 'nom', 'interaction_id', 'interaction_type_action',
+                               'interaction_details', 'interaction_date']
+    par_lead = {}
+    for l in lignes:
+        par_lead.setdefault(l['nom'], []).append(l['interaction_type_action'])
+    assert {nom: sorted(actions) for nom, actions in par_lead.items()} == {
+        'Lead 0': [''], 'Lead 1': ['Appel'], 'Lead 2': ['Appel', 'Email']}
+
+
+def test_ndjson_imbrique_et_gzip(client):
+    reponse = exporter(client, format='ndjson', interactions='nested', fields='nom')
+    assert reponse.mimetype == 'application/x-ndjson'
+    leads = [json.loads(l) for l in reponse.get_data(as_text=True).splitlines()]
+    assert {l['nom']: len(l['interactions']) for l in leads} == {'Lead 0': 0, 'Lead 1': 1, 'Lead 2': 2}
+
+    compresse = client.get('/api/leads/export', query_string={'agency_id': client.agency_id, 'format': 'ndjson'},
+                           headers={'Accept-Encoding': 'gzip'})
+    assert compresse.headers['Content-Encoding'] == 'gzip'
+    assert len(gzip.decompress(compresse.data).decode().splitlines()) == 3
+
+
+def test_parametres_invalides(client):
+    assert client.get('/api/leads/export').status_code == 400
+    assert exporter(client, format='xml').status_code == 400
+    assert exporter(client, format='csv', interactions='nested').status_code == 400
+    assert exporter(client, fields='mot_de_passe').status_code == 400
@@ -0,0 +1,87 @@
+"""
+Test de l'import CSV des leads (POST /api/leads/import, flask import-leads)
+Colonnes reconnues, doublons fusionnés, rapport des lignes refusées et index de recherche à jour
+"""
+
+import io
+import json
+
+import app as backend
+
+CSV = (
+    '﻿Nom;E-mail;Téléphone;Budget;Type de bien;Ville;Commentaire\n'
+    'Camille Fontaine;camille@orange.fr;06 12 34 56 78;650000;Maison;Lyon;rappeler\n'
+    'Hugo Martin;;0698765432;;;;\n'
+    '\n'
+    'Léa Moreau;lea@free.fr;;"180 000";Studio;"Paris\n11e";\n'
+    'Camille F.;CAMILLE@orange.fr;;;;;doublon\n'
+)
+
+
+def importer(client, agency_id, corps, **params):
+    r = client.post('/api/leads/import', query_string={'agency_id': agency_id, **params},
+                    data=corps.encode('utf-8'), content_type='text/csv')
+    return r.status_code, [json.loads(l) for l in r.get_data(as_text=True).splitlines()]
+
+
+def test_import_csv(app):
+    statut, evenements = importer(app.test_client(), app.agency_id, CSV)
+    assert statut == 200
+    assert evenements[0] == {'type': 'columns', 'ignored': ['Commentaire'], 'columns': {
+        'nom': 'Nom', 'email': 'E-mail', 'telephone': 'Téléphone', 'budget': 'Budget',
+        'type_bien': 'Type de bien', 'adresse': 'Ville'}}
+    # Numéro de ligne du fichier (en-tête = 1) dans le rapport d'erreurs
+    assert [e for e in evenements if e['type'] == 'error'] == [
+        {'type': 'error', 'line': 3, 'message': 'email est requis'}]
+    bilan = evenements[-1]
+    assert bilan['type'] == 'summary'
+    assert (bilan['rows'], bilan['created'], bilan['merged'], bilan['errors']) == (4, 2, 1, 1)
+
+    leads = {l.nom: l for l in backend.Lead.query}
+    assert set(leads) == {'Camille Fontaine', 'Léa Moreau'}
+    camille, lea = leads['Camille Fontaine'], leads['Léa Moreau']
+    assert camille.telephone_e164 == '+33612345678' and camille.score_ia == 9
+    # Budget "180 000" nettoyé, pénalité Paris à moins de 200 000 € appliquée
+    assert (lea.budget, lea.adresse, lea.score_ia) == (180000, 'Paris\n11e', 0)
+    assert [i.type_action for i in camille.interactions] == [backend.TYPE_DOUBLON]
+
+    # Index de recherche alimenté par le chargement en masse
+    r = app.test_client().get('/api/leads/search', query_string={'agency_id': app.agency_id, 'q': 'moreau'})
+    assert [l['nom'] for l in r.get_json()['data']['leads']] == ['Léa Moreau']
+
+
+def test_correspondance_explicite(app):
+    corps = 'Contact,Mail principal,Mail secondaire\nJean Dupont,jean@orange.fr,x\n'
+    _, evenements = importer(app.test_client(), app.agency_id, corps, map='Mail principal=email')
+    assert evenements[0]['columns'] == {'email': 'Mail principal', 'nom': 'Contact'}
+    assert evenements[-1]['created'] == 1
+
+
+def test_ligne_hors_limites(app):
+    corps = f'Nom;E-mail;Type de bien\nJean;jean@orange.fr;{"x" * 51}\nLéa;lea@free.fr;Studio\n'
+    _, evenements = importer(app.test_client(), app.agency_id, corps)
+    assert [e for e in evenements if e['type'] == 'error'] == [
+        {'type': 'error', 'line': 2, 'message': 'type_bien trop long (50 caractères max)'}]
+    assert evenements[-1]['created'] == 1
+
+
+def test_parametres_invalides(app):
+    client = app.test_client()
+    assert importer(client, '', CSV)[0] == 400
+    assert importer(client, '00000000-0000-0000-0000-000000000000', CSV)[0] == 404
+    assert importer(client, app.agency_id, 'Nom;Téléphone\nA;0612345678\n')[0] == 400
+    assert importer(client, app.agency_id, CSV, map='Nom=mot_de_passe')[0] == 400
+    assert importer(client, app.agency_id, '')[0] == 400
+    formulaire = client.post('/api/leads/import', query_string={'agency_id': app.agency_id},
+                             data={'file': (io.BytesIO(CSV.encode('utf-8')), 'leads.csv')})
+    assert formulaire.status_code == 400
+
+
+def test_commande(app, tmp_path):
+    fichier, rapport = tmp_path / 'leads.csv', tmp_path / 'erreurs.csv'
+    fichier.write_text(CSV, encoding='utf-8')
+    resultat = app.test_cli_runner().invoke(args=[
+        'import-leads', str(fichier), '--agency-id', app.agency_id, '--chunk-size', '2', '--errors', str(rapport)])
+    assert resultat.exit_code == 0, resultat.output
+    assert '2 leads créés, 1 fusionnés' in resultat.output
+    assert rapport.read_text(encoding='utf-8').splitlines() == ['ligne,message', '3,email est requis']
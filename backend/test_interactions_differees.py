@@ -0,0 +1,97 @@
+"""
+Test de l'écriture différée des interactions (INTERACTIONS_WRITE_BEHIND)
+Réponse immédiate, lecture de ses propres écritures, insertion groupée et reprise du journal après un arrêt brutal
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import pytest
+
+import app as backend
+
+
+@pytest.fixture
+def app_config(tmp_path):
+    return {'INTERACTIONS_WRITE_BEHIND': True, 'INTERACTIONS_SPILL_DIR': str(tmp_path),
+            'INTERACTIONS_FLUSH_MS': 60000, 'INTERACTIONS_FLUSH_ROWS': 1000, 'INTERACTIONS_SPILL_FSYNC': False}
+
+
+@pytest.fixture
+def contexte(app, client, tmp_path):
+    lead = backend.Lead(agency_id=uuid.UUID(app.agency_id), nom='Lead', email='lead@test.fr')
+    backend.db.session.add(lead)
+    backend.db.session.commit()
+    client.lead_id = lead.id
+    return app, client, tmp_path
+
+
+def compter_interactions():
+    backend.db.session.expire_all()
+    return backend.db.session.query(backend.Interaction).count()
+
+
+def test_reponse_immediate_puis_insertion_groupee(contexte):
+    app, client, spill_dir = contexte
+    ids = []
+    for n in range(3):
+        r = client.post(f'/api/leads/{client.lead_id}/interactions', json={'type_action': 'Appel', 'details': f'n{n}'})
+        assert r.status_code == 202
+        ids.append(r.get_json()['interaction']['id'])
+
+    # Rien en base, mais visible dans la liste de l'agence (lecture de ses propres écritures)
+    assert compter_interactions() == 0
+    liste = client.get(f'/api/leads-chauds?agency_id={client.agency_id}').get_json()
+    assert [i['id'] for i in liste['data']['leads_chauds'][0]['interactions']] == ids[::-1]
+
+    assert app.extensions['interactions'].flush() == 3
+    assert compter_interactions() == 3
+    # Lot validé : seul le journal courant (vide) reste sur disque
+    assert [os.path.getsize(p) for p in spill_dir.iterdir()] == [0]
+
+    liste = client.get(f'/api/leads-chauds?agency_id={client.agency_id}').get_json()
+    assert len(liste['data']['leads_chauds'][0]['interactions']) == 3
+
+
+def test_validation(contexte):
+    _, client, _ = contexte
+    assert client.post(f'/api/leads/{uuid.uuid4()}/interactions', json={'type_action': 'Appel'}).status_code == 404
+    assert client.post(f'/api/leads/{client.lead_id}/interactions', json={}).status_code == 400
+    assert client.post(f'/api/leads/{client.lead_id}/interactions', json={'type_action': 'x' * 51}).status_code == 400
+
+
+def test_reprise_du_journal_d_un_processus_arrete(contexte):
+    app, client, spill_dir = contexte
+    # pid d'un processus terminé : son journal est orphelin
+    mort = subprocess.Popen([sys.executable, '-c', 'pass'])
+    mort.wait()
+    deja_insere = {'id': str(uuid.uuid4()), 'lead_id': str(client.lead_id), 'type_action': 'Email',
+                   'details': 'validé avant l\'arrêt', 'date': '2025-01-01T10:00:00', 'created_by': None}
+    backend.db.session.add(backend.Interaction(**app.extensions['interactions']._decode(deja_insere)))
+    backend.db.session.commit()
+    lignes = [deja_insere, dict(deja_insere, id=str(uuid.uuid4()), details='perdu sans journal')]
+    journal = spill_dir / f'interactions-{mort.pid}.ndjson'
+    journal.write_text(''.join(json.dumps(l) + '\n' for l in lignes) + '{"id": "tronqu')
+
+    # Le premier ajout démarre le tampon, qui reprend le journal orphelin
+    assert client.post(f'/api/leads/{client.lead_id}/interactions', json={'type_action': 'Appel'}).status_code == 202
+    assert app.extensions['interactions'].pending() == 3
+    app.extensions['interactions'].flush()
+    # La ligne déjà validée n'est pas doublée, la ligne tronquée (jamais acquittée) est ignorée
+    assert compter_interactions() == 3
+    assert not journal.exists()
+
+
+def test_lot_declenche_par_le_nombre_de_lignes(contexte):
+    app, client, _ = contexte
+    app.extensions['interactions'].max_rows = 2
+    for _ in range(2):
+        client.post(f'/api/leads/{client.lead_id}/interactions', json={'type_action': 'SMS'})
+    limite = time.time() + 5
+    while compter_interactions() < 2 and time.time() < limite:
+        time.sleep(0.02)
+    assert compter_interactions() == 2
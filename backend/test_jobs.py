@@ -0,0 +1,44 @@
+"""
+Test de la file de tâches en arrière-plan
+Le suivi d'une tâche est servi par n'importe quel processus partageant le fichier SQLite
+"""
+
+import time
+
+from jobs import DONE, ERROR, JobQueue, SqliteJobStore
+
+
+def attendre(queue, job_id):
+    for _ in range(200):
+        job = queue.get(job_id)
+        if job and job['status'] in (DONE, ERROR):
+            return job
+        time.sleep(0.01)
+    raise AssertionError('tâche non terminée')
+
+
+def test_suivi_depuis_un_autre_worker(tmp_path):
+    chemin = str(tmp_path / 'cache.db')
+    # Deux workers gunicorn : chacun sa file, même fichier
+    recu, autre = JobQueue(workers=1, store=SqliteJobStore(chemin)), JobQueue(store=SqliteJobStore(chemin))
+
+    job_id = recu.submit(lambda: 'Belle maison')
+    attendre(recu, job_id)
+    job = autre.get(job_id)
+    assert (job['status'], job['result']) == (DONE, 'Belle maison')
+
+    def echec():
+        raise RuntimeError('quota dépassé')
+
+    job = attendre(autre, recu.submit(echec))
+    assert (job['status'], job['error']) == (ERROR, 'quota dépassé')
+    assert autre.get('inconnu') is None
+
+
+def test_taches_expirees(tmp_path):
+    chemin = str(tmp_path / 'cache.db')
+    recu = JobQueue(workers=1, result_ttl=0.05, store=SqliteJobStore(chemin))
+    job_id = recu.submit(lambda: 'texte')
+    attendre(recu, job_id)
+    time.sleep(0.1)
+    assert JobQueue(result_ttl=0.05, store=SqliteJobStore(chemin)).get(job_id) is None
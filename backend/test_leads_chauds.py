@@ -0,0 +1,100 @@
+"""
+Test du nombre de requêtes SQL de GET /api/leads-chauds
+Vérifie que la liste ne déclenche pas une requête par lead (N+1)
+"""
+
+from sqlalchemy import event
+
+import app as backend
+
+
+def creer_leads(nombre, interactions_par_lead):
+    """Insère une agence, des leads et leurs interactions ; retourne l'id de l'agence."""
+    agence = backend.Agency(nom_agence='Agence Test')
+    backend.db.session.add(agence)
+    backend.db.session.flush()
+    for n in range(nombre):
+        lead = backend.Lead(agency_id=agence.id, nom=f'Lead {n}', email=f'lead{n}@test.fr')
+        backend.db.session.add(lead)
+        backend.db.session.flush()
+        for _ in range(interactions_par_lead):
+            backend.db.session.add(backend.Interaction(lead_id=lead.id, type_action='Appel'))
+    backend.db.session.commit()
+    return agence.id
+
+
+def compter_requetes(client, url, headers=None):
+    """Appelle url et retourne (réponse, nombre d'instructions SQL exécutées)."""
+    requetes = []
+
+    def compter(conn, cursor, statement, parameters, context, executemany):
+        requetes.append(statement)
+
+    engine = backend.db.engine
+    event.listen(engine, 'before_cursor_execute', compter)
+    try:
+        reponse = client.get(url, headers=headers)
+    finally:
+        event.remove(engine, 'before_cursor_execute', compter)
+    return reponse, len(requetes)
+
+
+def test_nombre_de_requetes_fixe(client):
+    """Une page coûte 4 requêtes (2 agrégats ETag + leads + interactions) quel que soit le nombre de leads."""
+    agence = creer_leads(20, 3)
+
+    reponse, nb_requetes = compter_requetes(client, f'/api/leads-chauds?agency_id={agence}&limit=5')
+    data = reponse.get_json()
+    assert len(data['data']['leads_chauds']) == 5
+    assert nb_requetes == 4
+
+    reponse, nb_requetes = compter_requetes(client, f'/api/leads-chauds?agency_id={agence}&limit=20')
+    data = reponse.get_json()
+    assert len(data['data']['leads_chauds']) == 20
+    assert nb_requetes == 4
+
+    reponse, nb_requetes = compter_requetes(client, f'/api/leads-chauds?agency_id={agence}&limit=20&interactions=2')
+    data = reponse.get_json()
+    assert all(len(l['interactions']) == 2 for l in data['data']['leads_chauds'])
+    assert nb_requetes == 4
+
+    reponse, nb_requetes = compter_requetes(client, f'/api/leads-chauds?agency_id={agence}&limit=20&interactions=0')
+    data = reponse.get_json()
+    assert all(l['interactions'] == [] for l in data['data']['leads_chauds'])
+    assert nb_requetes == 2
+
+
+def test_304_sans_charger_les_leads(client):
+    """If-None-Match valide : 304 après les seuls agrégats du validateur."""
+    agence = creer_leads(5, 1)
+
+    reponse, _ = compter_requetes(client, f'/api/leads-chauds?agency_id={agence}&limit=5')
+    etag = reponse.headers['ETag']
+
+    reponse, nb_requetes = compter_requetes(client, f'/api/leads-chauds?agency_id={agence}&limit=5', {'If-None-Match': etag})
+    assert reponse.status_code == 304
+    assert nb_requetes == 2
+
+    reponse, _ = compter_requetes(client, f'/api/leads-chauds?agency_id={agence}&limit=10', {'If-None-Match': etag})
+    assert reponse.status_code == 200
+
+
+def test_liste_limitee_a_l_agence(client):
+    """Chaque agence ne voit que ses leads ; tri par score paginé par curseur."""
+    agence = creer_leads(3, 0)
+    autre = creer_leads(4, 0)
+
+    assert client.get('/api/leads-chauds').status_code == 400
+    reponse = client.get(f'/api/leads-chauds?agency_id={agence}&interactions=0').get_json()
+    assert len(reponse['data']['leads_chauds']) == 3
+
+    for n, lead in enumerate(backend.Lead.query.filter_by(agency_id=autre).order_by(backend.Lead.nom)):
+        lead.score_ia = 10 * n
+    backend.db.session.commit()
+    scores, cursor = [], ''
+    while cursor is not None:
+        page = client.get(f'/api/leads-chauds?agency_id={autre}&sort=score&fields=score_ia&limit=3&cursor={cursor}')
+        data = page.get_json()['data']
+        scores += [l['score_ia'] for l in data['leads_chauds']]
+        cursor = data['next_cursor']
+    assert scores == [30, 20, 10, 0]
@@ -0,0 +1,77 @@
+"""
+Test de la recherche des leads (GET /api/leads/search)
+Index FTS5 SQLite tenu à jour par triggers, résultats limités à l'agence et paginés
+"""
+
+import pytest
+
+import app as backend
+
+
+@pytest.fixture
+def client(client):
+    autre = backend.Agency(nom_agence='Agence B')
+    backend.db.session.add(autre)
+    backend.db.session.commit()
+    client.autre_agence = str(autre.id)
+    return client
+
+
+def creer(client, agency_id, nom, email, telephone='', adresse=''):
+    r = client.post('/api/leads', json={'agency_id': agency_id, 'nom': nom, 'email': email,
+                                        'telephone': telephone, 'adresse': adresse})
+    assert r.status_code in (200, 201), r.get_json()
+    return r.get_json()['lead_id']
+
+
+def chercher(client, q, agency_id=None, **params):
+    r = client.get('/api/leads/search', query_string={'agency_id': agency_id or client.agency_id, 'q': q, **params})
+    return r.status_code, r.get_json()
+
+
+def noms(reponse):
+    return [l['nom'] for l in reponse['data']['leads']]
+
+
+def test_recherche_par_champ_et_par_agence(client):
+    creer(client, client.agency_id, 'Camille Fontaine', 'camille@orange.fr', '06 12 34 56 78', '3 rue Pasteur, Lyon')
+    creer(client, client.agency_id, 'Hugo Martin', 'hugo.martin@free.fr', adresse='12 avenue Victor Hugo, Paris')
+    creer(client, client.autre_agence, 'Camille Durand', 'cdurand@gmail.com')
+
+    assert noms(chercher(client, 'fontaine')[1]) == ['Camille Fontaine']
+    assert noms(chercher(client, 'PASTEUR lyon')[1]) == ['Camille Fontaine']
+    assert noms(chercher(client, 'free.fr')[1]) == ['Hugo Martin']
+    # Numéro saisi sous une autre forme que celle enregistrée : retrouvé par sa forme E.164
+    assert noms(chercher(client, '0612345678')[1]) == ['Camille Fontaine']
+    assert noms(chercher(client, '+33612345678')[1]) == ['Camille Fontaine']
+    # Les leads d'une autre agence ne sont jamais renvoyés
+    assert noms(chercher(client, 'camille')[1]) == ['Camille Fontaine']
+    assert noms(chercher(client, 'camille', client.autre_agence)[1]) == ['Camille Durand']
+
+
+def test_index_suit_les_modifications(client):
+    lead_id = creer(client, client.agency_id, 'Léa Moreau', 'lea@orange.fr')
+    lead = backend.db.session.get(backend.Lead, backend.uuid.UUID(lead_id))
+    lead.nom = 'Léa Rousseau'
+    backend.db.session.commit()
+    assert noms(chercher(client, 'moreau')[1]) == []
+    assert noms(chercher(client, 'rousseau')[1]) == ['Léa Rousseau']
+
+    backend.db.session.delete(lead)
+    backend.db.session.commit()
+    assert noms(chercher(client, 'rousseau')[1]) == []
+
+
+def test_pagination(client):
+    for n in range(5):
+        creer(client, client.agency_id, f'Client Bernard {n}', f'bernard{n}@orange.fr')
+    _, page1 = chercher(client, 'bernard', limit=2)
+    _, page3 = chercher(client, 'bernard', limit=2, page=3)
+    assert page1['data']['next_page'] == 2 and len(page1['data']['leads']) == 2
+    assert page3['data']['next_page'] is None and len(page3['data']['leads']) == 1
+
+
+def test_parametres_invalides(client):
+    assert chercher(client, 'ab')[0] == 400
+    assert client.get('/api/leads/search?q=bernard').status_code == 400
+    assert chercher(client, 'bernard', page=0)[0] == 400
@@ -0,0 +1,59 @@
+"""
+Test du moteur de scoring
+score_batch (vectorisé) doit rendre exactement les mêmes budgets, scores et statuts que score_lead ;
+re-scoring d'une agence par lots
+"""
+
+import itertools
+import random
+import uuid
+
+import app as backend
+from scoring import score_batch, score_lead
+
+TELEPHONES = (None, '', '0612', '06 12 34 56 78', '+33612345678')
+EMAILS = (None, '', 'a@b.f', 'jean@orange.fr')
+ADRESSES = (None, '', 'Lyon', 'PARIS 11e', '12 rue de Paris, Versailles')
+BUDGETS = (None, '', 0, '0', 'abc', '150 000€', '150 000 €', ' 199999', 200000, '250001', 500000,
+           500001, -1, '-300000', -10 ** 30, 10 ** 30, str(10 ** 25), 2 ** 63, 150000.5, '1e6')
+
+
+def comparer(leads):
+    budgets, scores, statuts = score_batch(leads)
+    attendus = [score_lead(lead) for lead in leads]
+    assert list(zip(budgets, scores.tolist(), statuts)) == attendus
+
+
+def test_cas_limites():
+    comparer([
+        {'telephone': t, 'email': e, 'adresse': a, 'budget': b}
+        for t, e, a, b in itertools.product(TELEPHONES, EMAILS, ADRESSES, BUDGETS)
+    ])
+    # Budget absent du dict : '0' par défaut des deux côtés
+    comparer([{'email': 'jean@orange.fr', 'adresse': 'Paris'}, {}])
+
+
+def test_aleatoire():
+    hasard = random.Random(4)
+    comparer([
+        {'telephone': hasard.choice(TELEPHONES), 'email': hasard.choice(EMAILS),
+         'adresse': hasard.choice(ADRESSES), 'budget': hasard.randint(-10 ** 6, 10 ** 6)}
+        for _ in range(5000)
+    ])
+
+
+def test_rescore_par_lots(app):
+    agency_id = uuid.UUID(app.agency_id)
+    backend.db.session.add_all(
+        backend.Lead(agency_id=agency_id, nom=f'L{n}', email=f'l{n}@test.fr', telephone=f'06123456{n:02d}',
+                     budget=600000, score_ia=0, statut=None) for n in range(5))
+    backend.db.session.commit()
+    assert backend.rescore_agency(agency_id, chunk_size=2) == (5, 5)
+    assert {l.score_ia for l in backend.Lead.query} == {9}
+    assert backend.rescore_agency(agency_id, chunk_size=2) == (5, 0)
+
+    # Lot suivant lu sur l'index (agency_id, id) : pas de tri de toute l'agence à chaque lot
+    plan = backend.db.session.connection().exec_driver_sql(
+        'EXPLAIN QUERY PLAN SELECT id, score_ia FROM leads WHERE agency_id = ? AND id > ? ORDER BY id LIMIT 2',
+        (agency_id.hex, '')).all()
+    assert [ligne[-1] for ligne in plan] == ['SEARCH leads USING INDEX ix_leads_agency_id (agency_id=? AND id>?)']
@@ -0,0 +1,32 @@
+"""
+Test de la mesure des instructions SQL (slow_queries.py, metrics.py)
+Une instruction en échec ne laisse aucun état sur la connexion du pool
+"""
+
+import logging
+
+import pytest
+from sqlalchemy import create_engine, exc
+from sqlalchemy.pool import StaticPool
+
+import metrics
+from slow_queries import SlowQueryLog
+
+
+def test_instruction_en_echec(caplog):
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+    log = SlowQueryLog(threshold_ms=0, explain=False).attach(engine)
+    avant = sum(v for _, _, v in metrics.DB_QUERIES.samples())
+
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(exc.OperationalError):
+                conn.exec_driver_sql('SELECT * FROM table_absente')
+        with caplog.at_level(logging.WARNING, logger='leadqualif.slow_queries'):
+            assert conn.exec_driver_sql('SELECT 1').scalar() == 1
+        assert not {k for k in conn.info if k.endswith('debuts')}
+
+    # Seule l'instruction réussie est comptée et journalisée
+    assert sum(v for _, _, v in metrics.DB_QUERIES.samples()) == avant + 1
+    assert [r.getMessage().split(' : ')[1] for r in caplog.records] == ['SELECT 1 | paramètres']
+    assert log.plans() == {}
@@ -0,0 +1,92 @@
+"""
+Test des compteurs du tableau de bord (GET /api/dashboard)
+Tenus à jour par les triggers de leads (API, import en masse, re-scoring, SQL direct), reconstructibles
+"""
+
+import uuid
+
+import app as backend
+from scoring import STATUT_CHAUD
+
+
+def chaud(n):
+    # Téléphone (4) + budget > 500 000 € (5) : score 9 ; numéros distincts, pas de fusion
+    return {'telephone': f'06123456{n:02d}', 'budget': '600000'}
+
+
+def compteurs(client):
+    return client.get('/api/dashboard', query_string={'agency_id': client.agency_id}).get_json()['data']
+
+
+def test_compteurs_maintenus(client):
+    client.post('/api/leads', json={'agency_id': client.agency_id, 'nom': 'A', 'email': 'a@test.fr', **chaud(0)})
+    client.post('/api/leads', json={'agency_id': client.agency_id, 'nom': 'B', 'email': 'b@test.fr'})
+    client.post(f'/api/leads/bulk?agency_id={client.agency_id}', json=[
+        {'nom': 'C', 'email': 'c@test.fr', **chaud(1)},
+        {'nom': 'D', 'email': 'd@test.fr'},
+        {'nom': 'A bis', 'email': 'A@test.fr'},  # fusionné : pas de nouveau lead
+    ])
+    data = compteurs(client)
+    assert data['stats'] == {'total_leads': 4, 'leads_chauds': 2, 'taux_chauds': 50.0}
+    assert sorted(l['nom'] for l in data['leads_chauds']) == ['A', 'C']
+    assert backend.db.session.get(backend.AgencyStats, uuid.UUID(client.agency_id)).total_leads == 4
+
+
+def test_ecritures_hors_application(client):
+    client.post(f'/api/leads/bulk?agency_id={client.agency_id}', json=[
+        {'nom': f'L{n}', 'email': f'l{n}@test.fr', **chaud(n)} for n in range(3)])
+    # SQL direct (fonctions JS, Supabase) : suivi par les triggers de la table leads
+    backend.db.session.execute(backend.db.update(backend.Lead).values(score_ia=0))
+    backend.db.session.commit()
+    assert compteurs(client)['stats']['leads_chauds'] == 0
+
+    runner = client.application.test_cli_runner()
+    assert runner.invoke(args=['rescore-agency', client.agency_id]).exit_code == 0
+    assert compteurs(client)['stats'] == {'total_leads': 3, 'leads_chauds': 3, 'taux_chauds': 100.0}
+
+    backend.db.session.execute(backend.db.delete(backend.Lead).where(backend.Lead.nom == 'L0'))
+    backend.db.session.commit()
+    assert compteurs(client)['stats']['total_leads'] == 2
+
+    assert 'pour 1 agence' in runner.invoke(args=['rebuild-stats']).output
+    assert compteurs(client)['stats'] == {'total_leads': 2, 'leads_chauds': 2, 'taux_chauds': 100.0}
+
+
+def test_leads_anterieurs_aux_compteurs(client):
+    # Leads présents avant la création de agency_stats (migration, create_all sur une base existante)
+    client.post(f'/api/leads/bulk?agency_id={client.agency_id}', json=[
+        {'nom': f'L{n}', 'email': f'l{n}@test.fr', **chaud(n)} for n in range(5)])
+    backend.db.session.query(backend.AgencyStats).delete()
+    backend.db.session.commit()
+
+    # La première écriture initialise les compteurs depuis leads au lieu de partir de zéro
+    client.post('/api/leads', json={'agency_id': client.agency_id, 'nom': 'F', 'email': 'f@test.fr'})
+    assert compteurs(client)['stats'] == {'total_leads': 6, 'leads_chauds': 5, 'taux_chauds': 83.33}
+
+    # Sans écriture : calculés une fois à la lecture
+    backend.db.session.query(backend.AgencyStats).delete()
+    backend.db.session.commit()
+    assert compteurs(client)['stats']['total_leads'] == 6
+
+    # Import en masse (une instruction pour tout le lot) sur des compteurs absents
+    backend.db.session.query(backend.AgencyStats).delete()
+    backend.db.session.commit()
+    client.post(f'/api/leads/bulk?agency_id={client.agency_id}', json=[
+        {'nom': f'M{n}', 'email': f'm{n}@test.fr', **chaud(10 + n)} for n in range(3)])
+    assert compteurs(client)['stats'] == {'total_leads': 9, 'leads_chauds': 8, 'taux_chauds': 88.89}
+
+
+def test_seuil_du_statut_chaud(client):
+    # Téléphone (4) + budget > 250 000 € (3) : score 7, déjà "Chaud" pour le scoring
+    client.post('/api/leads', json={'agency_id': client.agency_id, 'nom': 'A', 'email': 'a@test.fr',
+                                    'telephone': '0612345600', 'budget': '300000'})
+    lead = backend.Lead.query.one()
+    assert (lead.score_ia, lead.statut) == (7, STATUT_CHAUD)
+    data = compteurs(client)
+    assert data['stats']['leads_chauds'] == 1
+    assert [l['nom'] for l in data['leads_chauds']] == ['A']
+
+
+def test_parametres_invalides(client):
+    assert client.get('/api/dashboard').status_code == 400
+    assert client.get('/api/dashboard', query_string={'agency_id': client.agency_id, 'fields': 'x'}).status_code == 400
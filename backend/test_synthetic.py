@@ -0,0 +1,43 @@
+"""
+Test du générateur de données synthétiques
+Même graine => mêmes lignes ; volumes et répartition conformes aux paramètres
+"""
+
+import app as backend
+from synthetic import populate
+
+MODELS = (backend.Agency, backend.Profile, backend.Lead, backend.Interaction)
+
+
+def generer(seed):
+    """Base vidée puis remplie avec la graine donnée ; retourne (comptes, leads)."""
+    backend.db.session.remove()
+    backend.db.drop_all()
+    backend.db.create_all()
+    comptes = populate(backend.db, MODELS, agencies=5, leads=500, seed=seed, chunk_size=200)
+    leads = backend.db.session.execute(
+        backend.db.select(backend.Lead.id, backend.Lead.agency_id, backend.Lead.email, backend.Lead.score_ia)
+        .order_by(backend.Lead.id)
+    ).all()
+    return comptes, leads
+
+
+def test_deterministe(app):
+    comptes, leads = generer(7)
+    assert generer(7) == (comptes, leads)
+    assert generer(8)[1] != leads
+
+
+def test_volumes_et_repartition(app):
+    comptes, leads = generer(7)
+    assert comptes['agencies'] == 5
+    assert comptes['profiles'] == 15
+    assert comptes['leads'] == len(leads) == 500
+    assert comptes['interactions'] > 0
+
+    # Répartition inégale entre agences (poids de Pareto)
+    par_agence = {}
+    for lead in leads:
+        par_agence[lead.agency_id] = par_agence.get(lead.agency_id, 0) + 1
+    assert max(par_agence.values()) > 2 * min(par_agence.values())
+    assert all(0 <= lead.score_ia <= 10 for lead in leads)
@@ -0,0 +1,252 @@
+"""
+Écriture différée (write-behind) des interactions CRM
+Lignes validées journalisées dans un fichier local, gardées en mémoire
+puis insérées par lots (une transaction par lot) toutes les N ms ou M lignes
+"""
+
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger('leadqualif.write_behind')
+
+# Pause après un échec d'insertion (base indisponible) avant de réessayer
+RETRY_DELAY = 2.0
+
+
+class BufferFull(Exception):
+    """Trop de lignes en attente d'insertion (base indisponible ou trop lente)"""
+
+
+def _pid_vivant(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WriteBehindBuffer:
+    """Tampon d'insertions pour une table, propre à chaque processus.
+
+    add() écrit la ligne dans le journal du processus (fichier NDJSON, fsync
+    optionnel) puis la garde en mémoire ; un thread l'insère avec les autres
+    toutes les flush_ms millisecondes, ou dès max_rows lignes en attente.
+    Avant chaque lot, le journal est renommé : il est supprimé une fois le lot
+    validé en base, sinon le lot est retenté. Au démarrage, les journaux des
+    processus disparus (arrêt brutal) sont rejoués ; l'insertion ignore les
+    id déjà présents, un lot validé juste avant l'arrêt n'est donc pas doublé.
+    """
+
+    def __init__(self, app, db, table, spill_dir, flush_ms=200, max_rows=500, max_pending=50000,
+                 fsync=True, key='lead_id', prefix=None):
+        self.app = app
+        self.db = db
+        self.table = table
+        self.spill_dir = spill_dir
+        self.flush_interval = flush_ms / 1000
+        self.max_rows = max_rows
+        self.max_pending = max_pending
+        self.fsync = fsync
+        self.key = key
+        self.prefix = prefix or table.name
+        self.version = 0
+        self._pending = []
+        self._inflight = []
+        self._files = []
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._spill = None
+        self._thread = None
+        self._seq = 0
+
+    # --- Écriture ---
+
+    def add(self, row):
+        """Journalise et met en attente la ligne (dict complet, id compris). Lève BufferFull."""
+        self._start()
+        ligne = json.dumps(self._encode(row), separators=(',', ':')) + '\n'
+        with self._lock:
+            if len(self._pending) + len(self._inflight) >= self.max_pending:
+                raise BufferFull(f"{self.max_pending} lignes en attente d'insertion, réessayez plus tard")
+            self._spill.write(ligne)
+            self._spill.flush()
+            if self.fsync:
+                os.fsync(self._spill.fileno())
+            self._pending.append(row)
+            self.version += 1
+            if len(self._pending) >= self.max_rows:
+                self._cond.notify()
+        return row
+
+    def pending_for(self, keys):
+        """Lignes pas encore en base dont la clé (lead_id) est dans keys : lecture de ses propres écritures."""
+        keys = set(keys)
+        with self._lock:
+            return [r for r in self._inflight + self._pending if r[self.key] in keys]
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending) + len(self._inflight)
+
+    def flush(self):
+        """Insère tout ce qui est en attente ; retourne le nombre de lignes écrites.
+
+        En cas d'échec, le lot reste en mémoire et son journal sur disque.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._pending:
+                    self._inflight.extend(self._pending)
+                    self._pending = []
+                    if self._spill is not None:
+                        self._files.append(self._rotate())
+                batch = list(self._inflight)
+            if not batch:
+                return 0
+            self._insert(batch)
+            with self._lock:
+                self._inflight = []
+                files, self._files = self._files, []
+            for path in files:
+                os.remove(path)
+            return len(batch)
+
+    def close(self):
+        """Dernier lot à l'arrêt du processus ; en cas d'échec le journal sera rejoué."""
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning("Lot non inséré à l'arrêt (journal conservé) : %s", e)
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+
+    # --- Interne ---
+
+    def _start(self):
+        # Démarrage au premier add : aucun thread ni fichier avant le fork des workers gunicorn
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._recover()
+            self._spill = open(self._path(), 'a', encoding='utf-8')
+            self._thread = threading.Thread(target=self._run, name=f'write-behind-{self.prefix}', daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _path(self):
+        return os.path.join(self.spill_dir, f'{self.prefix}-{os.getpid()}.ndjson')
+
+    def _rotate(self):
+        """Ferme le journal courant sous un nouveau nom et en ouvre un vide (verrou tenu)."""
+        self._spill.close()
+        self._seq += 1
+        path = f'{self._path()}.{self._seq}.flushing'
+        os.replace(self._path(), path)
+        self._spill = open(self._path(), 'a', encoding='utf-8')
+        return path
+
+    def _recover(self):
+        """Reprend les journaux laissés par des processus arrêtés (verrou tenu).
+
+        Chaque journal est d'abord renommé à notre pid : si deux workers
+        démarrent ensemble, un seul le récupère.
+        """
+        moi = os.getpid()
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, f'{self.prefix}-*.ndjson*'))):
+            nom = os.path.basename(path)
+            proprietaire = nom[len(self.prefix) + 1:].split('.', 1)[0]
+            if '.recovering-' in nom:
+                proprietaire = nom.rsplit('.recovering-', 1)[1]
+            if not proprietaire.isdigit() or (int(proprietaire) != moi and _pid_vivant(int(proprietaire))):
+                continue
+            cible = f'{path.split(".recovering-", 1)[0]}.recovering-{moi}'
+            try:
+                if path != cible:
+                    os.replace(path, cible)
+            except FileNotFoundError:
+                continue
+            lignes = self._read(cible)
+            logger.warning("Reprise de %d ligne(s) depuis %s", len(lignes), nom)
+            self._inflight.extend(lignes)
+            self._files.append(cible)
+
+    def _read(self, path):
+        lignes = []
+        with open(path, encoding='utf-8') as f:
+            for ligne in f:
+                try:
+                    lignes.append(self._decode(json.loads(ligne)))
+                except ValueError:
+                    # Dernière ligne tronquée par l'arrêt : jamais acquittée au client
+                    logger.warning("Ligne illisible ignorée dans %s", path)
+        return lignes
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._pending) >= self.max_rows, timeout=self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Insertion différée en échec, nouvel essai dans %.0f s : %s", RETRY_DELAY, e)
+                time.sleep(RETRY_DELAY)
+
+    def _insert_statement(self, dialect):
+        # Rejouer un journal ne doit pas doubler les lignes déjà validées
+        if dialect == 'postgresql':
+            return postgresql.insert(self.table).on_conflict_do_nothing(index_elements=['id'])
+        if dialect == 'sqlite':
+            return sqlite.insert(self.table).on_conflict_do_nothing(index_elements=['id'])
+        return self.table.insert()
+
+    def _insert(self, batch):
+        """Un lot = un INSERT multi-lignes et un commit ; ligne à ligne si une ligne est refusée."""
+        with self.app.app_context():
+            engine = self.db.engine
+            stmt = self._insert_statement(engine.dialect.name)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(stmt, batch)
+                return
+            except IntegrityError:
+                pass
+            # Ex : lead supprimé entre la validation et l'insertion ; seules les lignes fautives sont écartées
+            for row in batch:
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(stmt, [row])
+                except IntegrityError as e:
+                    logger.warning("Ligne %s écartée : %s", row.get('id'), e.orig)
+
+    def _encode(self, row):
+        return {k: str(v) if isinstance(v, uuid.UUID) else v.isoformat() if isinstance(v, datetime) else v
+                for k, v in row.items()}
+
+    def _decode(self, data):
+        row = {}
+        for k, v in data.items():
+            type_python = self.table.c[k].type.python_type
+            if v is not None and type_python is uuid.UUID:
+                v = uuid.UUID(v)
+            elif v is not None and type_python is datetime:
+                v = datetime.fromisoformat(v)
+            row[k] = v
+        return row
@@ -0,0 +1,98 @@
+-- ============================================================
+-- Compteurs du tableau de bord par agence (GET /api/dashboard)
+-- À exécuter dans Supabase → SQL Editor → Run, AVANT de déployer le backend
+-- (rejouable ; flask --app app init-db installe les mêmes triggers)
+-- ============================================================
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS agency_stats (
+  agency_id UUID PRIMARY KEY REFERENCES agencies(id),
+  total_leads INTEGER NOT NULL DEFAULT 0,
+  leads_chauds INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP DEFAULT now()
+);
+
+-- Pas d'écriture de leads entre la reprise de l'existant et la pose des triggers
+LOCK TABLE leads IN SHARE ROW EXCLUSIVE MODE;
+
+-- Maintenance dans la base : toutes les écritures de leads sont comptées (backend, fonctions
+-- api/*.js, webhooks, client Supabase). Même SQL que PG_DDL dans backend/stats.py ;
+-- seuil des leads chauds : SEUIL_CHAUD de backend/scoring.py (score_ia >= 7, statut IA 'Chaud')
+CREATE OR REPLACE FUNCTION agency_stats_ajuster(p_agency_id UUID, p_total INTEGER, p_chauds INTEGER)
+RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+  UPDATE agency_stats
+     SET total_leads = total_leads + p_total, leads_chauds = leads_chauds + p_chauds, updated_at = now()
+   WHERE agency_id = p_agency_id;
+  IF NOT FOUND THEN
+    INSERT INTO agency_stats (agency_id, total_leads, leads_chauds, updated_at)
+    SELECT p_agency_id, count(*), count(*) FILTER (WHERE score_ia >= 7), now()
+      FROM leads WHERE agency_id = p_agency_id
+    -- Compteurs créés entre-temps par une transaction concurrente : ils n'ont pas vu nos lignes
+    ON CONFLICT (agency_id) DO UPDATE
+       SET total_leads = agency_stats.total_leads + p_total,
+           leads_chauds = agency_stats.leads_chauds + p_chauds,
+           updated_at = now();
+  END IF;
+END $$;
+
+CREATE OR REPLACE FUNCTION agency_stats_leads() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+  d RECORD;
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    FOR d IN SELECT agency_id, count(*)::int AS total,
+                    (count(*) FILTER (WHERE score_ia >= 7))::int AS chauds
+               FROM nouveaux GROUP BY agency_id LOOP
+      PERFORM agency_stats_ajuster(d.agency_id, d.total, d.chauds);
+    END LOOP;
+  ELSIF TG_OP = 'DELETE' THEN
+    FOR d IN SELECT agency_id, count(*)::int AS total,
+                    (count(*) FILTER (WHERE score_ia >= 7))::int AS chauds
+               FROM anciens GROUP BY agency_id LOOP
+      PERFORM agency_stats_ajuster(d.agency_id, -d.total, -d.chauds);
+    END LOOP;
+  ELSE
+    -- Seules les lignes dont le score ou l'agence change comptent (pas de liste de colonnes
+    -- possible sur un trigger à tables de transition)
+    FOR d IN SELECT agency_id, sum(total)::int AS total, sum(chauds)::int AS chauds FROM (
+               SELECT n.agency_id, 1 AS total, CASE WHEN n.score_ia >= 7 THEN 1 ELSE 0 END AS chauds
+                 FROM nouveaux n JOIN anciens a ON a.id = n.id
+                WHERE (a.score_ia, a.agency_id) IS DISTINCT FROM (n.score_ia, n.agency_id)
+               UNION ALL
+               SELECT a.agency_id, -1, CASE WHEN a.score_ia >= 7 THEN -1 ELSE 0 END
+                 FROM nouveaux n JOIN anciens a ON a.id = n.id
+                WHERE (a.score_ia, a.agency_id) IS DISTINCT FROM (n.score_ia, n.agency_id)
+             ) changements GROUP BY agency_id LOOP
+      IF d.total <> 0 OR d.chauds <> 0 THEN
+        PERFORM agency_stats_ajuster(d.agency_id, d.total, d.chauds);
+      END IF;
+    END LOOP;
+  END IF;
+  RETURN NULL;
+END $$;
+
+DROP TRIGGER IF EXISTS agency_stats_leads_ai ON leads;
+
+CREATE TRIGGER agency_stats_leads_ai AFTER INSERT ON leads REFERENCING NEW TABLE AS nouveaux FOR EACH STATEMENT EXECUTE FUNCTION agency_stats_leads();
+
+DROP TRIGGER IF EXISTS agency_stats_leads_au ON leads;
+
+CREATE TRIGGER agency_stats_leads_au AFTER UPDATE ON leads REFERENCING OLD TABLE AS anciens NEW TABLE AS nouveaux FOR EACH STATEMENT EXECUTE FUNCTION agency_stats_leads();
+
+DROP TRIGGER IF EXISTS agency_stats_leads_ad ON leads;
+
+CREATE TRIGGER agency_stats_leads_ad AFTER DELETE ON leads REFERENCING OLD TABLE AS anciens FOR EACH STATEMENT EXECUTE FUNCTION agency_stats_leads();
+
+-- Reprise de l'existant (équivaut à flask --app app rebuild-stats)
+INSERT INTO agency_stats (agency_id, total_leads, leads_chauds, updated_at)
+SELECT agency_id, count(*), count(*) FILTER (WHERE score_ia >= 7), now()
+FROM leads
+GROUP BY agency_id
+ON CONFLICT (agency_id) DO UPDATE
+  SET total_leads = EXCLUDED.total_leads,
+      leads_chauds = EXCLUDED.leads_chauds,
+      updated_at = EXCLUDED.updated_at;
+
+COMMIT;
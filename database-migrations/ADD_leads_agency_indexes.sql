@@ -0,0 +1,29 @@
+-- ============================================================
+-- Index composites des listes de leads par agence (GET /api/leads-chauds)
+-- À exécuter dans Supabase → SQL Editor → Run
+-- Sur une grosse table, préférer psql et CREATE INDEX CONCURRENTLY (hors transaction)
+-- pour ne pas bloquer les écritures pendant la construction
+-- ============================================================
+
+-- Liste par date de création ; updated_at en fin de clé couvre l'agrégat de l'ETag
+CREATE INDEX IF NOT EXISTS ix_leads_agency_created
+  ON leads (agency_id, created_at DESC, id DESC, updated_at);
+
+-- Liste par score IA (?sort=score)
+CREATE INDEX IF NOT EXISTS ix_leads_agency_score
+  ON leads (agency_id, score_ia DESC, id DESC);
+
+-- Filtre par étape du pipeline (?statut_crm=)
+CREATE INDEX IF NOT EXISTS ix_leads_agency_statut_crm
+  ON leads (agency_id, statut_crm);
+
+-- Re-scoring par lots (flask rescore-agency) : keyset sur id dans l'agence, sans tri
+CREATE INDEX IF NOT EXISTS ix_leads_agency_id
+  ON leads (agency_id, id);
+
+-- Interactions d'une page de leads, les plus récentes d'abord
+CREATE INDEX IF NOT EXISTS ix_interactions_lead_date
+  ON interactions (lead_id, date DESC);
+
+ANALYZE leads;
+ANALYZE interactions;
@@ -0,0 +1,119 @@
+-- ============================================================
+-- Détection des doublons de leads (email normalisé / téléphone E.164 par agence)
+-- À exécuter dans Supabase → SQL Editor → Run, AVANT de déployer le backend
+-- ============================================================
+
+-- Identifiants normalisés (remplis par le backend, ou par le trigger ci-dessous pour les écritures
+-- des fonctions api/*.js, des webhooks et du client Supabase)
+ALTER TABLE leads
+  ADD COLUMN IF NOT EXISTS email_normalise VARCHAR(120);
+
+ALTER TABLE leads
+  ADD COLUMN IF NOT EXISTS telephone_e164 VARCHAR(20);
+
+-- Pas d'écriture de leads entre la reprise de l'existant et la pose du trigger
+BEGIN;
+LOCK TABLE leads IN SHARE ROW EXCLUSIVE MODE;
+
+-- Mêmes règles que backend/dedup.py (normalize_email, normalize_phone sans phonenumbers) :
+-- minuscules, alias +tag retiré, points ignorés chez Gmail, domaine après le dernier @,
+-- chaîne sans @ conservée ; 00 -> +, 0XXXXXXXXX -> +33XXXXXXXXX, 8 à 15 chiffres
+-- (même SQL que PG_DDL dans backend/dedup.py)
+CREATE OR REPLACE FUNCTION leads_email_normalise(email TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+  SELECT CASE
+      WHEN e = '' THEN NULL
+      WHEN position('@' in e) = 0 THEN e
+      WHEN domaine IN ('gmail.com', 'googlemail.com') THEN replace(split_part(locale, '+', 1), '.', '') || '@gmail.com'
+      ELSE split_part(locale, '+', 1) || '@' || domaine
+    END
+  -- Partie locale et domaine séparés sur le dernier @ (rpartition)
+  FROM (SELECT e, substring(e from '[^@]*$') AS domaine,
+               left(e, length(e) - length(substring(e from '[^@]*$')) - 1) AS locale
+          FROM (SELECT lower(btrim(email, E' \t\n\r\f\v')) AS e) saisie) parties
+$$;
+
+CREATE OR REPLACE FUNCTION leads_telephone_e164(telephone TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+  SELECT CASE WHEN length(c) BETWEEN 8 AND 15 THEN '+' || c END
+  FROM (SELECT CASE
+            WHEN btrim(telephone, E' \t\n\r\f\v') LIKE '+%' THEN d
+            WHEN d LIKE '00%' THEN substr(d, 3)
+            WHEN d ~ '^0[0-9]{9}$' THEN '33' || substr(d, 2)
+          END AS c
+          FROM (SELECT regexp_replace(telephone, '\D', '', 'g') AS d) chiffres) indicatif
+$$;
+
+-- Reprise de l'existant
+UPDATE leads SET email_normalise = leads_email_normalise(email)
+  WHERE email_normalise IS NULL
+    AND length(leads_email_normalise(email)) <= 120;
+
+UPDATE leads SET telephone_e164 = leads_telephone_e164(telephone)
+  WHERE telephone_e164 IS NULL;
+
+-- Doublons déjà présents : seul le lead le plus ancien garde ses identifiants
+-- (les autres restent consultables mais ne bloquent pas la création des index)
+UPDATE leads l SET email_normalise = NULL
+  FROM (
+    SELECT id, row_number() OVER (PARTITION BY agency_id, email_normalise ORDER BY created_at, id) AS rang
+    FROM leads WHERE email_normalise IS NOT NULL
+  ) d
+  WHERE l.id = d.id AND d.rang > 1;
+
+UPDATE leads l SET telephone_e164 = NULL
+  FROM (
+    SELECT id, row_number() OVER (PARTITION BY agency_id, telephone_e164 ORDER BY created_at, id) AS rang
+    FROM leads WHERE telephone_e164 IS NOT NULL
+  ) d
+  WHERE l.id = d.id AND d.rang > 1;
+
+-- Une personne = un lead par agence (les NULL ne sont pas comparés)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_leads_agency_email
+  ON leads (agency_id, email_normalise);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_leads_agency_telephone
+  ON leads (agency_id, telephone_e164);
+
+-- Écritures hors backend : identifiants calculés en base (valeurs fournies par le backend conservées)
+CREATE OR REPLACE FUNCTION leads_normaliser_identifiants() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+  calculer_email BOOLEAN;
+  calculer_telephone BOOLEAN;
+BEGIN
+  -- Valeurs fournies par le backend (normalize_email / normalize_phone) : conservées
+  IF TG_OP = 'INSERT' THEN
+    calculer_email := NEW.email_normalise IS NULL;
+    calculer_telephone := NEW.telephone_e164 IS NULL;
+  ELSE
+    calculer_email := NEW.email IS DISTINCT FROM OLD.email
+                      AND NEW.email_normalise IS NOT DISTINCT FROM OLD.email_normalise;
+    calculer_telephone := NEW.telephone IS DISTINCT FROM OLD.telephone
+                          AND NEW.telephone_e164 IS NOT DISTINCT FROM OLD.telephone_e164;
+  END IF;
+  -- Comme la reprise de l'existant : un doublon écrit hors backend ne prend pas l'identifiant
+  -- déjà porté par un autre lead de l'agence (l'index unique ferait échouer l'écriture)
+  IF calculer_email THEN
+    NEW.email_normalise := leads_email_normalise(NEW.email);
+    IF length(NEW.email_normalise) > 120 OR EXISTS (
+        SELECT 1 FROM leads WHERE agency_id = NEW.agency_id
+           AND email_normalise = NEW.email_normalise AND id <> NEW.id) THEN
+      NEW.email_normalise := NULL;
+    END IF;
+  END IF;
+  IF calculer_telephone THEN
+    NEW.telephone_e164 := leads_telephone_e164(NEW.telephone);
+    IF EXISTS (
+        SELECT 1 FROM leads WHERE agency_id = NEW.agency_id
+           AND telephone_e164 = NEW.telephone_e164 AND id <> NEW.id) THEN
+      NEW.telephone_e164 := NULL;
+    END IF;
+  END IF;
+  RETURN NEW;
+END $$;
+
+DROP TRIGGER IF EXISTS leads_normaliser_identifiants ON leads;
+
+CREATE TRIGGER leads_normaliser_identifiants BEFORE INSERT OR UPDATE OF email, telephone ON leads FOR EACH ROW EXECUTE FUNCTION leads_normaliser_identifiants();
+
+COMMIT;
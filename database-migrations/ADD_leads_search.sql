@@ -0,0 +1,16 @@
+-- ============================================================
+-- Recherche des leads (GET /api/leads/search) : nom, email, téléphone, adresse
+-- À exécuter dans Supabase → SQL Editor → Run
+-- ============================================================
+
+-- Recherche de sous-chaînes (ILIKE '%...%') servie par index
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Même expression que PG_DOCUMENT dans backend/search.py (sinon les index ne sont pas utilisés)
+CREATE INDEX IF NOT EXISTS ix_leads_search_trgm
+  ON leads USING gin ((lower(coalesce(nom, '') || ' ' || coalesce(email, '') || ' ' ||
+                            coalesce(telephone, '') || ' ' || coalesce(adresse, ''))) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS ix_leads_search_tsv
+  ON leads USING gin (to_tsvector('simple', lower(coalesce(nom, '') || ' ' || coalesce(email, '') || ' ' ||
+                                                  coalesce(telephone, '') || ' ' || coalesce(adresse, ''))));
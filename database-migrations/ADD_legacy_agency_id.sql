@@ -0,0 +1,21 @@
+-- ============================================================
+-- Agence des agents et des leads de l'ancienne API (backend/api/routes.py, backend/models.py)
+-- À exécuter sur la base de cette API AVANT de déployer le backend
+-- (rejouable ; sous SQLite, sans IF NOT EXISTS : ALTER TABLE "user" ADD COLUMN agency_id VARCHAR(36), etc.)
+-- ============================================================
+
+-- Agence de l'agent (UUID Supabase) : les lectures de leads sont filtrées dessus ;
+-- un agent sans agence reçoit 403 au lieu des leads de toutes les agences
+ALTER TABLE "user"
+  ADD COLUMN IF NOT EXISTS agency_id VARCHAR(36);
+
+CREATE INDEX IF NOT EXISTS ix_user_agency_id
+  ON "user" (agency_id);
+
+-- Agence du lead : les leads existants restent sans agence (invisibles) tant qu'ils
+-- ne sont pas rattachés, ex. UPDATE lead SET agency_id = '<uuid>' WHERE agency_id IS NULL;
+ALTER TABLE lead
+  ADD COLUMN IF NOT EXISTS agency_id VARCHAR(36);
+
+CREATE INDEX IF NOT EXISTS ix_lead_agency_id
+  ON lead (agency_id);